@@ -1,50 +1,43 @@
 from __future__ import annotations
 
 from pathlib import Path
-from sqlite3 import Row
-from typing import TYPE_CHECKING
-
-if TYPE_CHECKING:
-    # noinspection PyUnresolvedReferences
-    from heckbot.cogs.poll import Poll
 
 import asyncio
+import importlib
 import os
 import random
-import sqlite3
 import sys
+import time
 from datetime import datetime, UTC
+from typing import Awaitable
+from typing import Callable
 from typing import Final
-from typing import Literal
-from typing import cast
+from typing import NamedTuple
 
 import discord
 from discord import Intents
 from discord import TextChannel
 from discord.ext import commands
-from discord.ext import tasks
-from dotenv import load_dotenv
 from heckbot.adapter.config_adapter import ConfigAdapter
+from heckbot.adapter.database import AsyncDatabase
+from heckbot.adapter.table_registry import initialize_tables
 from heckbot.types.constants import ADMIN_CONSOLE_CHANNEL_ID
 from heckbot.types.constants import BOT_COMMAND_PREFIX
 from heckbot.types.constants import BOT_CUSTOM_STATUS
 from heckbot.types.constants import PRIMARY_GUILD_ID
+from heckbot.types.keyword_message import KeywordMessage
+from heckbot.utils.chatutils import codeblock
+from heckbot.utils.matcher import normalize_text
+from heckbot.utils.task_scheduler import TaskScheduler
 
-TASK_LOOP_PERIOD = 5  # seconds
+TASKS_DB_PATH: Final = 'tasks.db'
 
-load_dotenv(Path(__file__).parent / '.env')
+KeywordListener = Callable[[KeywordMessage], Awaitable[None]]
 
-db_conn = sqlite3.connect('tasks.db')
-db_conn.row_factory = Row
-cursor = db_conn.cursor()
-cursor.execute('DROP TABLE IF EXISTS tasks;')
-cursor.execute(
-    'CREATE TABLE IF NOT EXISTS tasks'
-    '(completed BOOLEAN, task TEXT, message_id INT, channel_id INT, end_time TEXT);',
-)
-db_conn.commit()
 
-TaskType = Literal['close_poll']
+class CogTiming(NamedTuple):
+    import_seconds: float
+    setup_seconds: float
 
 
 class HeckBot(commands.Bot):
@@ -81,41 +74,78 @@ class HeckBot(commands.Bot):
             case_insensitive=False,
         )
         self.uptime = datetime.now(UTC)
+        self._started = time.perf_counter()
+        # cog name -> how long it took to import and to set up
+        self.cog_timings: dict[str, CogTiming] = {}
+        # startup phase -> how long it took, in seconds
+        self.startup_timings: dict[str, float] = {}
         self.config = ConfigAdapter()
+        self.tasks_db = AsyncDatabase(TASKS_DB_PATH)
+        self.scheduler = TaskScheduler(self.tasks_db)
+        self._keyword_listeners: list[KeywordListener] = []
 
-    @tasks.loop(seconds=TASK_LOOP_PERIOD)
-    async def task_loop(self):
-        cursor.execute(
-            'SELECT rowid,* FROM tasks WHERE NOT completed ORDER BY end_time LIMIT 1;',
-        )
-        next_task = cursor.fetchone()
-        # if no remaining tasks, stop the loop
-        if next_task is None:
+    def add_keyword_listener(
+            self,
+            listener: KeywordListener,
+    ) -> None:
+        """
+        Subscribes a listener to every non-command guild message
+        :param listener: Coroutine function called with the parsed message
+        """
+        self._keyword_listeners.append(listener)
+
+    def remove_keyword_listener(
+            self,
+            listener: KeywordListener,
+    ) -> None:
+        """
+        Unsubscribes a listener added with add_keyword_listener
+        :param listener: Listener to remove
+        """
+        if listener in self._keyword_listeners:
+            self._keyword_listeners.remove(listener)
+
+    async def on_message(
+            self,
+            message: discord.Message,
+    ) -> None:
+        """
+        Single dispatch stage for incoming messages. Each message is
+        parsed once: commands are invoked, and any other guild message is
+        normalized once and handed to all keyword listeners.
+        :param message: The Discord message received
+        """
+        if message.author.bot:
+            return
+        ctx = await self.get_context(message)
+        await self.invoke(ctx)
+        if ctx.valid or message.guild is None or not self._keyword_listeners:
             return
 
-        # sleep until the task should be done
-        await discord.utils.sleep_until(
-            datetime.strptime(next_task['end_time'], '%m/%d/%y %H:%M:%S'),
+        keyword_message = KeywordMessage(
+            message=message,
+            ctx=ctx,
+            guild=message.guild,
+            guild_id=str(message.guild.id),
+            text=normalize_text(message.content),
+            content=message.content,
         )
-        # perform task
-        task_type = next_task['task']
-        match task_type:
-            case 'close_poll':
-                poll_cog = cast('Poll', self.get_cog('Poll'))
-                await poll_cog.close_poll(
-                    next_task['message_id'],
-                    next_task['channel_id'],
-                )
-            case _:  # default
-                raise NotImplementedError
-
-        cursor.execute(
-            'UPDATE tasks SET completed = true WHERE rowid = ?;',
-            (next_task['rowid'],),
+        await asyncio.gather(
+            *(
+                listener(keyword_message)
+                for listener in self._keyword_listeners
+            ),
         )
-        db_conn.commit()
+
+    async def close(self) -> None:
+        await super().close()
+        await self.scheduler.close()
+        self.config.close()
+        await self.tasks_db.close()
 
     def run(self, **kwargs):
+        from dotenv import load_dotenv
+
         load_dotenv(Path(__file__).parent / '.env')
         super().run(os.environ['DISCORD_TOKEN'])
 
@@ -126,18 +156,92 @@ class HeckBot(commands.Bot):
         Asynchronous setup code for the bot before gateway connection
         :return:
         """
+        self.config.load_configs()
         self.after_ready_task = asyncio.create_task(self.after_ready())
-        self.task_loop.start()
 
         self.remove_command('help')
 
-        # load cogs
+        # The cog modules and their dependencies are imported off the
+        #  event loop first, so loading them only runs their setup, which
+        #  happens concurrently as the cogs are independent
+        start = time.perf_counter()
+        import_times = await asyncio.to_thread(self._import_cogs)
+        self.startup_timings['cog imports'] = time.perf_counter() - start
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._load_cog(cog) for cog in self._cogs),
+            return_exceptions=True,
+        )
+        self.startup_timings['cog setup'] = time.perf_counter() - start
+        for cog, result in zip(self._cogs, results):
+            if isinstance(result, BaseException):
+                print(f'Could not load extension {cog}: {result}')
+            else:
+                self.cog_timings[cog] = CogTiming(import_times[cog], result)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        # Tables registered by the cogs' adapters are checked together,
+        #  once, instead of on import
+        start = time.perf_counter()
+        await initialize_tables()
+        self.startup_timings['tables'] = time.perf_counter() - start
+
+        # Tasks left incomplete by the last run are picked back up once
+        #  the cogs have registered their task handlers
+        start = time.perf_counter()
+        recovery = await self.scheduler.start()
+        self.startup_timings['tasks'] = time.perf_counter() - start
+        print(
+            f'Recovered {recovery.pending} scheduled tasks, '
+            f'{recovery.overdue} of them overdue',
+        )
+        print(self.startup_report())
+
+    def _import_cogs(self) -> dict[str, float]:
+        import_times = {}
         for cog in self._cogs:
+            start = time.perf_counter()
             try:
-                await self.load_extension(f'heckbot.cogs.{cog}')
-            except Exception as ex:
-                print(f'Could not load extension {cog}: {ex}')
-                raise ex
+                importlib.import_module(f'heckbot.cogs.{cog}')
+            except Exception:
+                pass  # reported when the extension is loaded
+            import_times[cog] = time.perf_counter() - start
+        return import_times
+
+    async def _load_cog(
+            self,
+            cog: str,
+    ) -> float:
+        start = time.perf_counter()
+        await self.load_extension(f'heckbot.cogs.{cog}')
+        return time.perf_counter() - start
+
+    def startup_report(self) -> str:
+        """
+        Summarizes how long each part of startup took
+        :return: the startup breakdown, one line per phase and per cog
+        """
+        lines = ['Startup breakdown:']
+        if 'ready' in self.startup_timings:
+            lines.append(
+                f'time to ready: {self.startup_timings["ready"]:.2f}s',
+            )
+        lines.extend(
+            f'{phase}: {seconds:.2f}s'
+            for phase, seconds in self.startup_timings.items()
+            if phase != 'ready'
+        )
+        lines.extend(
+            f'  {cog}: import {timing.import_seconds:.3f}s, '
+            f'setup {timing.setup_seconds:.3f}s'
+            for cog, timing in sorted(
+                self.cog_timings.items(),
+                key=lambda item: -sum(item[1]),
+            )
+        )
+        return '\n'.join(lines)
 
     async def after_ready(
             self,
@@ -149,6 +253,7 @@ class HeckBot(commands.Bot):
         await self.wait_until_ready()
 
         self.uptime = datetime.now(UTC)
+        self.startup_timings['ready'] = time.perf_counter() - self._started
 
         await self.change_presence(
             status=discord.Status.online,
@@ -168,6 +273,7 @@ class HeckBot(commands.Bot):
                     await channel.send(
                         self.config.get_message(guild.id, 'welcomeMessage'),
                     )
+                    await channel.send(codeblock(self.startup_report()))
 
         print(
             f'----------------HeckBot---------------------'
@@ -176,6 +282,9 @@ class HeckBot(commands.Bot):
             f'\nDetected OS: {sys.platform.title()}'
             f'\n--------------------------------------------',
         )
+        # Lets cogs start background work, such as reconciliation, once
+        #  the bot is fully up
+        self.dispatch('after_ready')
 
 
 if __name__ == '__main__':
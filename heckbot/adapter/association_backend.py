@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Final
+from typing import get_args
+from typing import Iterator
+from typing import Literal
+from typing import Mapping
+from typing import Protocol
+from typing import Sequence
+
+from pynamodb.models import Model
+
+from heckbot.adapter.dynamo_association_backend import (
+    DynamoAssociationBackend,
+)
+from heckbot.adapter.sqlite_association_backend import (
+    SqliteAssociationBackend,
+)
+from heckbot.types.association import Association
+from heckbot.types.association import ImportedAssociation
+from heckbot.types.association import MatchMode
+
+BackendName = Literal['dynamodb', 'sqlite']
+BACKEND_NAMES: Final[tuple[BackendName, ...]] = get_args(BackendName)
+DEFAULT_BACKEND: Final[BackendName] = 'dynamodb'
+DEFAULT_DB_PATH: Final[str] = 'associations.db'
+
+
+class AssociationBackend(Protocol):
+    """
+    Storage for the keyword associations of one table. Values are kept
+    in insertion order, and every method may block on I/O, so callers
+    on the event loop go through the table executor.
+    """
+
+    def ensure_table(self) -> None:
+        """
+        Creates the table if it does not exist yet
+        """
+
+    def query_all(
+            self,
+            guild_id: str,
+    ) -> dict[str, Association]:
+        """
+        Finds all patterns for a given guild along with their values and
+        match modes
+        :param guild_id: Guild ID to match
+        :return: a mapping of patterns to associations
+        """
+
+    def get_values(
+            self,
+            guild_id: str,
+            pattern: str,
+    ) -> list[str]:
+        """
+        Finds the values associated with a pattern
+        :param guild_id: Guild ID to match
+        :param pattern: pattern to match
+        :return: the values, empty if the pattern is unknown
+        """
+
+    def add_value(
+            self,
+            guild_id: str,
+            pattern: str,
+            value: str,
+            mode: MatchMode | None,
+    ) -> bool:
+        """
+        Associates a value with a pattern
+        :param guild_id: Guild ID to match
+        :param pattern: pattern to match
+        :param value: Value to add
+        :param mode: How the pattern is matched, if None an existing
+        pattern keeps its mode
+        :return: whether the association changed
+        """
+
+    def remove_all(
+            self,
+            guild_id: str,
+            pattern: str,
+    ) -> bool:
+        """
+        Removes a pattern and all of its values
+        :param guild_id: Guild ID to match
+        :param pattern: pattern to match
+        :return: whether an association was removed
+        """
+
+    def remove_value(
+            self,
+            guild_id: str,
+            pattern: str,
+            value: str,
+            known_values: Sequence[str] | None,
+    ) -> bool:
+        """
+        Dissociates a value from a pattern
+        :param guild_id: Guild ID to match
+        :param pattern: pattern to match
+        :param value: Value to remove
+        :param known_values: Values of the pattern as last seen, which
+        may be stale
+        :return: whether the association changed
+        :raises AssociationConflictError: if concurrent edits keep the
+        value from being removed
+        """
+
+    def import_associations(
+            self,
+            guild_id: str,
+            associations: Mapping[str, ImportedAssociation],
+    ) -> int:
+        """
+        Merges associations into a guild's existing ones. New values are
+        appended to those already associated with a pattern, and the
+        imported match mode, if any, replaces the existing one.
+        :param guild_id: Guild ID to import into
+        :param associations: Mapping of patterns to associations
+        :return: the number of patterns written
+        """
+
+    def iter_associations(
+            self,
+            guild_id: str,
+    ) -> Iterator[tuple[str, Association]]:
+        """
+        Streams all associations of a guild one page at a time
+        :param guild_id: Guild ID to match
+        :return: an iterator of patterns and their associations
+        """
+
+
+_backends: dict[str, AssociationBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_association_backend(
+        model: type[Model],
+        attribute: str,
+) -> AssociationBackend:
+    """
+    Gets the backend for an association table, creating it on first
+    use. The ASSOCIATION_BACKEND environment variable picks between
+    DynamoDB and a local SQLite database at ASSOCIATION_DB_PATH.
+    :param model: DynamoDB model of the table, whose table name also
+    names the SQLite table
+    :param attribute: Name of the model's list attribute holding values
+    :return: the table's backend
+    :raises ValueError: if ASSOCIATION_BACKEND is not a known backend
+    """
+    table_name = model.Meta.table_name
+    with _backends_lock:
+        backend = _backends.get(table_name)
+        if backend is not None:
+            return backend
+        name = os.getenv('ASSOCIATION_BACKEND', DEFAULT_BACKEND).lower()
+        if name == 'sqlite':
+            backend = SqliteAssociationBackend(
+                os.getenv('ASSOCIATION_DB_PATH', DEFAULT_DB_PATH),
+                table_name,
+            )
+        elif name == 'dynamodb':
+            backend = DynamoAssociationBackend(model, attribute)
+        else:
+            raise ValueError(
+                f'Unknown association backend "{name}", expected one of '
+                f'{", ".join(BACKEND_NAMES)}',
+            )
+        _backends[table_name] = backend
+        return backend
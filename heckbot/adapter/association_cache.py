@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Final
+from typing import Generic
+from typing import TypeVar
+
+DEFAULT_CACHE_TTL: Final[float] = 300  # seconds
+DEFAULT_CACHE_MAX_GUILDS: Final[int] = 1024
+
+T = TypeVar('T')
+
+
+class AssociationCache(Generic[T]):
+    """
+    Per-guild, size-bounded cache of association lookups with a time to
+    live. Guilds without any associations are cached like any other
+    result, so they do not cost a table query on every message either.
+    """
+
+    def __init__(
+            self,
+            ttl: float = DEFAULT_CACHE_TTL,
+            max_guilds: int = DEFAULT_CACHE_MAX_GUILDS,
+    ) -> None:
+        """
+        Constructor method
+        :param ttl: Seconds for which a cached lookup stays valid
+        :param max_guilds: Maximum number of guilds to keep cached, the
+        least recently used guild is evicted first
+        """
+        self.ttl = ttl
+        self.max_guilds = max_guilds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, T]] = OrderedDict()
+        # Incremented on every invalidation so that a lookup which
+        #  raced with a write is not cached after the write
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def get(
+            self,
+            guild_id: str,
+    ) -> T | None:
+        """
+        Gets the cached lookup for a guild, if it is present and has not
+        expired
+        :param guild_id: Guild ID to look up
+        :return: the cached lookup, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(guild_id)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(guild_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(
+            self,
+            guild_id: str,
+            value: T,
+            epoch: int,
+    ) -> None:
+        """
+        Caches the lookup for a guild
+        :param guild_id: Guild ID the lookup belongs to
+        :param value: Result of the lookup
+        :param epoch: Value of the epoch property from before the lookup
+        was started
+        """
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            self._entries[guild_id] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(guild_id)
+            while len(self._entries) > self.max_guilds:
+                self._entries.popitem(last=False)
+
+    def invalidate(
+            self,
+            guild_id: str,
+    ) -> None:
+        """
+        Drops the cached lookup for a guild
+        :param guild_id: Guild ID whose associations have changed
+        """
+        with self._lock:
+            self._epoch += 1
+            self._entries.pop(guild_id, None)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """
+        Counters of how many lookups were answered from the cache
+        :return: a mapping of counter names to values
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+            }
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import time
+from typing import Final
+from typing import Sequence
+from typing import TypeVar
+
+from pynamodb.exceptions import PutError
+from pynamodb.models import Model
+
+# DynamoDB accepts at most 25 items per BatchWriteItem request
+BATCH_WRITE_SIZE: Final[int] = 25
+BATCH_WRITE_INITIAL_BACKOFF: Final[float] = 0.5  # seconds
+BATCH_WRITE_MAX_BACKOFF: Final[float] = 16  # seconds
+BATCH_WRITE_MAX_FAILURES: Final[int] = 10
+
+M = TypeVar('M', bound=Model)
+
+
+def batch_save(
+        model: type[M],
+        items: Sequence[M],
+) -> None:
+    """
+    Saves association items with batched writes. Items which DynamoDB
+    leaves unprocessed, usually because the table's write capacity is
+    exhausted, are retried with exponential backoff instead of failing
+    the whole import. Items are identified by their pattern range key.
+    :param model: Model class of the items
+    :param items: Items to save
+    :raises PutError: if writes keep failing
+    """
+    pending = {item.pattern: item for item in items}  # type: ignore
+    backoff = BATCH_WRITE_INITIAL_BACKOFF
+    failures = 0
+    while pending:
+        chunk = list(pending.values())[:BATCH_WRITE_SIZE]
+        batch = model.batch_write(auto_commit=False)
+        for item in chunk:
+            batch.save(item)
+        try:
+            batch.commit()
+            unprocessed: set[str] = set()
+        except PutError:
+            # Without unprocessed items the request itself failed, and
+            #  none of the chunk can be assumed written
+            if not batch.failed_operations:
+                raise
+            failures += 1
+            if failures >= BATCH_WRITE_MAX_FAILURES:
+                raise
+            unprocessed = {
+                operation['PutRequest']['Item']['pattern']['S']
+                for operation in batch.failed_operations
+            }
+        for item in chunk:
+            if item.pattern not in unprocessed:  # type: ignore
+                del pending[item.pattern]  # type: ignore
+        if unprocessed:
+            time.sleep(backoff)
+            backoff = min(backoff * 2, BATCH_WRITE_MAX_BACKOFF)
+        else:
+            backoff = BATCH_WRITE_INITIAL_BACKOFF
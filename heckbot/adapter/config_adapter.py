@@ -1,14 +1,17 @@
 from __future__ import annotations
 
 import os
+import time
 from collections import defaultdict
 from typing import Final
 from typing import Literal
 from typing import TypedDict
 
-import yaml
+from heckbot.adapter.config_store import ConfigStore
 
 DEFAULT_MODULE_BEHAVIOR: Final[bool] = True
+# Seconds between checks of whether the config file was edited
+CONFIG_RELOAD_INTERVAL: Final[float] = 5
 ConfigGroup = Literal['messages', 'colors', 'modules']
 ModuleConfig = TypedDict(
     'ModuleConfig', {
@@ -48,6 +51,9 @@ class ConfigAdapter:
         self.configs: dict[str, GuildConfig] = {}
         self.config_folder = os.getcwd() + '/resources/config/'
         self.config_file = f'{self.config_folder}config.yaml'
+        self.store = ConfigStore(self.config_file)
+        self._loaded = False
+        self._next_reload_check = 0.0
 
     @classmethod
     def get_default_guild_config(cls) -> GuildConfig:
@@ -61,44 +67,62 @@ class ConfigAdapter:
             ),
         }
 
-    def load_config(
+    def load_configs(self) -> None:
+        """
+        Parses the config of every guild into memory. Only the guilds
+        whose stored config differs from the one in memory are rebuilt.
+        """
+        previous = self.store.records
+        records = self.store.load()
+        for guild_id in previous.keys() - records.keys():
+            self.configs.pop(guild_id, None)
+        for guild_id, record in records.items():
+            if guild_id in self.configs and record == previous.get(guild_id):
+                continue
+            guild_config = self.get_default_guild_config()
+            for group, options in record.items():
+                if group in guild_config:
+                    guild_config[group].update(options)  # type: ignore
+            self.configs[guild_id] = guild_config
+        self._loaded = True
+        self._next_reload_check = time.monotonic() + CONFIG_RELOAD_INTERVAL
+
+    def _guild_config(
             self,
             guild_id: int,
-    ) -> None:
-        # Load the config from the file
-        data: dict[str, GuildConfig] = {}
-        if not os.path.exists(self.config_folder):
-            os.makedirs(self.config_folder)
-        if os.path.exists(self.config_file):
-            with open(self.config_file) as f:
-                data = yaml.safe_load(f)
-
-        if str(guild_id) not in data:
-            guild_config: GuildConfig = self.get_default_guild_config()
-            data[str(guild_id)] = guild_config
-        else:
-            guild_config = data[str(guild_id)]
-
-        # Generate default values if not present
-        for m_key, m_val in DEFAULT_MESSAGE_INFO.items():
-            guild_config['messages'][m_key] = m_val
-
-        for c_key, c_val in DEFAULT_COLOR_INFO.items():
-            guild_config['colors'][c_key] = c_val
-
-        # TODO add default module enablement
-
-        with open(self.config_file, 'w') as f:
-            yaml.dump(self.configs, f, default_flow_style=False)
+    ) -> GuildConfig | None:
+        if not self._loaded:
+            self.load_configs()
+        elif time.monotonic() >= self._next_reload_check:
+            # The file may have been edited by hand since it was loaded
+            if self.store.changed_on_disk():
+                self.load_configs()
+            else:
+                self._next_reload_check = (
+                    time.monotonic() + CONFIG_RELOAD_INTERVAL
+                )
+        return self.configs.get(str(guild_id))
+
+    def _editable_guild_config(
+            self,
+            guild_id: int,
+    ) -> GuildConfig:
+        guild_config = self._guild_config(guild_id)
+        if guild_config is None:
+            guild_config = self.get_default_guild_config()
+            self.configs[str(guild_id)] = guild_config
+        return guild_config
 
     def get_message(
             self,
             guild_id: int,
             message_type: str,
     ) -> str:
-        if str(guild_id) not in self.configs:
-            self.load_config(guild_id)
-        return self.configs[str(guild_id)]['messages'][message_type]
+        guild_config = self._guild_config(guild_id)
+        # Defaults are filled in here rather than stored
+        if guild_config and message_type in guild_config['messages']:
+            return guild_config['messages'][message_type]
+        return DEFAULT_MESSAGE_INFO.get(message_type, '')
 
     def set_message(
             self,
@@ -106,20 +130,19 @@ class ConfigAdapter:
             message_type: str,
             message: str,
     ) -> None:
-        if str(guild_id) not in self.configs:
-            self.load_config(guild_id)
-        self.configs[str(guild_id)]['messages'][message_type] = message
-        with open(self.config_file, 'w') as f:
-            yaml.dump(self.configs, f, default_flow_style=False)
+        guild_config = self._editable_guild_config(guild_id)
+        guild_config['messages'][message_type] = message
+        self.store.set(str(guild_id), 'messages', message_type, message)
 
     def get_color(
             self,
             guild_id: int,
             color_type: str,
     ) -> int:
-        if str(guild_id) not in self.configs:
-            self.load_config(guild_id)
-        return self.configs[str(guild_id)]['colors'][color_type]
+        guild_config = self._guild_config(guild_id)
+        if guild_config and color_type in guild_config['colors']:
+            return guild_config['colors'][color_type]
+        return DEFAULT_COLOR_INFO.get(color_type, 0)
 
     def set_color(
             self,
@@ -127,29 +150,34 @@ class ConfigAdapter:
             color_type: str,
             color: int,
     ) -> None:
-        if str(guild_id) not in self.configs:
-            self.load_config(guild_id)
-        self.configs[str(guild_id)]['colors'][color_type] = color
-        with open(self.config_file, 'w') as f:
-            yaml.dump(self.configs, f, default_flow_style=False)
+        guild_config = self._editable_guild_config(guild_id)
+        guild_config['colors'][color_type] = color
+        self.store.set(str(guild_id), 'colors', color_type, color)
 
     def is_module_enabled(
             self,
             guild_id: int,
             module: str,
     ) -> bool:
-        if str(guild_id) not in self.configs:
-            self.load_config(guild_id)
-        return self.configs[str(guild_id)]['modules'][module]['enabled']
+        guild_config = self._guild_config(guild_id)
+        if guild_config is not None and module in guild_config['modules']:
+            return guild_config['modules'][module]['enabled']
+        return DEFAULT_MODULE_BEHAVIOR
 
     def set_module_enabled(
             self,
             guild_id: int,
             module: str,
     ) -> None:
-        if str(guild_id) not in self.configs:
-            self.load_config(guild_id)
         state = self.is_module_enabled(guild_id, module)
-        self.configs[str(guild_id)]['modules'][module]['enabled'] = not state
-        with open(self.config_file, 'w') as f:
-            yaml.dump(self.configs, f, default_flow_style=False)
+        guild_config = self._editable_guild_config(guild_id)
+        guild_config['modules'][module] = {'enabled': not state}
+        self.store.set(
+            str(guild_id), 'modules', module, {'enabled': not state},
+        )
+
+    def close(self) -> None:
+        """
+        Writes any config changes which are still pending
+        """
+        self.store.flush()
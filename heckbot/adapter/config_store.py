@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Any
+from typing import Final
+
+# Seconds changes are collected for before they are written
+CONFIG_WRITE_DELAY: Final[float] = 1.0
+# Number of journal entries after which the snapshot is rewritten
+JOURNAL_COMPACT_SIZE: Final[int] = 256
+
+# guild_id -> group_name -> option -> value
+ConfigRecords = dict[str, dict[str, dict[str, Any]]]
+
+
+class ConfigStore:
+    """
+    Persists guild configs as a YAML snapshot plus an append-only
+    journal of changes. A change is appended to the journal as a single
+    line, so it costs the same no matter how many guilds there are.
+    Changes made within a short window are coalesced into one append.
+    Once the journal grows long, the snapshot is rewritten through a
+    temporary file and a rename, so a crash never leaves a partial
+    snapshot behind, and the journal is emptied.
+    """
+
+    def __init__(
+            self,
+            snapshot_file: str,
+            write_delay: float = CONFIG_WRITE_DELAY,
+            compact_size: int = JOURNAL_COMPACT_SIZE,
+    ) -> None:
+        """
+        Constructor method, which does no I/O
+        :param snapshot_file: Path to the YAML snapshot. The journal is
+        kept next to it.
+        :param write_delay: Seconds to collect changes for before writing
+        :param compact_size: Journal entries after which to compact
+        """
+        self.snapshot_file = snapshot_file
+        self.journal_file = f'{snapshot_file}.journal'
+        self._write_delay = write_delay
+        self._compact_size = compact_size
+        self.records: ConfigRecords = {}
+        # (guild_id, group_name, option) -> value waiting to be written
+        self._pending: dict[tuple[str, str, str], Any] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._journal_entries = 0
+        # Modification times of the snapshot and journal as last seen
+        self._stamps = (0, 0)
+        self.appends = 0
+        self.compactions = 0
+
+    def load(self) -> ConfigRecords:
+        """
+        Reads the snapshot and replays the journal on top of it
+        :return: the config records of every guild
+        """
+        import yaml  # only needed once the config is first loaded
+
+        records: ConfigRecords = {}
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file) as f:
+                records = yaml.safe_load(f) or {}
+        entries = 0
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file) as f:
+                for line in f:
+                    try:
+                        guild_id, group, option, value = json.loads(line)
+                    except ValueError:
+                        # The last line may be torn by a crash mid-append
+                        continue
+                    _apply(records, guild_id, group, option, value)
+                    entries += 1
+        for (guild_id, group, option), value in self._pending.items():
+            _apply(records, guild_id, group, option, value)
+        self.records = records
+        self._journal_entries = entries
+        self._stamps = self._read_stamps()
+        return records
+
+    def changed_on_disk(self) -> bool:
+        """
+        Checks whether the snapshot or journal was changed by something
+        else since they were last loaded or written
+        :return: whether the files were changed
+        """
+        return self._read_stamps() != self._stamps
+
+    def _read_stamps(self) -> tuple[int, int]:
+        stamps = []
+        for path in (self.snapshot_file, self.journal_file):
+            try:
+                stamps.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                stamps.append(0)
+        return stamps[0], stamps[1]
+
+    def set(
+            self,
+            guild_id: str,
+            group: str,
+            option: str,
+            value: Any,
+    ) -> None:
+        """
+        Records a change to a guild's config, which is written shortly
+        after. Without a running event loop, it is written right away.
+        :param guild_id: ID of the guild
+        :param group: Name of the config group, such as 'messages'
+        :param option: Name of the option within the group
+        :param value: New value of the option
+        """
+        _apply(self.records, guild_id, group, option, value)
+        self._pending[(guild_id, group, option)] = value
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(self._write_delay, self.flush)
+
+    def flush(self) -> None:
+        """
+        Appends all pending changes to the journal in one write, and
+        compacts the journal if it has grown long
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        lines = ''.join(
+            json.dumps([guild_id, group, option, value]) + '\n'
+            for (guild_id, group, option), value in self._pending.items()
+        )
+        os.makedirs(os.path.dirname(self.journal_file) or '.', exist_ok=True)
+        with open(self.journal_file, 'a') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_entries += len(self._pending)
+        self._pending.clear()
+        self.appends += 1
+        if self._journal_entries >= self._compact_size:
+            self.compact()
+        self._stamps = self._read_stamps()
+
+    def compact(self) -> None:
+        """
+        Atomically rewrites the snapshot with every guild's config and
+        empties the journal
+        """
+        import yaml
+
+        temp_file = f'{self.snapshot_file}.tmp'
+        os.makedirs(os.path.dirname(temp_file) or '.', exist_ok=True)
+        with open(temp_file, 'w') as f:
+            yaml.safe_dump(self.records, f, default_flow_style=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.snapshot_file)
+        # Replaying the journal onto the new snapshot changes nothing, so
+        #  a crash before it is emptied is harmless
+        with open(self.journal_file, 'w'):
+            pass
+        self._journal_entries = 0
+        self.compactions += 1
+        self._stamps = self._read_stamps()
+
+
+def _apply(
+        records: ConfigRecords,
+        guild_id: str,
+        group: str,
+        option: str,
+        value: Any,
+) -> None:
+    records.setdefault(guild_id, {}).setdefault(group, {})[option] = value
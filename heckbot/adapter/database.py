@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import Final
+from typing import Iterable
+from typing import NamedTuple
+from typing import Sequence
+from typing import TypeVar
+
+READ_CONNECTIONS: Final[int] = 4
+WRITE_BATCH_SIZE: Final[int] = 64
+STATEMENT_CACHE_SIZE: Final[int] = 256
+BUSY_TIMEOUT: Final[float] = 5  # seconds
+
+T = TypeVar('T')
+Parameters = Sequence[Any]
+
+
+class WriteResult(NamedTuple):
+    rowcount: int
+    lastrowid: int | None
+
+
+class _Write(NamedTuple):
+    func: Callable[[sqlite3.Connection], Any]
+    future: asyncio.Future[Any]
+
+
+class AsyncDatabase:
+    """
+    Asynchronous access to a SQLite database which never blocks the
+    event loop. Writes are queued to a dedicated writer thread holding
+    the only write connection, which runs every write waiting in the
+    queue in one transaction so a burst of writes costs one commit.
+    Reads run on a small pool of threads, each with its own connection,
+    and are served concurrently with writes thanks to WAL mode.
+    Connections stay open until close and keep their prepared
+    statements cached.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            read_connections: int = READ_CONNECTIONS,
+    ) -> None:
+        """
+        Constructor method, which does no I/O. Connections are opened on
+        first use.
+        :param path: Path to the database file
+        :param read_connections: Number of connections serving reads
+        """
+        self.path = path
+        self._read_connections = read_connections
+        self._lock = threading.Lock()
+        self._writes: queue.SimpleQueue[_Write | None] = queue.SimpleQueue()
+        self._writer: threading.Thread | None = None
+        self._closing = False
+        self._readers: ThreadPoolExecutor | None = None
+        self._reader_local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self.commits = 0
+        self.writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def _start(self) -> ThreadPoolExecutor:
+        # Must be called with the lock held
+        if self._closing:
+            raise sqlite3.ProgrammingError(f'{self.path} is being closed')
+        if self._readers is None:
+            self._writer = threading.Thread(
+                target=self._write_loop,
+                name=f'heckbot-db-writer-{self.path}',
+                daemon=True,
+            )
+            self._writer.start()
+            self._readers = ThreadPoolExecutor(
+                max_workers=self._read_connections,
+                thread_name_prefix=f'heckbot-db-reader-{self.path}',
+            )
+        return self._readers
+
+    def _write_loop(self) -> None:
+        connection: sqlite3.Connection | None = None
+        while True:
+            write = self._writes.get()
+            if write is None:
+                return
+            batch = [write]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    write = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if write is None:
+                    self._writes.put(None)
+                    break
+                batch.append(write)
+            try:
+                if connection is None:
+                    connection = self._connect()
+                self._run_batch(connection, batch)
+            except Exception as ex:
+                # Only this batch fails, so the writer keeps serving the
+                #  writes queued after it instead of leaving them waiting
+                print(f'Database writer for {self.path} failed: {ex}')
+                self._settle(batch, [(False, ex)] * len(batch))
+
+    def _run_batch(
+            self,
+            connection: sqlite3.Connection,
+            batch: Sequence[_Write],
+    ) -> None:
+        # Each write gets a savepoint, so one failing write is rolled
+        #  back alone while the rest of the batch shares the commit
+        outcomes: list[tuple[bool, Any]] = []
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            for write in batch:
+                connection.execute('SAVEPOINT pending_write')
+                try:
+                    outcomes.append((True, write.func(connection)))
+                except Exception as ex:
+                    connection.execute('ROLLBACK TO pending_write')
+                    outcomes.append((False, ex))
+                connection.execute('RELEASE pending_write')
+            connection.execute('COMMIT')
+        except Exception as ex:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            outcomes = [(False, ex)] * len(batch)
+        else:
+            self.commits += 1
+            self.writes += len(batch)
+        self._settle(batch, outcomes)
+
+    @staticmethod
+    def _settle(
+            batch: Sequence[_Write],
+            outcomes: Sequence[tuple[bool, Any]],
+    ) -> None:
+        for write, (ok, value) in zip(batch, outcomes):
+            try:
+                write.future.get_loop().call_soon_threadsafe(
+                    _resolve, write.future, ok, value,
+                )
+            except RuntimeError:
+                pass  # the caller's event loop is already closed
+
+    def _reader_connection(self) -> sqlite3.Connection:
+        connection = getattr(self._reader_local, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+            connection.execute('PRAGMA query_only=1')
+            self._reader_local.connection = connection
+        return connection
+
+    async def read(
+            self,
+            func: Callable[[sqlite3.Connection], T],
+    ) -> T:
+        """
+        Runs a function with a read connection on the reader pool
+        :param func: Function to run, which must not write
+        :return: the return value of the function
+        """
+        with self._lock:
+            readers = self._start()
+        return await asyncio.get_running_loop().run_in_executor(
+            readers, lambda: func(self._reader_connection()),
+        )
+
+    async def write(
+            self,
+            func: Callable[[sqlite3.Connection], T],
+    ) -> T:
+        """
+        Runs a function with the write connection on the writer thread.
+        The function runs atomically, and its result is returned once
+        it is committed.
+        :param func: Function to run
+        :return: the return value of the function
+        :raises Exception: whatever the function raised, in which case
+        none of its changes are kept
+        :raises sqlite3.ProgrammingError: if the database is being closed
+        """
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[T] = loop.create_future()
+        # Queued under the lock, so a write is either ahead of close's stop
+        #  signal and committed before it, or rejected
+        with self._lock:
+            self._start()
+            self._writes.put(_Write(func, future))
+        return await future
+
+    async def fetch_all(
+            self,
+            sql: str,
+            parameters: Parameters = (),
+    ) -> list[sqlite3.Row]:
+        """
+        Runs a query and returns all of its rows
+        :param sql: Query to run
+        :param parameters: Parameters of the query
+        :return: the rows of the result
+        """
+        return await self.read(
+            lambda conn: conn.execute(sql, parameters).fetchall(),
+        )
+
+    async def fetch_one(
+            self,
+            sql: str,
+            parameters: Parameters = (),
+    ) -> sqlite3.Row | None:
+        """
+        Runs a query and returns its first row
+        :param sql: Query to run
+        :param parameters: Parameters of the query
+        :return: the first row of the result, if any
+        """
+        return await self.read(
+            lambda conn: conn.execute(sql, parameters).fetchone(),
+        )
+
+    async def execute(
+            self,
+            sql: str,
+            parameters: Parameters = (),
+    ) -> WriteResult:
+        """
+        Runs a single writing statement
+        :param sql: Statement to run
+        :param parameters: Parameters of the statement
+        :return: the number of rows changed and the last inserted rowid
+        """
+        def run(conn: sqlite3.Connection) -> WriteResult:
+            cursor = conn.execute(sql, parameters)
+            return WriteResult(cursor.rowcount, cursor.lastrowid)
+        return await self.write(run)
+
+    async def execute_many(
+            self,
+            sql: str,
+            parameters: Iterable[Parameters],
+    ) -> int:
+        """
+        Runs a writing statement once for each set of parameters, all
+        in the same transaction
+        :param sql: Statement to run
+        :param parameters: Parameters of each run of the statement
+        :return: the number of rows changed
+        """
+        parameters = list(parameters)
+        return await self.write(
+            lambda conn: conn.executemany(sql, parameters).rowcount,
+        )
+
+    async def execute_script(
+            self,
+            sql: str,
+    ) -> None:
+        """
+        Runs several statements separated by semicolons, such as a schema
+        :param sql: Statements to run
+        """
+        def run(conn: sqlite3.Connection) -> None:
+            for statement in _split_statements(sql):
+                conn.execute(statement)
+        await self.write(run)
+
+    async def close(self) -> None:
+        """
+        Waits for queued writes to finish and closes all connections.
+        Reads and writes made while closing are rejected, and the
+        database reopens on the next one made after.
+        """
+        with self._lock:
+            writer, readers = self._writer, self._readers
+            if writer is None or self._closing:
+                return
+            self._closing = True
+            self._writer = self._readers = None
+            self._writes.put(None)
+        try:
+            await asyncio.to_thread(writer.join)
+            if readers is not None:
+                await asyncio.to_thread(readers.shutdown)
+            with self._lock:
+                connections, self._connections = self._connections, []
+            for connection in connections:
+                connection.close()
+            self._reader_local = threading.local()
+        finally:
+            with self._lock:
+                self._closing = False
+
+
+def _resolve(
+        future: asyncio.Future[Any],
+        ok: bool,
+        value: Any,
+) -> None:
+    if future.done():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+
+def _split_statements(
+        sql: str,
+) -> list[str]:
+    # executescript would commit the writer's open transaction, so the
+    #  script is split into complete statements and run one by one. A
+    #  semicolon only ends a statement outside of literals and comments.
+    statements = []
+    start = 0
+    end = sql.find(';')
+    while end != -1:
+        if sqlite3.complete_statement(sql[start:end + 1]):
+            statements.append(sql[start:end + 1].strip())
+            start = end + 1
+        end = sql.find(';', end + 1)
+    if sql[start:].strip():
+        statements.append(sql[start:].strip())
+    return statements
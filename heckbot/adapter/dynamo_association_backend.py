@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+from typing import Any
+from typing import Final
+from typing import Iterator
+from typing import Mapping
+from typing import Sequence
+
+from pynamodb.exceptions import DeleteError
+from pynamodb.exceptions import DoesNotExist
+from pynamodb.exceptions import UpdateError
+from pynamodb.models import Model
+
+from heckbot.adapter.batch_writer import batch_save
+from heckbot.types.association import Association
+from heckbot.types.association import ImportedAssociation
+from heckbot.types.association import AssociationConflictError
+from heckbot.types.association import DEFAULT_MATCH_MODE
+from heckbot.types.association import MatchMode
+
+EXPORT_PAGE_SIZE: Final[int] = 100
+REMOVE_ATTEMPTS: Final[int] = 5
+CONDITIONAL_CHECK_FAILED: Final[str] = 'ConditionalCheckFailedException'
+
+
+class DynamoAssociationBackend:
+    """
+    Stores associations in a DynamoDB table keyed by guild ID and
+    pattern, with the values of a pattern in a list attribute. Every
+    edit is a single conditional write, so concurrent edits to the same
+    pattern are not lost.
+    """
+
+    def __init__(
+            self,
+            model: type[Model],
+            attribute: str,
+    ) -> None:
+        """
+        :param model: Model of the table
+        :param attribute: Name of the model's list attribute holding
+        values
+        """
+        # Attributes are declared by each table's own model subclass
+        self._model: Any = model
+        self._attribute = attribute
+        self._values: Any = getattr(model, attribute)
+
+    def ensure_table(self) -> None:
+        if not self._model.exists():
+            self._model.create_table()
+
+    def _association(
+            self,
+            item: Any,
+    ) -> Association:
+        return Association(getattr(item, self._attribute), item.match_mode)
+
+    def query_all(
+            self,
+            guild_id: str,
+    ) -> dict[str, Association]:
+        return {
+            item.pattern: self._association(item)
+            for item in self._model.query(guild_id)
+        }
+
+    def get_values(
+            self,
+            guild_id: str,
+            pattern: str,
+    ) -> list[str]:
+        try:
+            item = self._model.get(guild_id, pattern)
+        except DoesNotExist:
+            return []
+        values: list[str] = getattr(item, self._attribute)
+        return values
+
+    def add_value(
+            self,
+            guild_id: str,
+            pattern: str,
+            value: str,
+            mode: MatchMode | None,
+    ) -> bool:
+        model: Any = self._model
+        actions = [self._values.set((self._values | []).append([value]))]
+        if mode is not None:
+            actions.append(model.match_mode.set(mode))
+        try:
+            model(guild_id, pattern).update(
+                actions=actions,
+                condition=~self._values.contains(value),
+            )
+        except UpdateError as ex:
+            if ex.cause_response_code != CONDITIONAL_CHECK_FAILED:
+                raise
+            # The value is already associated, only the mode may change
+            return mode is not None and self._set_match_mode(
+                guild_id, pattern, mode,
+            )
+        return True
+
+    def _set_match_mode(
+            self,
+            guild_id: str,
+            pattern: str,
+            mode: MatchMode,
+    ) -> bool:
+        model: Any = self._model
+        try:
+            model(guild_id, pattern).update(
+                actions=[model.match_mode.set(mode)],
+                condition=model.match_mode != mode,
+            )
+        except UpdateError as ex:
+            if ex.cause_response_code != CONDITIONAL_CHECK_FAILED:
+                raise
+            return False
+        return True
+
+    def remove_all(
+            self,
+            guild_id: str,
+            pattern: str,
+    ) -> bool:
+        model: Any = self._model
+        try:
+            model(guild_id, pattern).delete(
+                condition=model.pattern.exists(),
+            )
+        except DeleteError as ex:
+            if ex.cause_response_code != CONDITIONAL_CHECK_FAILED:
+                raise
+            return False
+        return True
+
+    def remove_value(
+            self,
+            guild_id: str,
+            pattern: str,
+            value: str,
+            known_values: Sequence[str] | None,
+    ) -> bool:
+        # DynamoDB can only remove list elements by index, so the index
+        #  is taken from the known values when possible and the removal
+        #  is conditional on the element still being that value. If a
+        #  concurrent edit moved it, the item is re-read and retried.
+        model: Any = self._model
+        values = known_values
+        for _ in range(REMOVE_ATTEMPTS):
+            if values is None or value not in values:
+                try:
+                    item = model.get(guild_id, pattern, consistent_read=True)
+                except DoesNotExist:
+                    return False
+                stored: list[str] = getattr(item, self._attribute)
+                if value not in stored:
+                    return False
+                values = stored
+            index = values.index(value)
+            try:
+                model(guild_id, pattern).update(
+                    actions=[self._values[index].remove()],
+                    condition=self._values[index] == value,
+                )
+            except UpdateError as ex:
+                if ex.cause_response_code != CONDITIONAL_CHECK_FAILED:
+                    raise
+                values = None
+                continue
+            return True
+        raise AssociationConflictError(
+            f'"{pattern}" was changed by other edits {REMOVE_ATTEMPTS} '
+            f'times while removing "{value}"',
+        )
+
+    def import_associations(
+            self,
+            guild_id: str,
+            associations: Mapping[str, ImportedAssociation],
+    ) -> int:
+        existing = self.query_all(guild_id)
+        items = []
+        for pattern, association in associations.items():
+            stored = existing.get(pattern)
+            values = list(stored.values if stored is not None else [])
+            values += [v for v in association.values if v not in values]
+            mode = association.mode
+            if mode is None:
+                mode = DEFAULT_MATCH_MODE if stored is None else stored.mode
+            items.append(
+                self._model(
+                    guild_id, pattern,
+                    match_mode=mode,
+                    **{self._attribute: values},
+                ),
+            )
+        batch_save(self._model, items)
+        return len(items)
+
+    def iter_associations(
+            self,
+            guild_id: str,
+    ) -> Iterator[tuple[str, Association]]:
+        for item in self._model.query(
+                guild_id, page_size=EXPORT_PAGE_SIZE,
+        ):
+            yield item.pattern, self._association(item)
@@ -1,61 +1,120 @@
 from __future__ import annotations
 
 import os
+from typing import Iterator
+from typing import Mapping
 from typing import Sequence
+from typing import TextIO
 
 from pynamodb.attributes import ListAttribute
 from pynamodb.attributes import UnicodeAttribute
-from pynamodb.exceptions import DeleteError
-from pynamodb.exceptions import DoesNotExist
-from pynamodb.exceptions import GetError
 from pynamodb.models import Model
 
+from heckbot.adapter.association_backend import AssociationBackend
+from heckbot.adapter.association_backend import get_association_backend
+from heckbot.adapter.association_cache import AssociationCache
+from heckbot.adapter.table_executor import run_in_table_executor
+from heckbot.adapter.table_registry import register_table
+from heckbot.types.association import Association
+from heckbot.types.association import ImportedAssociation
+from heckbot.types.association import DEFAULT_MATCH_MODE
+from heckbot.types.association import MatchMode
+from heckbot.utils.association_io import ExportFormat
+from heckbot.utils.association_io import write_associations
+
 
 class MessageAssociation(Model):
     class Meta:
         read_capacity_units = 1
         write_capacity_units = 1
         table_name = 'HeckBotMessageReactions'
-        host = os.environ['AWS_HOST']
+        host = os.environ.get('AWS_HOST')
 
     guild_id: UnicodeAttribute = UnicodeAttribute(hash_key=True)
     pattern: UnicodeAttribute = UnicodeAttribute(range_key=True)
     messages: ListAttribute[str] = ListAttribute(default=list)
+    match_mode: UnicodeAttribute = UnicodeAttribute(
+        default=DEFAULT_MATCH_MODE,
+    )
 
 
 class MessageTableAdapter:
+    cache: AssociationCache[Mapping[str, Association]] = AssociationCache()
 
-    def __init__(self):
-        if not MessageAssociation.exists():
-            MessageAssociation.create_table()
+    @classmethod
+    def ensure_table(cls) -> None:
+        """
+        Creates the message table if it does not exist yet. This is
+        called once at startup through initialize_tables rather than on
+        construction, so importing and constructing adapters does no I/O.
+        """
+        cls.backend().ensure_table()
+
+    @staticmethod
+    def backend() -> AssociationBackend:
+        """
+        Gets the storage backend chosen by the ASSOCIATION_BACKEND
+        environment variable
+        :return: the backend of the message table
+        """
+        return get_association_backend(MessageAssociation, 'messages')
 
     @classmethod
     def get_all_messages(
             cls,
             guild_id: str,
-    ) -> dict[str, Sequence[str]]:
+    ) -> Mapping[str, Sequence[str]]:
         """
         Finds all messages for a given guild
         :param guild_id: Guild ID to match (PK)
-        :return: a list of messages
+        :return: a mapping of patterns to sequences of messages
+        """
+        return {
+            pattern: association.values
+            for pattern, association
+            in cls.get_all_associations(guild_id).items()
+        }
+
+    @classmethod
+    def get_all_associations(
+            cls,
+            guild_id: str,
+    ) -> Mapping[str, Association]:
+        """
+        Finds all patterns for a given guild along with their messages
+        and match modes
+        :param guild_id: Guild ID to match (PK)
+        :return: a mapping of patterns to associations
         """
-        return {q.pattern: q.messages for q in MessageAssociation.query(guild_id)}
+        associations = cls.cache.get(guild_id)
+        if associations is None:
+            associations = cls._query_all_associations(guild_id)
+        return associations
+
+    @classmethod
+    def _query_all_associations(
+            cls,
+            guild_id: str,
+    ) -> Mapping[str, Association]:
+        epoch = cls.cache.epoch
+        associations = cls.backend().query_all(guild_id)
+        cls.cache.put(guild_id, associations, epoch)
+        return associations
 
     @classmethod
     def get_messages(
             cls,
             guild_id: str,
-            pattern: str | None = None,
+            pattern: str,
     ) -> Sequence[str]:
         """
-        Finds the desired messages for a given guild and (optionally)
-         pattern in the MessageTableAdapter
+        Finds the desired messages for a given guild and pattern in the
+        MessageTableAdapter
         :param guild_id: Guild ID to match (PK)
         :param pattern: pattern to match (SK)
-        :return: a list of messages
+        :return: a sequence of messages, empty if the pattern is unknown
         """
-        messages: list[str] = MessageAssociation.get(guild_id, pattern).messages
-        return messages
+        return cls.backend().get_values(guild_id, pattern)
 
     @classmethod
     def add_message(
@@ -63,48 +122,41 @@ class MessageTableAdapter:
             guild_id: str,
             pattern: str,
             message: str,
-    ) -> None:
+            mode: MatchMode | None = None,
+    ) -> bool:
         """
         Adds the given message to the given guild id and pattern in the
-         MessageTableAdapter
+        MessageTableAdapter with a single write, so concurrent edits to the
+        same pattern are not lost.
         :param guild_id: Guild ID to match (PK)
         :param pattern: pattern to match (SK)
         :param message: Message to add
+        :param mode: How the pattern is matched, if unspecified an
+        existing pattern keeps its mode and a new one matches substrings
+        :return: whether the association changed
         """
-        try:
-            association = MessageAssociation.get(guild_id, pattern)
-            association.messages.append(message)
-        except GetError:
-            association = MessageAssociation(
-                guild_id, pattern, messages=[message],
-            )
-        except DoesNotExist:
-            association = MessageAssociation(
-                guild_id, pattern, messages=[message],
-            )
-        association.save()
+        changed = cls.backend().add_value(guild_id, pattern, message, mode)
+        if changed:
+            cls.cache.invalidate(guild_id)
+        return changed
 
     @classmethod
     def remove_all_messages(
             cls,
             guild_id: str,
             pattern: str,
-    ) -> None:
+    ) -> bool:
         """
-        Removes all message responses to a given pattern in a given
-         guild in the MessageTableAdapter
+        Removes all messages to a given pattern in a given guild in the
+        MessageTableAdapter.
         :param guild_id: Guild ID to match (PK)
         :param pattern: pattern to match (SK)
+        :return: whether an association was removed
         """
-        try:
-            association = MessageAssociation.get(guild_id, pattern)
-            association.delete()
-        except GetError:
-            return  # TODO more
-        except DoesNotExist:
-            return  # TODO more
-        except DeleteError:
-            return  # TODO more
+        removed = cls.backend().remove_all(guild_id, pattern)
+        if removed:
+            cls.cache.invalidate(guild_id)
+        return removed
 
     @classmethod
     def remove_message(
@@ -112,21 +164,203 @@ class MessageTableAdapter:
             guild_id: str,
             pattern: str,
             message: str,
-    ) -> None:
+    ) -> bool:
         """
-        Removes the specified association
+        Removes the given message from the given guild id and pattern
+        in the MessageTableAdapter. The cached associations, if any, spare
+        the backend from reading the item first.
         :param guild_id: Guild ID to match (PK)
         :param pattern: pattern to match (SK)
-        :param message: Message to remove (if unspecified, will remove
-        all)
+        :param message: Message to remove
+        :return: whether the association changed
+        :raises AssociationConflictError: if concurrent edits keep the
+        message from being removed
+        """
+        cached = cls.cache.get(guild_id)
+        changed = cls.backend().remove_value(
+            guild_id,
+            pattern,
+            message,
+            cached[pattern].values
+            if cached is not None and pattern in cached else None,
+        )
+        if changed:
+            cls.cache.invalidate(guild_id)
+        return changed
+
+    @classmethod
+    def import_messages(
+            cls,
+            guild_id: str,
+            associations: Mapping[str, ImportedAssociation],
+    ) -> int:
+        """
+        Merges the given associations into a guild's existing ones using
+        batched writes. New messages are appended to those already
+        associated with a pattern, and the imported match mode, if any,
+        replaces the existing one.
+        :param guild_id: Guild ID to import into (PK)
+        :param associations: Mapping of patterns to associations
+        :return: the number of patterns written
         """
         try:
-            association = MessageAssociation.get(guild_id, pattern)
-            association.messages.remove(message)
-            association.save()
-        except GetError:
-            return  # TODO more
-        except DoesNotExist:
-            return  # TODO more
-        except DeleteError:
-            return  # TODO more
+            return cls.backend().import_associations(guild_id, associations)
+        finally:
+            cls.cache.invalidate(guild_id)
+
+    @classmethod
+    def export_messages(
+            cls,
+            guild_id: str,
+    ) -> Iterator[tuple[str, Association]]:
+        """
+        Streams all associations of a guild, fetching them from the
+        table one page at a time
+        :param guild_id: Guild ID to match (PK)
+        :return: an iterator of patterns and their associations
+        """
+        return cls.backend().iter_associations(guild_id)
+
+    @classmethod
+    async def aget_all_messages(
+            cls,
+            guild_id: str,
+    ) -> Mapping[str, Sequence[str]]:
+        """
+        Asynchronous version of get_all_messages
+        :param guild_id: Guild ID to match (PK)
+        :return: a mapping of patterns to sequences of messages
+        """
+        return {
+            pattern: association.values
+            for pattern, association
+            in (await cls.aget_all_associations(guild_id)).items()
+        }
+
+    @classmethod
+    async def aget_all_associations(
+            cls,
+            guild_id: str,
+    ) -> Mapping[str, Association]:
+        """
+        Asynchronous version of get_all_associations, which only leaves
+        the event loop when the guild is not cached
+        :param guild_id: Guild ID to match (PK)
+        :return: a mapping of patterns to associations
+        """
+        associations = cls.cache.get(guild_id)
+        if associations is None:
+            associations = await run_in_table_executor(
+                cls._query_all_associations, guild_id,
+            )
+        return associations
+
+    @classmethod
+    async def aget_messages(
+            cls,
+            guild_id: str,
+            pattern: str,
+    ) -> Sequence[str]:
+        """
+        Asynchronous version of get_messages
+        :param guild_id: Guild ID to match (PK)
+        :param pattern: pattern to match (SK)
+        :return: a sequence of messages
+        """
+        return await run_in_table_executor(
+            cls.get_messages, guild_id, pattern,
+        )
+
+    @classmethod
+    async def aadd_message(
+            cls,
+            guild_id: str,
+            pattern: str,
+            message: str,
+            mode: MatchMode | None = None,
+    ) -> bool:
+        """
+        Asynchronous version of add_message
+        :param guild_id: Guild ID to match (PK)
+        :param pattern: pattern to match (SK)
+        :param message: Message to add
+        :param mode: How the pattern is matched
+        :return: whether the association changed
+        """
+        return await run_in_table_executor(
+            cls.add_message, guild_id, pattern, message, mode,
+        )
+
+    @classmethod
+    async def aremove_all_messages(
+            cls,
+            guild_id: str,
+            pattern: str,
+    ) -> bool:
+        """
+        Asynchronous version of remove_all_messages
+        :param guild_id: Guild ID to match (PK)
+        :param pattern: pattern to match (SK)
+        :return: whether the association was removed
+        """
+        return await run_in_table_executor(
+            cls.remove_all_messages, guild_id, pattern,
+        )
+
+    @classmethod
+    async def aremove_message(
+            cls,
+            guild_id: str,
+            pattern: str,
+            message: str,
+    ) -> bool:
+        """
+        Asynchronous version of remove_message
+        :param guild_id: Guild ID to match (PK)
+        :param pattern: pattern to match (SK)
+        :param message: Message to remove
+        :return: whether the association changed
+        """
+        return await run_in_table_executor(
+            cls.remove_message, guild_id, pattern, message,
+        )
+
+    @classmethod
+    async def aimport_messages(
+            cls,
+            guild_id: str,
+            associations: Mapping[str, ImportedAssociation],
+    ) -> int:
+        """
+        Asynchronous version of import_messages
+        :param guild_id: Guild ID to import into (PK)
+        :param associations: Mapping of patterns to associations
+        :return: the number of patterns written
+        """
+        return await run_in_table_executor(
+            cls.import_messages, guild_id, associations,
+        )
+
+    @classmethod
+    async def aexport_messages(
+            cls,
+            guild_id: str,
+            fp: TextIO,
+            fmt: ExportFormat,
+    ) -> int:
+        """
+        Writes all associations of a guild to a file, page by page
+        :param guild_id: Guild ID to match (PK)
+        :param fp: File to write to
+        :param fmt: Format to write, json or csv
+        :return: the number of patterns written
+        """
+        return await run_in_table_executor(
+            write_associations, cls.export_messages(guild_id), fp, fmt,
+        )
+
+
+register_table(
+    MessageAssociation.Meta.table_name,
+    MessageTableAdapter.ensure_table,
+)
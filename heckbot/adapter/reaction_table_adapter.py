@@ -1,33 +1,62 @@
 from __future__ import annotations
 
 import os
+from typing import Iterator
 from typing import Mapping
 from typing import Sequence
+from typing import TextIO
 
 from pynamodb.attributes import ListAttribute
 from pynamodb.attributes import UnicodeAttribute
-from pynamodb.exceptions import DeleteError
-from pynamodb.exceptions import DoesNotExist
-from pynamodb.exceptions import GetError
 from pynamodb.models import Model
 
+from heckbot.adapter.association_backend import AssociationBackend
+from heckbot.adapter.association_backend import get_association_backend
+from heckbot.adapter.association_cache import AssociationCache
+from heckbot.adapter.table_executor import run_in_table_executor
+from heckbot.adapter.table_registry import register_table
+from heckbot.types.association import Association
+from heckbot.types.association import ImportedAssociation
+from heckbot.types.association import DEFAULT_MATCH_MODE
+from heckbot.types.association import MatchMode
+from heckbot.utils.association_io import ExportFormat
+from heckbot.utils.association_io import write_associations
+
 
 class ReactionAssociation(Model):
     class Meta:
         read_capacity_units = 1
         write_capacity_units = 1
         table_name = 'HeckBotReactions'
-        host = os.environ['AWS_HOST']
+        host = os.environ.get('AWS_HOST')
     guild_id: UnicodeAttribute = UnicodeAttribute(hash_key=True)
     pattern: UnicodeAttribute = UnicodeAttribute(range_key=True)
     reactions: ListAttribute[str] = ListAttribute(default=list)
+    match_mode: UnicodeAttribute = UnicodeAttribute(
+        default=DEFAULT_MATCH_MODE,
+    )
 
 
 class ReactionTableAdapter:
+    cache: AssociationCache[Mapping[str, Association]] = AssociationCache()
 
-    def __init__(self):
-        if not ReactionAssociation.exists():
-            ReactionAssociation.create_table()
+    @classmethod
+    def ensure_table(cls) -> None:
+        """
+        Creates the reaction table if it does not exist yet. This is
+        called once at startup through initialize_tables rather than on
+        construction, so importing and constructing adapters does no I/O.
+        """
+        cls.backend().ensure_table()
+
+    @staticmethod
+    def backend() -> AssociationBackend:
+        """
+        Gets the storage backend chosen by the ASSOCIATION_BACKEND
+        environment variable
+        :return: the backend of the reaction table
+        """
+        return get_association_backend(ReactionAssociation, 'reactions')
 
     @classmethod
     def get_all_reactions(
@@ -39,23 +68,52 @@ class ReactionTableAdapter:
         :param guild_id: Guild ID to match (PK)
         :return: a mapping of patterns to sequences of reactions
         """
-        return {q.pattern: q.reactions for q in ReactionAssociation.query(guild_id)}
+        return {
+            pattern: association.values
+            for pattern, association
+            in cls.get_all_associations(guild_id).items()
+        }
+
+    @classmethod
+    def get_all_associations(
+            cls,
+            guild_id: str,
+    ) -> Mapping[str, Association]:
+        """
+        Finds all patterns for a given guild along with their reactions
+        and match modes
+        :param guild_id: Guild ID to match (PK)
+        :return: a mapping of patterns to associations
+        """
+        associations = cls.cache.get(guild_id)
+        if associations is None:
+            associations = cls._query_all_associations(guild_id)
+        return associations
+
+    @classmethod
+    def _query_all_associations(
+            cls,
+            guild_id: str,
+    ) -> Mapping[str, Association]:
+        epoch = cls.cache.epoch
+        associations = cls.backend().query_all(guild_id)
+        cls.cache.put(guild_id, associations, epoch)
+        return associations
 
     @classmethod
     def get_reactions(
             cls,
             guild_id: str,
-            pattern: str | None = None,
+            pattern: str,
     ) -> Sequence[str]:
         """
-        Finds the desired reactions for a given guild and (optionally)
-        pattern in the ReactionTableAdapter
+        Finds the desired reactions for a given guild and pattern in the
+        ReactionTableAdapter
         :param guild_id: Guild ID to match (PK)
         :param pattern: pattern to match (SK)
-        :return: a sequence of reactions
+        :return: a sequence of reactions, empty if the pattern is unknown
         """
-        reactions: list[str] = ReactionAssociation.get(guild_id, pattern).reactions
-        return reactions
+        return cls.backend().get_values(guild_id, pattern)
 
     @classmethod
     def add_reaction(
@@ -63,48 +121,41 @@ class ReactionTableAdapter:
             guild_id: str,
             pattern: str,
             reaction: str,
-    ) -> None:
+            mode: MatchMode | None = None,
+    ) -> bool:
         """
         Adds the given reaction to the given guild id and pattern in the
-        ReactionTableAdapter.
+        ReactionTableAdapter with a single write, so concurrent edits to the
+        same pattern are not lost.
         :param guild_id: Guild ID to match (PK)
         :param pattern: pattern to match (SK)
         :param reaction: Reaction to add
+        :param mode: How the pattern is matched, if unspecified an
+        existing pattern keeps its mode and a new one matches substrings
+        :return: whether the association changed
         """
-        try:
-            association = ReactionAssociation.get(guild_id, pattern)
-            association.reactions.append(reaction)
-        except GetError:
-            association = ReactionAssociation(
-                guild_id, pattern, reactions=[reaction],
-            )
-        except DoesNotExist:
-            association = ReactionAssociation(
-                guild_id, pattern, reactions=[reaction],
-            )
-        association.save()
+        changed = cls.backend().add_value(guild_id, pattern, reaction, mode)
+        if changed:
+            cls.cache.invalidate(guild_id)
+        return changed
 
     @classmethod
     def remove_all_reactions(
             cls,
             guild_id: str,
             pattern: str,
-    ) -> None:
+    ) -> bool:
         """
         Removes all reactions to a given pattern in a given guild in the
         ReactionTableAdapter.
         :param guild_id: Guild ID to match (PK)
         :param pattern: pattern to match (SK)
+        :return: whether an association was removed
         """
-        try:
-            association = ReactionAssociation.get(guild_id, pattern)
-            association.delete()
-        except GetError:
-            return  # TODO more
-        except DoesNotExist:
-            return  # TODO more
-        except DeleteError:
-            return  # TODO more
+        removed = cls.backend().remove_all(guild_id, pattern)
+        if removed:
+            cls.cache.invalidate(guild_id)
+        return removed
 
     @classmethod
     def remove_reaction(
@@ -112,21 +163,203 @@ class ReactionTableAdapter:
             guild_id: str,
             pattern: str,
             reaction: str,
-    ) -> None:
+    ) -> bool:
         """
         Removes the given reaction from the given guild id and pattern
-        in the ReactionTableAdapter.
+        in the ReactionTableAdapter. The cached associations, if any, spare
+        the backend from reading the item first.
         :param guild_id: Guild ID to match (PK)
         :param pattern: pattern to match (SK)
         :param reaction: Reaction to remove
+        :return: whether the association changed
+        :raises AssociationConflictError: if concurrent edits keep the
+        reaction from being removed
+        """
+        cached = cls.cache.get(guild_id)
+        changed = cls.backend().remove_value(
+            guild_id,
+            pattern,
+            reaction,
+            cached[pattern].values
+            if cached is not None and pattern in cached else None,
+        )
+        if changed:
+            cls.cache.invalidate(guild_id)
+        return changed
+
+    @classmethod
+    def import_reactions(
+            cls,
+            guild_id: str,
+            associations: Mapping[str, ImportedAssociation],
+    ) -> int:
+        """
+        Merges the given associations into a guild's existing ones using
+        batched writes. New reactions are appended to those already
+        associated with a pattern, and the imported match mode, if any,
+        replaces the existing one.
+        :param guild_id: Guild ID to import into (PK)
+        :param associations: Mapping of patterns to associations
+        :return: the number of patterns written
         """
         try:
-            association = ReactionAssociation.get(guild_id, pattern)
-            association.reactions.remove(reaction)
-            association.save()
-        except GetError:
-            return  # TODO more
-        except DoesNotExist:
-            return  # TODO more
-        except DeleteError:
-            return  # TODO more
+            return cls.backend().import_associations(guild_id, associations)
+        finally:
+            cls.cache.invalidate(guild_id)
+
+    @classmethod
+    def export_reactions(
+            cls,
+            guild_id: str,
+    ) -> Iterator[tuple[str, Association]]:
+        """
+        Streams all associations of a guild, fetching them from the
+        table one page at a time
+        :param guild_id: Guild ID to match (PK)
+        :return: an iterator of patterns and their associations
+        """
+        return cls.backend().iter_associations(guild_id)
+
+    @classmethod
+    async def aget_all_reactions(
+            cls,
+            guild_id: str,
+    ) -> Mapping[str, Sequence[str]]:
+        """
+        Asynchronous version of get_all_reactions
+        :param guild_id: Guild ID to match (PK)
+        :return: a mapping of patterns to sequences of reactions
+        """
+        return {
+            pattern: association.values
+            for pattern, association
+            in (await cls.aget_all_associations(guild_id)).items()
+        }
+
+    @classmethod
+    async def aget_all_associations(
+            cls,
+            guild_id: str,
+    ) -> Mapping[str, Association]:
+        """
+        Asynchronous version of get_all_associations, which only leaves
+        the event loop when the guild is not cached
+        :param guild_id: Guild ID to match (PK)
+        :return: a mapping of patterns to associations
+        """
+        associations = cls.cache.get(guild_id)
+        if associations is None:
+            associations = await run_in_table_executor(
+                cls._query_all_associations, guild_id,
+            )
+        return associations
+
+    @classmethod
+    async def aget_reactions(
+            cls,
+            guild_id: str,
+            pattern: str,
+    ) -> Sequence[str]:
+        """
+        Asynchronous version of get_reactions
+        :param guild_id: Guild ID to match (PK)
+        :param pattern: pattern to match (SK)
+        :return: a sequence of reactions
+        """
+        return await run_in_table_executor(
+            cls.get_reactions, guild_id, pattern,
+        )
+
+    @classmethod
+    async def aadd_reaction(
+            cls,
+            guild_id: str,
+            pattern: str,
+            reaction: str,
+            mode: MatchMode | None = None,
+    ) -> bool:
+        """
+        Asynchronous version of add_reaction
+        :param guild_id: Guild ID to match (PK)
+        :param pattern: pattern to match (SK)
+        :param reaction: Reaction to add
+        :param mode: How the pattern is matched
+        :return: whether the association changed
+        """
+        return await run_in_table_executor(
+            cls.add_reaction, guild_id, pattern, reaction, mode,
+        )
+
+    @classmethod
+    async def aremove_all_reactions(
+            cls,
+            guild_id: str,
+            pattern: str,
+    ) -> bool:
+        """
+        Asynchronous version of remove_all_reactions
+        :param guild_id: Guild ID to match (PK)
+        :param pattern: pattern to match (SK)
+        :return: whether the association was removed
+        """
+        return await run_in_table_executor(
+            cls.remove_all_reactions, guild_id, pattern,
+        )
+
+    @classmethod
+    async def aremove_reaction(
+            cls,
+            guild_id: str,
+            pattern: str,
+            reaction: str,
+    ) -> bool:
+        """
+        Asynchronous version of remove_reaction
+        :param guild_id: Guild ID to match (PK)
+        :param pattern: pattern to match (SK)
+        :param reaction: Reaction to remove
+        :return: whether the association changed
+        """
+        return await run_in_table_executor(
+            cls.remove_reaction, guild_id, pattern, reaction,
+        )
+
+    @classmethod
+    async def aimport_reactions(
+            cls,
+            guild_id: str,
+            associations: Mapping[str, ImportedAssociation],
+    ) -> int:
+        """
+        Asynchronous version of import_reactions
+        :param guild_id: Guild ID to import into (PK)
+        :param associations: Mapping of patterns to associations
+        :return: the number of patterns written
+        """
+        return await run_in_table_executor(
+            cls.import_reactions, guild_id, associations,
+        )
+
+    @classmethod
+    async def aexport_reactions(
+            cls,
+            guild_id: str,
+            fp: TextIO,
+            fmt: ExportFormat,
+    ) -> int:
+        """
+        Writes all associations of a guild to a file, page by page
+        :param guild_id: Guild ID to match (PK)
+        :param fp: File to write to
+        :param fmt: Format to write, json or csv
+        :return: the number of patterns written
+        """
+        return await run_in_table_executor(
+            write_associations, cls.export_reactions(guild_id), fp, fmt,
+        )
+
+
+register_table(
+    ReactionAssociation.Meta.table_name,
+    ReactionTableAdapter.ensure_table,
+)
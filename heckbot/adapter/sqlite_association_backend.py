@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any
+from typing import Final
+from typing import Iterable
+from typing import Iterator
+from typing import Mapping
+from typing import Sequence
+
+from heckbot.types.association import Association
+from heckbot.types.association import ImportedAssociation
+from heckbot.types.association import DEFAULT_MATCH_MODE
+from heckbot.types.association import MatchMode
+
+EXPORT_PAGE_SIZE: Final[int] = 100
+SQLITE_BUSY_TIMEOUT: Final[float] = 5  # seconds
+
+
+class SqliteAssociationBackend:
+    """
+    Stores associations in a local SQLite database with one row per
+    value, keyed by (guild_id, pattern, value) so lookups by guild and
+    pattern are index scans. One connection in WAL mode stays open for
+    the life of the bot and is shared by the table executor's threads.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            table_name: str,
+    ) -> None:
+        """
+        :param path: Path to the database file
+        :param table_name: Name of the table holding the associations
+        """
+        if not table_name.isidentifier():
+            raise ValueError(f'Invalid table name "{table_name}"')
+        self._table = table_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path,
+            timeout=SQLITE_BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def _read(
+            self,
+            sql: str,
+            parameters: Sequence[object],
+    ) -> list[tuple[Any, ...]]:
+        with self._lock:
+            return self._conn.execute(sql, parameters).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def ensure_table(self) -> None:
+        with self._lock:
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self._table} ('
+                'guild_id TEXT NOT NULL, '
+                'pattern TEXT NOT NULL, '
+                'value TEXT NOT NULL, '
+                'match_mode TEXT NOT NULL, '
+                'PRIMARY KEY (guild_id, pattern, value))',
+            )
+
+    @staticmethod
+    def _group(
+            rows: Iterable[tuple[str, str, MatchMode]],
+    ) -> dict[str, Association]:
+        values: dict[str, list[str]] = {}
+        modes: dict[str, MatchMode] = {}
+        for pattern, value, mode in rows:
+            values.setdefault(pattern, []).append(value)
+            modes[pattern] = mode
+        return {
+            pattern: Association(pattern_values, modes[pattern])
+            for pattern, pattern_values in values.items()
+        }
+
+    def query_all(
+            self,
+            guild_id: str,
+    ) -> dict[str, Association]:
+        return self._group(
+            self._read(
+                f'SELECT pattern, value, match_mode FROM {self._table} '
+                'WHERE guild_id = ? ORDER BY pattern, rowid',
+                (guild_id,),
+            ),
+        )
+
+    def get_values(
+            self,
+            guild_id: str,
+            pattern: str,
+    ) -> list[str]:
+        return [
+            value for value, in self._read(
+                f'SELECT value FROM {self._table} '
+                'WHERE guild_id = ? AND pattern = ? ORDER BY rowid',
+                (guild_id, pattern),
+            )
+        ]
+
+    def add_value(
+            self,
+            guild_id: str,
+            pattern: str,
+            value: str,
+            mode: MatchMode | None,
+    ) -> bool:
+        with self._transaction() as conn:
+            changed = conn.execute(
+                f'INSERT OR IGNORE INTO {self._table} '
+                'VALUES (?, ?, ?, ?)',
+                (
+                    guild_id, pattern, value,
+                    self._insert_mode(conn, guild_id, pattern, mode),
+                ),
+            ).rowcount > 0
+            if mode is not None:
+                changed |= self._set_match_mode(conn, guild_id, pattern, mode)
+        return changed
+
+    def _insert_mode(
+            self,
+            conn: sqlite3.Connection,
+            guild_id: str,
+            pattern: str,
+            mode: MatchMode | None,
+    ) -> MatchMode:
+        # Without a mode, new values take the pattern's existing one
+        if mode is not None:
+            return mode
+        row = conn.execute(
+            f'SELECT match_mode FROM {self._table} '
+            'WHERE guild_id = ? AND pattern = ? LIMIT 1',
+            (guild_id, pattern),
+        ).fetchone()
+        return DEFAULT_MATCH_MODE if row is None else row[0]
+
+    def _set_match_mode(
+            self,
+            conn: sqlite3.Connection,
+            guild_id: str,
+            pattern: str,
+            mode: MatchMode,
+    ) -> bool:
+        return conn.execute(
+            f'UPDATE {self._table} SET match_mode = ? '
+            'WHERE guild_id = ? AND pattern = ? AND match_mode != ?',
+            (mode, guild_id, pattern, mode),
+        ).rowcount > 0
+
+    def remove_all(
+            self,
+            guild_id: str,
+            pattern: str,
+    ) -> bool:
+        with self._transaction() as conn:
+            return conn.execute(
+                f'DELETE FROM {self._table} '
+                'WHERE guild_id = ? AND pattern = ?',
+                (guild_id, pattern),
+            ).rowcount > 0
+
+    def remove_value(
+            self,
+            guild_id: str,
+            pattern: str,
+            value: str,
+            known_values: Sequence[str] | None,
+    ) -> bool:
+        with self._transaction() as conn:
+            return conn.execute(
+                f'DELETE FROM {self._table} '
+                'WHERE guild_id = ? AND pattern = ? AND value = ?',
+                (guild_id, pattern, value),
+            ).rowcount > 0
+
+    def import_associations(
+            self,
+            guild_id: str,
+            associations: Mapping[str, ImportedAssociation],
+    ) -> int:
+        with self._transaction() as conn:
+            for pattern, association in associations.items():
+                mode = self._insert_mode(
+                    conn, guild_id, pattern, association.mode,
+                )
+                conn.executemany(
+                    f'INSERT OR IGNORE INTO {self._table} '
+                    'VALUES (?, ?, ?, ?)',
+                    [
+                        (guild_id, pattern, value, mode)
+                        for value in association.values
+                    ],
+                )
+                if association.mode is not None:
+                    self._set_match_mode(
+                        conn, guild_id, pattern, association.mode,
+                    )
+        return len(associations)
+
+    def iter_associations(
+            self,
+            guild_id: str,
+    ) -> Iterator[tuple[str, Association]]:
+        # Pages are keyed on the last pattern seen, so the connection is
+        #  not held between pages
+        last_pattern = ''
+        while True:
+            page = self._group(
+                self._read(
+                    f'SELECT pattern, value, match_mode FROM {self._table} '
+                    'WHERE guild_id = ? AND pattern IN ('
+                    f'SELECT DISTINCT pattern FROM {self._table} '
+                    'WHERE guild_id = ? AND pattern > ? '
+                    'ORDER BY pattern LIMIT ?) '
+                    'ORDER BY pattern, rowid',
+                    (guild_id, guild_id, last_pattern, EXPORT_PAGE_SIZE),
+                ),
+            )
+            yield from page.items()
+            if len(page) < EXPORT_PAGE_SIZE:
+                return
+            last_pattern = next(reversed(page))
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import Final
+from typing import TypeVar
+
+# Upper bound on concurrent blocking table calls, so a burst of lookups
+#  queues up here instead of exhausting the default executor. The
+#  TABLE_MAX_WORKERS environment variable overrides it.
+DEFAULT_TABLE_MAX_WORKERS: Final[int] = 4
+
+T = TypeVar('T')
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_table_executor() -> ThreadPoolExecutor:
+    """
+    Gets the thread pool dedicated to blocking table calls, creating it
+    on first use. TABLE_MAX_WORKERS is read then rather than at import,
+    so a value loaded from .env by the bot takes effect.
+    :return: the table thread pool
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(
+                os.getenv('TABLE_MAX_WORKERS', DEFAULT_TABLE_MAX_WORKERS),
+            ),
+            thread_name_prefix='heckbot-table',
+        )
+    return _executor
+
+
+async def run_in_table_executor(
+        func: Callable[..., T],
+        *args: Any,
+        **kwargs: Any,
+) -> T:
+    """
+    Runs a blocking table call on the table thread pool without blocking
+    the event loop
+    :param func: Blocking function to call
+    :param args: Positional arguments for the function
+    :param kwargs: Keyword arguments for the function
+    :return: the return value of the function
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        get_table_executor(),
+        functools.partial(func, *args, **kwargs),
+    )
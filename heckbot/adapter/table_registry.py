@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Callable
+
+from heckbot.adapter.table_executor import run_in_table_executor
+
+_tables: dict[str, Callable[[], None]] = {}
+_ready: set[str] = set()
+
+
+def register_table(
+        name: str,
+        ensure_table: Callable[[], None],
+) -> None:
+    """
+    Registers a table to be created, if missing, by initialize_tables.
+    Registering does no I/O, so adapters can do it at import time.
+    :param name: Name of the table
+    :param ensure_table: Blocking function creating the table if it
+    does not exist yet
+    """
+    _tables.setdefault(name, ensure_table)
+
+
+async def initialize_tables() -> None:
+    """
+    Checks that every registered table exists, running the checks
+    concurrently on the table executor. A table is only checked once per
+    process, so calling this again only checks tables registered since.
+    :raises Exception: the first error raised by a table's check, the
+    failed tables are checked again on the next call
+    """
+    pending = [name for name in _tables if name not in _ready]
+    results = await asyncio.gather(
+        *(run_in_table_executor(_tables[name]) for name in pending),
+        return_exceptions=True,
+    )
+    for name, result in zip(pending, results):
+        if not isinstance(result, BaseException):
+            _ready.add(name)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
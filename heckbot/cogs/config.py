@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 from typing import Literal
+from typing import TYPE_CHECKING
 
 from discord.ext import commands
 from discord.ext.commands import Bot
 from discord.ext.commands import Context
 
-from bot import HeckBot
 from heckbot.adapter.config_adapter import ConfigAdapter
 
+if TYPE_CHECKING:
+    # noinspection PyUnresolvedReferences
+    from bot import HeckBot
+
 ConfigCommand = Literal[
     'add', 'create', 'update', 'set', 'remove', 'unset',
     'delete', 'get', 'read', 'load', 'list',
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+from typing import TYPE_CHECKING
+
 import discord
 from discord import TextChannel
 from discord.ext import commands
 
-from bot import HeckBot
 from heckbot.types.constants import PRIMARY_GUILD_ID
 from heckbot.types.constants import WELCOME_CHANNEL_ID
 
+if TYPE_CHECKING:
+    # noinspection PyUnresolvedReferences
+    from bot import HeckBot
+
 
 class Events(commands.Cog):
     def __init__(
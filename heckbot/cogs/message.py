@@ -1,14 +1,25 @@
 from __future__ import annotations
 
 import asyncio
+import io
+from typing import TYPE_CHECKING
 
 import discord
 from discord.ext import commands
 from discord.ext.commands import Bot
 from discord.ext.commands import Context
 
-from bot import HeckBot
 from heckbot.adapter.message_table_adapter import MessageTableAdapter
+from heckbot.types.association import AssociationConflictError
+from heckbot.types.keyword_message import KeywordMessage
+from heckbot.utils.association_io import EXPORT_FORMATS
+from heckbot.utils.association_io import parse_associations
+from heckbot.utils.matcher import MatcherRegistry
+from heckbot.utils.matcher import validate_pattern
+
+if TYPE_CHECKING:
+    # noinspection PyUnresolvedReferences
+    from bot import HeckBot
 
 
 class Message(commands.Cog):
@@ -27,6 +38,10 @@ class Message(commands.Cog):
         :param bot: Instance of the running Bot
         """
         self._bot = bot
+        self._matchers = MatcherRegistry(
+            self._message_table.aget_all_associations,
+            max_age=self._message_table.cache.ttl,
+        )
 
     @commands.command(aliases=['message', 'addresponse', 'respond'])
     async def msg(
@@ -55,6 +70,12 @@ class Message(commands.Cog):
                 await self.mdel(ctx, pattern, message)
         # elif subcommand in ['list', 'lst']:
         #     await self.mlist(ctx, pattern)
+        elif subcommand == 'stats':
+            await self.mstats(ctx)
+        elif subcommand == 'import':
+            await self.mimport(ctx)
+        elif subcommand == 'export':
+            await self.mexport(ctx, pattern)
 
     @commands.command(aliases=['messageadd', 'msgadd', 'madd'])
     async def message_add(
@@ -62,17 +83,21 @@ class Message(commands.Cog):
             ctx: Context[Bot],
             pattern: str,
             message: str,
+            mode: str | None = None,
     ) -> None:
         """
         Message association command. Creates an association between a
         pattern and message such that any messages which contain the
         specified pattern will be responded to with the specified
-        message, permission permitting.
+        message, permission permitting. The pattern matches any
+        substring of a message by default, or only whole words with the
+        word mode, or is a regular expression with the regex mode.
         :param ctx: Command context
         :param pattern: Pattern string to match with the message
         :param message: Message to respond with
+        :param mode: How the pattern is matched: substring, word or regex
         """
-        await self.madd(ctx, pattern, message)
+        await self.madd(ctx, pattern, message, mode)
 
     @commands.command(
         aliases=[
@@ -99,52 +124,75 @@ class Message(commands.Cog):
         """
         await self.mdel(ctx, pattern, message)
 
-    @commands.Cog.listener('on_message')
-    async def on_message(
+    async def cog_load(self) -> None:
+        self._bot.add_keyword_listener(self.on_keyword_message)
+
+    async def cog_unload(self) -> None:
+        self._bot.remove_keyword_listener(self.on_keyword_message)
+
+    async def on_keyword_message(
             self,
-            message: discord.Message,
+            keyword_message: KeywordMessage,
     ) -> None:
         """
-        Event listener triggered whenever the bot detects a message.
-        This listener will attempt to match the text contents of the
-        given message with all registered message response associations
-        to respond with all appropriate messages based on the contents
-        of the message.
-        :param message: The Discord message to be analyzed
+        Keyword listener triggered whenever the bot receives a
+        non-command guild message. This listener will attempt to match
+        the text contents of the given message with all registered
+        message response associations to respond with all appropriate
+        messages based on the contents of the message.
+        :param keyword_message: The parsed Discord message to be analyzed
         """
-        if message.author.bot or (
-                await self._bot.get_context(message)
-        ).valid:
-            return
-
-        text = message.content.lower()
-        guild = message.guild
-        if guild is None:
-            return
-
-        associations = self._message_table.get_all_messages(
-            str(guild.id),
+        matcher = await self._matchers.get(keyword_message.guild_id)
+        matches = matcher.match(
+            keyword_message.text,
+            keyword_message.content,
+        )
+        # The sends are awaited rather than left running untracked, so
+        #  none is dropped mid-flight and failures are reported
+        results = await asyncio.gather(
+            *(
+                keyword_message.ctx.send(response)
+                for responses in matches.values()
+                for response in responses
+            ),
+            return_exceptions=True,
         )
-        for word, responses in associations.items():
-            if word in text:
-                for response in responses:
-                    asyncio.get_event_loop().create_task(
-                        (await self._bot.get_context(message)).send(response),
-                    )
+        for result in results:
+            if isinstance(result, Exception):
+                print(
+                    f'Could not send a keyword response in guild '
+                    f'{keyword_message.guild_id}: {result}',
+                )
 
     async def madd(
             self,
             ctx: Context[Bot],
             pattern: str,
             message: str,
+            mode: str | None = None,
     ) -> None:
         if ctx.guild is None:
             return
-        self._message_table.add_message(
+        try:
+            match_mode = None if mode is None else validate_pattern(
+                pattern, mode,
+            )
+        except ValueError as ex:
+            await ctx.send(f'Could not associate \"{pattern}\": {ex}')
+            return
+        changed = await self._message_table.aadd_message(
             str(ctx.guild.id),
             pattern,
             message,
+            match_mode,
         )
+        if not changed:
+            await ctx.send(
+                f'The keyword \"{pattern}\" is already associated '
+                f'with the message \"{message}\"!',
+            )
+            return
+        self._matchers.invalidate(str(ctx.guild.id))
         await ctx.send(
             f'Successfully associated the keyword '
             f'\"{pattern}\" with the message '
@@ -160,26 +208,115 @@ class Message(commands.Cog):
         if ctx.guild is None:
             return
         if message is None:
-            self._message_table.remove_all_messages(
+            removed = await self._message_table.aremove_all_messages(
                 str(ctx.guild.id),
                 pattern,
             )
+            if not removed:
+                await ctx.send(
+                    f'The keyword \"{pattern}\" has no messages '
+                    f'to dissociate!',
+                )
+                return
+            self._matchers.invalidate(str(ctx.guild.id))
             await ctx.send(
                 f'Successfully dissociated the keyword '
                 f'\"{pattern}\" from all messages!',
             )
         else:
-            self._message_table.remove_message(
-                str(ctx.guild.id),
-                pattern,
-                message,
-            )
+            try:
+                changed = await self._message_table.aremove_message(
+                    str(ctx.guild.id),
+                    pattern,
+                    message,
+                )
+            except AssociationConflictError:
+                await ctx.send(
+                    f'The keyword \"{pattern}\" is being edited by '
+                    f'someone else, please try again!',
+                )
+                return
+            if not changed:
+                await ctx.send(
+                    f'The keyword \"{pattern}\" is not associated '
+                    f'with the message \"{message}\"!',
+                )
+                return
+            self._matchers.invalidate(str(ctx.guild.id))
             await ctx.send(
                 f'Successfully dissociated the keyword '
                 f'\"{pattern}\" with the message '
                 f'\"{message}\"!',
             )
 
+    async def mstats(
+            self,
+            ctx: Context[Bot],
+    ) -> None:
+        stats = self._message_table.cache.stats
+        await ctx.send(
+            f'Message cache: {stats["hits"]} hits, {stats["misses"]} '
+            f'misses, {stats["size"]} guilds cached',
+        )
+
+    async def mimport(
+            self,
+            ctx: Context[Bot],
+    ) -> None:
+        if ctx.guild is None:
+            return
+        if not ctx.message.attachments:
+            await ctx.send(
+                'Attach a JSON or CSV file of message associations to '
+                'import.',
+            )
+            return
+        attachment = ctx.message.attachments[0]
+        try:
+            associations = parse_associations(
+                attachment.filename,
+                await attachment.read(),
+            )
+        except ValueError as ex:
+            await ctx.send(
+                f'Could not import \"{attachment.filename}\": {ex}',
+            )
+            return
+        count = await self._message_table.aimport_messages(
+            str(ctx.guild.id),
+            associations,
+        )
+        self._matchers.invalidate(str(ctx.guild.id))
+        await ctx.send(f'Successfully imported {count} message keywords!')
+
+    async def mexport(
+            self,
+            ctx: Context[Bot],
+            fmt: str | None = None,
+    ) -> None:
+        if ctx.guild is None:
+            return
+        fmt = fmt or EXPORT_FORMATS[0]
+        if fmt not in EXPORT_FORMATS:
+            await ctx.send(
+                f'Unknown export format \"{fmt}\", expected one of: '
+                f'{", ".join(EXPORT_FORMATS)}',
+            )
+            return
+        buffer = io.StringIO()
+        count = await self._message_table.aexport_messages(
+            str(ctx.guild.id),
+            buffer,
+            fmt,  # type: ignore[arg-type]
+        )
+        await ctx.send(
+            f'Exported {count} message keywords.',
+            file=discord.File(
+                io.BytesIO(buffer.getvalue().encode()),
+                filename=f'messages.{fmt}',
+            ),
+        )
+
 
 async def setup(
         bot: HeckBot,
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import traceback
+from typing import TYPE_CHECKING
 
 import discord
 from discord import Embed
@@ -11,7 +12,9 @@ from discord.ext import commands
 from discord.ext.commands import Bot
 from discord.ext.commands import Context
 
-from bot import HeckBot
+if TYPE_CHECKING:
+    # noinspection PyUnresolvedReferences
+    from bot import HeckBot
 
 
 class Moderation(commands.Cog):
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 import csv
 import os
 import random
 import threading
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from discord import ButtonStyle
 from discord import Interaction
@@ -16,9 +18,9 @@ from discord.ui import Button
 from discord.ui import View
 from dotenv import load_dotenv
 
-from bot import cursor
-from bot import db_conn
-from bot import HeckBot
+if TYPE_CHECKING:
+    # noinspection PyUnresolvedReferences
+    from bot import HeckBot
 
 load_dotenv(Path(__file__).parent.parent.parent.parent / '.env')
 
@@ -125,9 +127,10 @@ class Picker(commands.Cog):
         :param bot: Instance of the running Bot
         """
         self._bot = bot
-        self._db_conn = db_conn
-        self._cursor = cursor
-        load_activities()
+
+    async def cog_load(self) -> None:
+        # Scanning the activity files is blocking file I/O
+        await asyncio.to_thread(load_activities)
 
     @commands.command()
     async def pick(
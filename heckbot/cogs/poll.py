@@ -5,22 +5,24 @@ from collections import namedtuple
 from datetime import datetime
 from datetime import timedelta
 from typing import Sequence
+from typing import TYPE_CHECKING
 
 from discord import Forbidden
 from discord import Message
+from discord import NotFound
 from discord import TextChannel
 from discord.ext import commands
 from discord.ext.commands import Bot
 from discord.ext.commands import Context
-from table2ascii import PresetStyle
-from table2ascii import table2ascii
-from table2ascii import TableStyle
 
-from bot import cursor
-from bot import db_conn
-from bot import HeckBot
 from heckbot.utils.chatutils import bold
 from heckbot.utils.chatutils import codeblock
+from heckbot.utils.task_scheduler import ScheduledTask
+
+if TYPE_CHECKING:
+    # noinspection PyUnresolvedReferences
+    from bot import HeckBot
+    from table2ascii import TableStyle
 
 Bounds: namedtuple = namedtuple(
     'Bounds',
@@ -60,8 +62,23 @@ class Poll(commands.Cog):
         :param bot: Instance of the running Bot
         """
         self._bot = bot
-        self._db_conn = db_conn
-        self._cursor = cursor
+
+    async def cog_load(self) -> None:
+        self._bot.scheduler.register_handler(
+            'close_poll', self._close_poll,
+        )
+
+    async def cog_unload(self) -> None:
+        self._bot.scheduler.unregister_handler('close_poll')
+
+    async def _close_poll(
+            self,
+            task: ScheduledTask,
+    ) -> None:
+        try:
+            await self.close_poll(task.message_id, task.channel_id)
+        except NotFound:
+            pass  # the poll was deleted, so there is nothing to close
 
     @staticmethod
     def roll_many(
@@ -136,15 +153,22 @@ class Poll(commands.Cog):
     @staticmethod
     def format_roll_results(
             roll_results: Sequence[RollResult],
-            table_style: TableStyle = PresetStyle.double_thin_box,
+            table_style: TableStyle | None = None,
     ) -> str:
         """
         Format results of a roll command into an ascii table with
         line-wrapping.
         :param roll_results:
-        :param table_style: Table style in table2ascii format
+        :param table_style: Table style in table2ascii format, double
+        thin box by default
         :return: results of a roll command as an ascii table
         """
+        # table2ascii is only needed for rolls, so it is imported lazily
+        from table2ascii import PresetStyle
+        from table2ascii import table2ascii
+
+        if table_style is None:
+            table_style = PresetStyle.double_thin_box
         table_body = []
         max_dice_strlen = RESULT_DICE_LENGTH_BOUNDS.min
         max_rolls_strlen = RESULT_ROLLS_LENGTH_BOUNDS.min
@@ -250,19 +274,12 @@ class Poll(commands.Cog):
             message = await ctx.send(question)
             for reaction in self.YES_NO_REACTIONS:
                 await message.add_reaction(reaction)
-            self._cursor.execute(
-                'INSERT INTO tasks '
-                '(completed, task, message_id, channel_id, end_time)'
-                'VALUES (false, "close_poll", ?, ?, ?);',
-                (
-                    message.id,
-                    ctx.channel.id,
-                    (
-                        datetime.now() + timedelta(minutes=timeout_mins)
-                    ).strftime('%m/%d/%y %H:%M:%S'),
-                ),
+            await self._bot.scheduler.schedule(
+                'close_poll',
+                datetime.now() + timedelta(minutes=timeout_mins),
+                message.id,
+                ctx.channel.id,
             )
-            self._db_conn.commit()
         elif len(choices) > 0:
             # Multi-choice poll
             question = bold(question)
@@ -274,19 +291,12 @@ class Poll(commands.Cog):
             # TODO handle more poll options than emojis in list
             for reaction in self.MULTI_CHOICE_REACTIONS[:num_choices]:
                 await message.add_reaction(reaction)
-            self._cursor.execute(
-                'INSERT INTO tasks '
-                '(completed, task, message_id, channel_id, end_time)'
-                'VALUES (false, "close_poll", ?, ?, ?);',
-                (
-                    message.id,
-                    ctx.channel.id,
-                    (
-                        datetime.now() + timedelta(minutes=timeout_mins)
-                    ).strftime('%m/%d/%y %H:%M:%S'),
-                ),
+            await self._bot.scheduler.schedule(
+                'close_poll',
+                datetime.now() + timedelta(minutes=timeout_mins),
+                message.id,
+                ctx.channel.id,
             )
-            self._db_conn.commit()
         else:
             await ctx.send(  # TODO add separate check for poll and pollfor
                 'Incorrect syntax, try \"`!poll "<question>"'
@@ -1,14 +1,26 @@
 from __future__ import annotations
 
-import asyncio
+import io
+import itertools
+from typing import TYPE_CHECKING
 
 import discord
 from discord.ext import commands
 from discord.ext.commands import Bot
 from discord.ext.commands import Context
 
-from bot import HeckBot
 from heckbot.adapter.reaction_table_adapter import ReactionTableAdapter
+from heckbot.types.association import AssociationConflictError
+from heckbot.types.keyword_message import KeywordMessage
+from heckbot.utils.association_io import EXPORT_FORMATS
+from heckbot.utils.association_io import parse_associations
+from heckbot.utils.matcher import MatcherRegistry
+from heckbot.utils.matcher import validate_pattern
+from heckbot.utils.reaction_emitter import ReactionEmitter
+
+if TYPE_CHECKING:
+    # noinspection PyUnresolvedReferences
+    from bot import HeckBot
 
 
 class React(commands.Cog):
@@ -27,6 +39,11 @@ class React(commands.Cog):
         :param bot: Instance of the running Bot
         """
         self._bot = bot
+        self._matchers = MatcherRegistry(
+            self._reaction_table.aget_all_associations,
+            max_age=self._reaction_table.cache.ttl,
+        )
+        self._emitter = ReactionEmitter()
 
     @commands.command()
     async def react(
@@ -35,6 +52,7 @@ class React(commands.Cog):
             subcommand: str,
             pattern: str | None = None,
             reaction: str | None = None,
+            mode: str | None = None,
     ) -> None:
         """
         General purpose reaction-matching root command. Aliases the
@@ -44,16 +62,23 @@ class React(commands.Cog):
         :param subcommand: Sub-command of the react function call
         :param pattern: Pattern string to match with the reaction
         :param reaction: Reaction to respond with
+        :param mode: How the pattern is matched: substring, word or regex
         :return:
         """
         if subcommand == 'add':
             if isinstance(pattern, str) and isinstance(reaction, str):
-                await self.radd(ctx, pattern, reaction)
+                await self.radd(ctx, pattern, reaction, mode)
         elif subcommand in ['remove', 'delete', 'rm', 'del']:
             if isinstance(pattern, str):
                 await self.rdel(ctx, pattern, reaction)
         elif subcommand in ['list', 'lst']:
             await self.rlist(ctx, pattern)
+        elif subcommand == 'stats':
+            await self.rstats(ctx)
+        elif subcommand == 'import':
+            await self.rimport(ctx)
+        elif subcommand == 'export':
+            await self.rexport(ctx, pattern)
 
     @commands.command(aliases=['reactadd', 'associate', 'assoc', 'radd'])
     async def react_add(
@@ -61,17 +86,21 @@ class React(commands.Cog):
             ctx: Context[Bot],
             pattern: str,
             reaction: str,
+            mode: str | None = None,
     ) -> None:
         """
         Reaction association command. Creates an association between a
         pattern and reaction such that any messages which contain the
         specified pattern will be reacted with the specified reaction,
-        permission permitting.
+        permission permitting. The pattern matches any substring of a
+        message by default, or only whole words with the word mode, or
+        is a regular expression with the regex mode.
         :param ctx: Command context
         :param pattern: Pattern string to match with the reaction
         :param reaction: Reaction to respond with
+        :param mode: How the pattern is matched: substring, word or regex
         """
-        await self.radd(ctx, pattern, reaction)
+        await self.radd(ctx, pattern, reaction, mode)
 
     @commands.command(
         aliases=[
@@ -113,51 +142,65 @@ class React(commands.Cog):
         if ctx.guild is not None:
             await self.rlist(ctx, pattern)
 
-    @commands.Cog.listener('on_message')
-    async def on_message(
+    async def cog_load(self) -> None:
+        self._bot.add_keyword_listener(self.on_keyword_message)
+
+    async def cog_unload(self) -> None:
+        self._bot.remove_keyword_listener(self.on_keyword_message)
+        await self._emitter.close()
+
+    async def on_keyword_message(
             self,
-            message: discord.Message,
+            keyword_message: KeywordMessage,
     ) -> None:
         """
-        Event listener triggered whenever the bot detects a message.
-        This listener will attempt to match the text contents of the
-        given message with all registered reaction associations to react
-        all appropriate reactions based on the contents of the message.
-        :param message: The Discord message to be analyzed
+        Keyword listener triggered whenever the bot receives a
+        non-command guild message. This listener will attempt to match
+        the text contents of the given message with all registered
+        reaction associations to react all appropriate reactions based
+        on the contents of the message.
+        :param keyword_message: The parsed Discord message to be analyzed
         """
-        if message.author.bot or (
-                await self._bot.get_context(message)
-        ).valid:
-            return
-
-        text = message.content.lower()
-        guild = message.guild
-        if guild is None:
-            return
-
-        associations = self._reaction_table.get_all_reactions(
-            str(guild.id),
+        matcher = await self._matchers.get(keyword_message.guild_id)
+        matches = matcher.match(
+            keyword_message.text,
+            keyword_message.content,
         )
-        for word, emojis in associations.items():
-            if word in text:
-                for emoji in emojis:
-                    asyncio.get_event_loop().create_task(
-                        message.add_reaction(emoji),
-                    )
+        if matches:
+            self._emitter.emit(
+                keyword_message.message,
+                itertools.chain.from_iterable(matches.values()),
+            )
 
     async def radd(
             self,
             ctx: Context[Bot],
             pattern: str,
             reaction: str,
+            mode: str | None = None,
     ) -> None:
         if ctx.guild is None:
             return
-        self._reaction_table.add_reaction(
+        try:
+            match_mode = None if mode is None else validate_pattern(
+                pattern, mode,
+            )
+        except ValueError as ex:
+            await ctx.send(f'Could not associate \"{pattern}\": {ex}')
+            return
+        changed = await self._reaction_table.aadd_reaction(
             str(ctx.guild.id),
             pattern,
             reaction,
+            match_mode,
         )
+        if not changed:
+            await ctx.send(
+                f'The keyword \"{pattern}\" is already associated '
+                f'with the reaction \"{reaction}\"!',
+            )
+            return
+        self._matchers.invalidate(str(ctx.guild.id))
         await ctx.send(
             f'Successfully associated the keyword '
             f'\"{pattern}\" with the reaction '
@@ -173,20 +216,41 @@ class React(commands.Cog):
         if ctx.guild is None:
             return
         if reaction is None:
-            self._reaction_table.remove_all_reactions(
+            removed = await self._reaction_table.aremove_all_reactions(
                 str(ctx.guild.id),
                 pattern,
             )
+            if not removed:
+                await ctx.send(
+                    f'The keyword \"{pattern}\" has no reactions '
+                    f'to dissociate!',
+                )
+                return
+            self._matchers.invalidate(str(ctx.guild.id))
             await ctx.send(
                 f'Successfully dissociated the keyword '
                 f'\"{pattern}\" from all reactions!',
             )
         else:
-            self._reaction_table.remove_reaction(
-                str(ctx.guild.id),
-                pattern,
-                reaction,
-            )
+            try:
+                changed = await self._reaction_table.aremove_reaction(
+                    str(ctx.guild.id),
+                    pattern,
+                    reaction,
+                )
+            except AssociationConflictError:
+                await ctx.send(
+                    f'The keyword \"{pattern}\" is being edited by '
+                    f'someone else, please try again!',
+                )
+                return
+            if not changed:
+                await ctx.send(
+                    f'The keyword \"{pattern}\" is not associated '
+                    f'with the reaction \"{reaction}\"!',
+                )
+                return
+            self._matchers.invalidate(str(ctx.guild.id))
             await ctx.send(
                 f'Successfully dissociated the keyword '
                 f'\"{pattern}\" with the reaction '
@@ -202,19 +266,90 @@ class React(commands.Cog):
             return
         if pattern:
             associations = str(
-                self._reaction_table.get_reactions(
+                await self._reaction_table.aget_reactions(
                     str(ctx.guild.id),
                     pattern,
                 ),
             )
         else:
             associations = str(
-                self._reaction_table.get_all_reactions(
+                await self._reaction_table.aget_all_reactions(
                     str(ctx.guild.id),
                 ),
             )
         await ctx.send(associations)
 
+    async def rstats(
+            self,
+            ctx: Context[Bot],
+    ) -> None:
+        stats = self._reaction_table.cache.stats
+        await ctx.send(
+            f'Reaction cache: {stats["hits"]} hits, {stats["misses"]} '
+            f'misses, {stats["size"]} guilds cached\n'
+            f'Reactions: {self._emitter.sent} sent, '
+            f'{self._emitter.failures} failed, '
+            f'{self._emitter.queue_depth} queued',
+        )
+
+    async def rimport(
+            self,
+            ctx: Context[Bot],
+    ) -> None:
+        if ctx.guild is None:
+            return
+        if not ctx.message.attachments:
+            await ctx.send(
+                'Attach a JSON or CSV file of reaction associations to '
+                'import.',
+            )
+            return
+        attachment = ctx.message.attachments[0]
+        try:
+            associations = parse_associations(
+                attachment.filename,
+                await attachment.read(),
+            )
+        except ValueError as ex:
+            await ctx.send(
+                f'Could not import \"{attachment.filename}\": {ex}',
+            )
+            return
+        count = await self._reaction_table.aimport_reactions(
+            str(ctx.guild.id),
+            associations,
+        )
+        self._matchers.invalidate(str(ctx.guild.id))
+        await ctx.send(f'Successfully imported {count} reaction keywords!')
+
+    async def rexport(
+            self,
+            ctx: Context[Bot],
+            fmt: str | None = None,
+    ) -> None:
+        if ctx.guild is None:
+            return
+        fmt = fmt or EXPORT_FORMATS[0]
+        if fmt not in EXPORT_FORMATS:
+            await ctx.send(
+                f'Unknown export format \"{fmt}\", expected one of: '
+                f'{", ".join(EXPORT_FORMATS)}',
+            )
+            return
+        buffer = io.StringIO()
+        count = await self._reaction_table.aexport_reactions(
+            str(ctx.guild.id),
+            buffer,
+            fmt,  # type: ignore[arg-type]
+        )
+        await ctx.send(
+            f'Exported {count} reaction keywords.',
+            file=discord.File(
+                io.BytesIO(buffer.getvalue().encode()),
+                filename=f'reactions.{fmt}',
+            ),
+        )
+
 
 async def setup(
         bot: HeckBot,
@@ -1,17 +1,132 @@
 from __future__ import annotations
 
+import asyncio
+import os
+import sqlite3
 from typing import Final
+from typing import NamedTuple
+from typing import Sequence
+from typing import TYPE_CHECKING
 
 import discord
+from discord import Guild
+from discord import Member
 from discord import RawReactionActionEvent
 from discord import Role
+from discord import TextChannel
 from discord.ext import commands
 from discord.ext.commands import Context
 
-from bot import HeckBot
-from heckbot.adapter.sqlite_adaptor import SqliteAdaptor
+from heckbot.adapter.database import AsyncDatabase
+from heckbot.types.constants import ADMIN_CONSOLE_CHANNEL_ID
+from heckbot.utils.role_coalescer import RoleCoalescer
+
+if TYPE_CHECKING:
+    # noinspection PyUnresolvedReferences
+    from bot import HeckBot
 
 MAX_REACTIONS_PER_MESSAGE: Final[int] = 20
+ROLE_MENU_EDIT_CONCURRENCY: Final[int] = 4
+# Members whose roles are corrected per batch during reconciliation
+RECONCILE_BATCH_SIZE: Final[int] = 10
+RECONCILE_BATCH_INTERVAL: Final[float] = 2  # seconds
+ROLES_DB_PATH: Final[str] = 'roles.db'
+# The foreign keys are not enforced: role_category alone is not unique in
+#  role_categories, which nothing populates, so every insert would fail
+ROLES_SCHEMA: Final[str] = '''\
+    CREATE TABLE IF NOT EXISTS role_categories
+    (guild_id TEXT NOT NULL,
+    role_category TEXT NOT NULL,
+    PRIMARY KEY (guild_id, role_category));
+
+    CREATE TABLE IF NOT EXISTS roles
+    (guild_id TEXT NOT NULL,
+    role_name TEXT NOT NULL,
+    role_description TEXT NOT NULL,
+    role_category TEXT NOT NULL DEFAULT 'Miscellaneous',
+    role_react TEXT NOT NULL,
+    role_opt_in BOOLEAN NOT NULL DEFAULT TRUE,
+    PRIMARY KEY (guild_id, role_name),
+    FOREIGN KEY (role_category)
+        REFERENCES role_categories (role_category));
+
+    CREATE TABLE IF NOT EXISTS role_messages
+    (guild_id TEXT NOT NULL,
+    channel_id INT NOT NULL,
+    message_id INT NOT NULL,
+    role_category TEXT NOT NULL DEFAULT 'Miscellaneous',
+    message_index INT NOT NULL DEFAULT 1,
+
+    PRIMARY KEY (guild_id, channel_id, message_id, message_index),
+    FOREIGN KEY (role_category)
+        REFERENCES role_categories (role_category));
+
+    CREATE INDEX IF NOT EXISTS roles_by_react
+    ON roles (guild_id, role_react, role_name);
+
+    CREATE INDEX IF NOT EXISTS roles_by_category
+    ON roles (guild_id, role_category);
+
+    CREATE INDEX IF NOT EXISTS role_messages_by_category
+    ON role_messages (guild_id, role_category, channel_id, message_id);
+'''
+
+
+class MenuRole(NamedTuple):
+    name: str
+    react: str
+    description: str
+
+
+def paginate_menu(
+        roles: Sequence[MenuRole],
+) -> list[list[MenuRole]]:
+    """
+    Splits a category's roles into the pages of its role menu, one
+    message each, as a message can only hold so many reactions
+    :param roles: Roles of the category, in order
+    :return: the roles of each page
+    """
+    return [
+        list(roles[i:i + MAX_REACTIONS_PER_MESSAGE])
+        for i in range(0, len(roles), MAX_REACTIONS_PER_MESSAGE)
+    ]
+
+
+def render_menu(
+        category: str,
+        roles: Sequence[MenuRole],
+) -> str:
+    """
+    Renders the text of a role menu page
+    :param category: Category of the roles
+    :param roles: Roles on the page
+    :return: the text of the message
+    """
+    return (
+        f'**{category}**\n'
+        '--------------------------\n' +
+        '\n'.join(f'{role.react} for {role.description}' for role in roles)
+    )
+
+
+class ReconcileTotals:
+    def __init__(self) -> None:
+        self.menus = 0
+        self.added = 0
+        self.removed = 0
+        # Roles held without a reaction which were left in place
+        self.unreacted = 0
+        self.pruned = 0
+        self.failures = 0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.menus} menus checked, {self.added} roles added, '
+            f'{self.removed} roles removed, {self.unreacted} roles kept '
+            f'without a reaction, {self.pruned} deleted menus pruned, '
+            f'{self.failures} failures'
+        )
 
 
 class Roles(commands.Cog):
@@ -28,38 +143,106 @@ class Roles(commands.Cog):
         :param bot: Instance of the running Bot
         """
         self._bot = bot
-        self._connection = None
-        self._db = SqliteAdaptor()
-        self._db.run_query('''PRAGMA foreign_keys = 1''')
-        self._db.run_query('''\
-            CREATE TABLE IF NOT EXISTS role_categories
-            (guild_id TEXT NOT NULL,
-            role_category TEXT NOT NULL,
-            PRIMARY KEY (guild_id, role_category));
-        ''')
-        self._db.run_query('''\
-            CREATE TABLE IF NOT EXISTS roles
-            (guild_id TEXT NOT NULL,
-            role_name TEXT NOT NULL,
-            role_description TEXT NOT NULL,
-            role_category TEXT NOT NULL DEFAULT 'Miscellaneous',
-            role_react TEXT NOT NULL,
-            role_opt_in BOOLEAN NOT NULL DEFAULT TRUE,
-            PRIMARY KEY (guild_id, role_name),
-            FOREIGN KEY (role_category) REFERENCES role_categories (role_category));
-        ''')
-        self._db.run_query('''\
-            CREATE TABLE IF NOT EXISTS role_messages
-            (guild_id TEXT NOT NULL,
-            channel_id INT NOT NULL,
-            message_id INT NOT NULL,
-            role_category TEXT NOT NULL DEFAULT 'Miscellaneous',
-            message_index INT NOT NULL DEFAULT 1,
-
-            PRIMARY KEY (guild_id, channel_id, message_id, message_index),
-            FOREIGN KEY (role_category) REFERENCES role_categories (role_category));
-        ''')
-        self._db.commit_and_close()
+        self._db = AsyncDatabase(ROLES_DB_PATH)
+        # Role menu message IDs by guild ID, so reactions anywhere else
+        #  are dismissed without a query
+        self._menu_messages: dict[int, set[int]] = {}
+        # Roles granted by each emoji, by guild ID, built from the
+        #  database and the guild's cached roles on first use
+        self._role_index: dict[int, dict[str, list[Role]]] = {}
+        self._role_index_epoch = 0
+        self._role_changes = RoleCoalescer()
+        self._reconcile_task: asyncio.Task[ReconcileTotals] | None = None
+
+    async def cog_load(self) -> None:
+        await self._db.execute_script(ROLES_SCHEMA)
+        for row in await self._db.fetch_all(
+            'SELECT guild_id, message_id FROM role_messages;',
+        ):
+            self._menu_messages.setdefault(
+                int(row['guild_id']), set(),
+            ).add(int(row['message_id']))
+
+    def _add_menu_messages(
+            self,
+            params_list: Sequence[tuple[str, str, str, str, int]],
+    ) -> None:
+        """
+        Remembers role menu messages once their role_messages rows are
+        stored
+        :param params_list: Inserted rows, starting with guild_id,
+        channel_id and message_id
+        """
+        for guild_id, _, message_id, *_ in params_list:
+            self._menu_messages.setdefault(
+                int(guild_id), set(),
+            ).add(int(message_id))
+
+    def invalidate_role_index(
+            self,
+            guild_id: int,
+    ) -> None:
+        """
+        Drops a guild's emoji to role index, so that it is rebuilt on
+        the next reaction
+        :param guild_id: ID of the guild
+        """
+        self._role_index.pop(guild_id, None)
+        self._role_index_epoch += 1
+
+    async def _get_guild(
+            self,
+            guild_id: int,
+    ) -> Guild:
+        return (
+            self._bot.get_guild(guild_id)
+            or await self._bot.fetch_guild(guild_id)
+        )
+
+    async def _get_role_index(
+            self,
+            guild_id: int,
+    ) -> dict[str, list[Role]]:
+        index = self._role_index.get(guild_id)
+        if index is not None:
+            return index
+        epoch = self._role_index_epoch
+        guild = await self._get_guild(guild_id)
+        rows = await self._db.fetch_all(
+            '''SELECT role_react, role_name FROM roles
+            WHERE guild_id=?;''',
+            (str(guild_id),),
+        )
+        roles_by_name = {role.name: role for role in guild.roles}
+        index = {}
+        for row in rows:
+            role = roles_by_name.get(row['role_name'])
+            if role is not None:
+                index.setdefault(row['role_react'], []).append(role)
+        # An index built while roles changed may already be stale
+        if epoch == self._role_index_epoch:
+            self._role_index[guild_id] = index
+        return index
+
+    def is_menu_message(
+            self,
+            guild_id: int,
+            message_id: int,
+    ) -> bool:
+        """
+        Checks whether a message is a role menu, without touching the
+        database
+        :param guild_id: ID of the message's guild
+        :param message_id: ID of the message
+        :return: whether the message is a role menu
+        """
+        return message_id in self._menu_messages.get(guild_id, ())
+
+    async def cog_unload(self) -> None:
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+        await self._role_changes.close()
+        await self._db.close()
 
     @commands.command(aliases=['createrole', 'addrole', 'rolerequest'])
     @commands.has_permissions(manage_roles=True)
@@ -68,104 +251,84 @@ class Roles(commands.Cog):
             self, ctx: Context, name: str, description: str,
             category: str, emoji: str,
     ):
-        if not any(r.name == name for r in ctx.guild.roles):
-            await ctx.guild.create_role(name=name)
         guild_id = str(ctx.guild.id)
-        results = self._db.run_query(
-            '''SELECT channel_id, message_id, role_category FROM role_messages
-            WHERE guild_id=?;''', (guild_id,),
-        )
-        if len(results) < 1:
-            return
-        category_exists = any(r['role_category'] == category for r in results)
-        roles_params_list = []
-        message_params_list = []
-        for row in results:
-            if row['role_category'] != category:
-                continue
-            channel_id = row['channel_id']
-            message_id = row['message_id']
-            channel = await ctx.guild.fetch_channel(channel_id)
-            message = await channel.fetch_message(message_id)
-            if message.content.count('\n') >= MAX_REACTIONS_PER_MESSAGE:
-                message = await channel.send(
-                    f'**{category}**\n'
-                    '--------------------------\n'
-                    f'{emoji} for {description}',
-                )
-                await message.add_reaction(emoji)
-                message_params_list.append(
-                    (guild_id, str(channel.id), str(message.id), row['message_index'] + 1),
-                )
-            else:
-                content = message.content + f'\n{emoji} for {description}'
-                await message.edit(content=content)
-                await message.add_reaction(emoji)
-            roles_params_list.append((guild_id, name, description, category, emoji))
-        if not category_exists:
-            channels = {r['channel_id'] for r in results}
-            for channel in channels:
-                channel = await ctx.guild.fetch_channel(channel)
-                message = await channel.send(
-                    f'**{category}**\n'
-                    '--------------------------\n'
-                    f'{emoji} for {description}',
-                )
-                await message.add_reaction(emoji)
-                message_params_list.append((guild_id, str(channel.id), str(message.id), 1))
-        if message_params_list:
-            self._db.run_query_many(
-                '''INSERT INTO role_messages (guild_id, channel_id, message_id, message_index)
-                VALUES (?, ?, ?, ?);''', message_params_list,
-            )
-        if roles_params_list:
-            self._db.run_query_many(
+        # The row is stored first, so a role which already exists does
+        #  not leave a duplicate Discord role behind
+        try:
+            await self._db.execute(
                 '''INSERT INTO roles
                     (guild_id, role_name, role_description,
                     role_category, role_react)
-                    VALUES (?, ?, ?, ?, ?);''', roles_params_list,
+                    VALUES (?, ?, ?, ?, ?);''',
+                (guild_id, name, description, category, emoji),
             )
-        self._db.commit_and_close()
+        except sqlite3.IntegrityError:
+            await ctx.send(f'The role \"{name}\" already exists!')
+            return
+        if not any(r.name == name for r in ctx.guild.roles):
+            try:
+                await ctx.guild.create_role(name=name)
+            except discord.HTTPException:
+                await self._db.execute(
+                    '''DELETE FROM roles WHERE guild_id=? AND role_name=?;''',
+                    (guild_id, name),
+                )
+                raise
+        self.invalidate_role_index(ctx.guild.id)
+        menu_rows = await self._db.fetch_all(
+            '''SELECT channel_id, message_id, role_category, message_index
+            FROM role_messages WHERE guild_id=?;''', (guild_id,),
+        )
+        if len(menu_rows) < 1:
+            return
+        # The role joins its category's menus, or starts the category in
+        #  every channel with menus if it is the first of its category
+        category_rows = [
+            r for r in menu_rows if r['role_category'] == category
+        ]
+        new_roles = await self._category_roles(guild_id, category)
+        await self._update_menus(
+            ctx.guild.id, category,
+            [r for r in new_roles if r.name != name], new_roles,
+            {r['channel_id'] for r in category_rows or menu_rows},
+            category_rows,
+        )
 
-    @commands.command(aliases=['deleterole', 'delrole', 'removerole', 'rmrole'])
+    @commands.command(
+        aliases=['deleterole', 'delrole', 'removerole', 'rmrole'],
+    )
     @commands.has_permissions(manage_roles=True)
     @commands.bot_has_permissions(manage_roles=True)
     async def delete_role(
             self, ctx: Context, name: str,
     ):
         guild_id = str(ctx.guild.id)
-        role_rows = self._db.run_query(
-            '''SELECT role_react, role_description, role_category, role_react FROM roles
+        role_row = await self._db.fetch_one(
+            '''SELECT role_category FROM roles
             WHERE guild_id=? AND role_name=?;''', (guild_id, name),
         )
-        if len(role_rows) < 1:
+        if role_row is None:
             return
-        role_row = role_rows[0]
-        react = role_row['role_react']
-        desc = role_row['role_description']
         category = role_row['role_category']
-        message_rows = self._db.run_query(
-            '''SELECT channel_id, message_id FROM role_messages
-            WHERE guild_id=? AND role_category=?;''', (guild_id, category),
+        old_roles = await self._category_roles(guild_id, category)
+        await self._db.execute(
+            '''DELETE FROM roles WHERE guild_id=? AND role_name=?;''',
+            (guild_id, name),
         )
-        role_string = f'{react} for {desc}'
+        self.invalidate_role_index(ctx.guild.id)
         # Doesn't delete the role from the guild, just removes it from role
         # request messages
-        for row in message_rows:
-            channel_id = row['channel_id']
-            message_id = row['message_id']
-            channel = await ctx.guild.fetch_channel(channel_id)
-            message = await channel.fetch_message(message_id)
-            content = message.content.replace(
-                role_string, '',
-            ).replace('\n\n', '\n')
-            await message.edit(content=content)
-            await message.clear_reaction(react)
-        self._db.run_query(
-            '''DELETE FROM roles WHERE guild_id=? AND role_name=?;''',
-            (guild_id, name),
+        menu_rows = await self._db.fetch_all(
+            '''SELECT channel_id, message_id, role_category, message_index
+            FROM role_messages WHERE guild_id=? AND role_category=?;''',
+            (guild_id, category),
+        )
+        await self._update_menus(
+            ctx.guild.id, category, old_roles,
+            [r for r in old_roles if r.name != name],
+            {r['channel_id'] for r in menu_rows},
+            menu_rows,
         )
-        self._db.commit_and_close()
 
     @commands.command(aliases=['createrolesmessage', 'createrolesmsg'])
     @commands.has_permissions(manage_roles=True)
@@ -175,83 +338,366 @@ class Roles(commands.Cog):
         Sends a role-reaction-enabled message in the current chat.
         :param ctx: Context of the command
         """
-        result = self._db.run_query(
+        result = await self._db.fetch_all(
             '''SELECT role_name, role_description, role_category, role_react
             FROM roles WHERE guild_id=?
-            AND role_opt_in=TRUE;
+            AND role_opt_in=TRUE
+            ORDER BY rowid;
             ''',
             (ctx.guild.id,),
         )
-        role_map = {}
-        react_map = {}
+        role_map: dict[str, list[MenuRole]] = {}
         for item in result:
-            name = item['role_name']
-            desc = item['role_description']
-            category = item['role_category']
-            react = item['role_react']
-            if category not in role_map:
-                role_map[category] = {}
-            role_map[category][name] = desc
-            react_map[name] = react
+            role_map.setdefault(item['role_category'], []).append(
+                MenuRole(
+                    item['role_name'],
+                    item['role_react'],
+                    item['role_description'],
+                ),
+            )
 
         params = []
-        for category in role_map:
-            message_index = 1
-            message = await ctx.channel.send(
-                f'**{category}**\n'
-                '--------------------------\n' +
-                '\n'.join([
-                    f'{react_map[role]} for {role_map[category][role]}'
-                    for role in role_map[category]
-                ]),
-            )
-            for role in role_map[category]:
-                await message.add_reaction(react_map[role])
-            params.append((
-                str(ctx.guild.id),
-                str(ctx.channel.id),
-                str(message.id),
-                category,
-                message_index,
-            ))
-        self._db.run_query_many(
-            '''INSERT INTO role_messages (guild_id, channel_id, message_id, role_category, message_index)
-            VALUES (?, ?, ?);''',
+        for category, roles in role_map.items():
+            for message_index, page in enumerate(paginate_menu(roles), 1):
+                message = await ctx.channel.send(
+                    render_menu(category, page),
+                )
+                for role in page:
+                    await message.add_reaction(role.react)
+                params.append((
+                    str(ctx.guild.id),
+                    str(ctx.channel.id),
+                    str(message.id),
+                    category,
+                    message_index,
+                ))
+        await self._db.execute_many(
+            '''INSERT INTO role_messages
+            (guild_id, channel_id, message_id, role_category, message_index)
+            VALUES (?, ?, ?, ?, ?);''',
             params,
         )
-        self._db.commit_and_close()
+        self._add_menu_messages(params)
         await ctx.message.delete()
 
+    async def _category_roles(
+            self,
+            guild_id: str,
+            category: str,
+    ) -> list[MenuRole]:
+        return [
+            MenuRole(r['role_name'], r['role_react'], r['role_description'])
+            for r in await self._db.fetch_all(
+                '''SELECT role_name, role_react, role_description FROM roles
+                WHERE guild_id=? AND role_category=? AND role_opt_in=TRUE
+                ORDER BY rowid;''',
+                (guild_id, category),
+            )
+        ]
+
+    async def _update_menus(
+            self,
+            guild_id: int,
+            category: str,
+            old_roles: list[MenuRole],
+            new_roles: list[MenuRole],
+            channel_ids: set[int],
+            menu_rows: list[sqlite3.Row],
+    ) -> None:
+        """
+        Brings a category's role menus from listing the old roles to
+        listing the new ones. Menus are edited through partial messages
+        built from their stored IDs, so nothing is fetched, and only the
+        pages and reactions which differ are touched. Pages which do not
+        have a menu yet are sent as new messages.
+        :param guild_id: ID of the guild
+        :param category: Category of the menus
+        :param old_roles: Roles the menus currently list
+        :param new_roles: Roles the menus should list
+        :param channel_ids: Channels which should have the category's
+        menus
+        :param menu_rows: Stored role_messages rows of the category
+        """
+        old_pages = paginate_menu(old_roles)
+        new_pages = paginate_menu(new_roles)
+        page_count = max(len(old_pages), len(new_pages))
+        old_pages += [[]] * (page_count - len(old_pages))
+        new_pages += [[]] * (page_count - len(new_pages))
+        # A channel can hold several menus of the same category, such as
+        #  after the roles message was created twice, and all are edited
+        menus: dict[tuple[int, int], list[int | None]] = {}
+        for r in menu_rows:
+            menus.setdefault(
+                (r['channel_id'], r['message_index']), [],
+            ).append(r['message_id'])
+        semaphore = asyncio.Semaphore(ROLE_MENU_EDIT_CONCURRENCY)
+        new_rows: list[tuple[str, str, str, str, int]] = []
+
+        async def update_page(
+                channel_id: int,
+                message_id: int | None,
+                message_index: int,
+                old_page: list[MenuRole],
+                new_page: list[MenuRole],
+        ) -> None:
+            async with semaphore:
+                channel = self._bot.get_partial_messageable(
+                    channel_id, guild_id=guild_id,
+                )
+                message: discord.Message | discord.PartialMessage
+                if message_id is None:
+                    if not new_page:
+                        return
+                    message = await channel.send(
+                        render_menu(category, new_page),
+                    )
+                    new_rows.append((
+                        str(guild_id), str(channel_id), str(message.id),
+                        category, message_index,
+                    ))
+                    old_page = []
+                elif old_page == new_page:
+                    return
+                else:
+                    message = channel.get_partial_message(message_id)
+                    await message.edit(
+                        content=render_menu(category, new_page),
+                    )
+                old_reacts = {role.react for role in old_page}
+                new_reacts = [role.react for role in new_page]
+                for react in old_reacts.difference(new_reacts):
+                    await message.clear_reaction(react)
+                for react in new_reacts:
+                    if react not in old_reacts:
+                        await message.add_reaction(react)
+
+        results = await asyncio.gather(
+            *(
+                update_page(channel_id, message_id, index, old_page, new_page)
+                for channel_id in channel_ids
+                for index, (old_page, new_page)
+                in enumerate(zip(old_pages, new_pages), 1)
+                for message_id in menus.get((channel_id, index)) or [None]
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f'Could not update a {category} role menu: {result}')
+        if new_rows:
+            await self._db.execute_many(
+                '''INSERT INTO role_messages
+                (guild_id, channel_id, message_id, role_category,
+                message_index)
+                VALUES (?, ?, ?, ?, ?);''',
+                new_rows,
+            )
+            self._add_menu_messages(new_rows)
+
+    @commands.command(aliases=['rolestats'])
+    @commands.has_permissions(manage_roles=True)
+    async def role_stats(self, ctx: Context):
+        """
+        Reports how role changes from role menus are being batched.
+        :param ctx: Context of the command
+        """
+        changes = self._role_changes
+        await ctx.send(
+            f'Role changes: {changes.queue_depth} queued, '
+            f'{changes.batches} batches of '
+            f'{changes.mean_batch_size:.1f} on average '
+            f'(largest {changes.largest_batch}), '
+            f'{changes.skipped} without effect, '
+            f'{changes.failures} failed',
+        )
+
+    @commands.Cog.listener()
+    async def on_after_ready(self):
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(
+                self.reconcile_menus(
+                    remove_roles=bool(os.getenv('RECONCILE_REMOVE_ROLES')),
+                ),
+            )
+            self._reconcile_task.add_done_callback(
+                self._report_reconcile_failure,
+            )
+
+    async def reconcile_menus(
+            self,
+            remove_roles: bool = False,
+    ) -> ReconcileTotals:
+        """
+        Repairs drift between role menus and member roles left behind
+        while the bot was offline. The reactions on every stored role
+        menu are compared with the roles of the members, and missing
+        roles are added a few members at a time. Roles held without a
+        reaction may have been granted by hand, so they are only
+        counted unless removal is asked for, set by the
+        RECONCILE_REMOVE_ROLES environment variable on startup. Rows for
+        menu messages which no longer exist are deleted. Progress and
+        totals are reported to the admin console.
+        :param remove_roles: Whether to remove roles held without a
+        reaction
+        :return: the totals of the reconciliation
+        """
+        menus_by_guild: dict[int, list[tuple[int, int, str]]] = {}
+        for row in await self._db.fetch_all(
+            '''SELECT DISTINCT guild_id, channel_id, message_id, role_category
+            FROM role_messages;''',
+        ):
+            menus_by_guild.setdefault(int(row['guild_id']), []).append(
+                (
+                    int(row['channel_id']),
+                    int(row['message_id']),
+                    row['role_category'],
+                ),
+            )
+        totals = ReconcileTotals()
+        console = self._bot.get_channel(ADMIN_CONSOLE_CHANNEL_ID)
+        if not isinstance(console, TextChannel):
+            console = None
+        progress = None
+        if console is not None:
+            progress = await console.send(
+                f'Reconciling role menus in {len(menus_by_guild)} guilds',
+            )
+        for done, (guild_id, menus) in enumerate(menus_by_guild.items(), 1):
+            # Menus of guilds which are unavailable are left alone
+            guild = self._bot.get_guild(guild_id)
+            if guild is not None:
+                await self._reconcile_guild(
+                    guild, menus, totals, remove_roles,
+                )
+            if progress is not None:
+                await progress.edit(
+                    content=f'Reconciling role menus: '
+                    f'{done}/{len(menus_by_guild)} guilds, {totals}',
+                )
+        print(f'Reconciled role menus: {totals}')
+        if console is not None:
+            await console.send(f'Reconciled role menus: {totals}')
+        return totals
+
+    async def _reconcile_guild(
+            self,
+            guild: Guild,
+            menus: list[tuple[int, int, str]],
+            totals: ReconcileTotals,
+            remove_roles: bool,
+    ) -> None:
+        index = await self._get_role_index(guild.id)
+        roles: dict[int, Role] = {}
+        # role ID -> IDs of the members who reacted for that role
+        reactors: dict[int, set[int]] = {}
+        # IDs of roles whose reactions could not all be read, so members
+        #  without a reaction that was read may still have reacted
+        incomplete: set[int] = set()
+        pruned = []
+        for channel_id, message_id, category in menus:
+            channel = guild.get_channel_or_thread(channel_id)
+            if not isinstance(channel, discord.abc.Messageable):
+                pruned.append(message_id)
+                continue
+            try:
+                message = await channel.fetch_message(message_id)
+            except discord.NotFound:
+                pruned.append(message_id)
+                continue
+            except discord.HTTPException as ex:
+                totals.failures += 1
+                print(f'Could not fetch role menu {message_id}: {ex}')
+                for menu_role in await self._category_roles(
+                    str(guild.id), category,
+                ):
+                    incomplete.update(
+                        role.id for role in index.get(menu_role.react, [])
+                        if role.name == menu_role.name
+                    )
+                continue
+            totals.menus += 1
+            for reaction in message.reactions:
+                reaction_roles = index.get(str(reaction.emoji), [])
+                if not reaction_roles:
+                    continue
+                try:
+                    user_ids = {
+                        user.id async for user in reaction.users()
+                        if not user.bot
+                    }
+                except discord.HTTPException as ex:
+                    totals.failures += 1
+                    print(
+                        f'Could not read {reaction.emoji} reactions on '
+                        f'role menu {message_id}: {ex}',
+                    )
+                    incomplete.update(role.id for role in reaction_roles)
+                    continue
+                for role in reaction_roles:
+                    roles[role.id] = role
+                    reactors.setdefault(role.id, set()).update(user_ids)
+
+        changes: dict[int, tuple[Member, list[Role], list[Role]]] = {}
+        for role_id, user_ids in reactors.items():
+            role = roles[role_id]
+            for user_id in user_ids:
+                member = guild.get_member(user_id)
+                if member is not None and role not in member.roles:
+                    changes.setdefault(
+                        member.id, (member, [], []),
+                    )[1].append(role)
+            if role_id in incomplete:
+                continue
+            for member in role.members:
+                if member.id in user_ids or member.bot:
+                    continue
+                if not remove_roles:
+                    totals.unreacted += 1
+                    continue
+                changes.setdefault(
+                    member.id, (member, [], []),
+                )[2].append(role)
+        corrections = list(changes.values())
+        for start in range(0, len(corrections), RECONCILE_BATCH_SIZE):
+            if start:
+                await asyncio.sleep(RECONCILE_BATCH_INTERVAL)
+            batch = corrections[start:start + RECONCILE_BATCH_SIZE]
+            for member, added, removed in batch:
+                if added:
+                    self._role_changes.add_roles(member, added)
+                if removed:
+                    self._role_changes.remove_roles(member, removed)
+                totals.added += len(added)
+                totals.removed += len(removed)
+
+        if pruned:
+            await self._db.execute_many(
+                '''DELETE FROM role_messages
+                WHERE guild_id=? AND message_id=?;''',
+                [(str(guild.id), message_id) for message_id in pruned],
+            )
+            self._menu_messages.get(guild.id, set()).difference_update(
+                pruned,
+            )
+            totals.pruned += len(pruned)
+
+    @staticmethod
+    def _report_reconcile_failure(
+            task: asyncio.Task[ReconcileTotals],
+    ) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f'Role menu reconciliation failed: {task.exception()}')
+
     async def _fetch_roles_for_reaction_change(
             self, payload: RawReactionActionEvent,
     ) -> list[Role]:
-        message_id = str(payload.message_id)
-        channel_id = str(payload.channel_id)
-        guild_id = str(payload.guild_id)
-        guild = await self._bot.fetch_guild(payload.guild_id)
-        role_react_message = self._db.run_query(
-            '''SELECT COUNT(*) AS num_messages FROM role_messages
-            WHERE guild_id=?
-            AND channel_id=?
-            AND message_id=?;''',
-            (guild_id, channel_id, message_id),
-        )[0]['num_messages'] > 0
-        if role_react_message:
-            role_names = [
-                r['role_name'] for r in self._db.run_query(
-                    '''SELECT role_name FROM roles
-                WHERE guild_id=?
-                AND role_react=?;''',
-                    (guild_id, str(payload.emoji)),
-                )
-            ]
-            roles = [
-                discord.utils.get(guild.roles, name=role_name)
-                for role_name in role_names
-            ]
-            self._db.commit_and_close()
-            return roles
-        return []
+        if (
+            payload.guild_id is None
+            or not self.is_menu_message(payload.guild_id, payload.message_id)
+        ):
+            return []
+        index = await self._get_role_index(payload.guild_id)
+        return index.get(str(payload.emoji), [])
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: RawReactionActionEvent):
@@ -263,14 +709,33 @@ class Roles(commands.Cog):
         #     await message.remove_reaction(payload.emoji, member)
         #     return
         roles = await self._fetch_roles_for_reaction_change(payload)
-        await payload.member.add_roles(*roles)
+        if not roles or payload.member is None:
+            return
+        self._role_changes.add_roles(payload.member, roles)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload: RawReactionActionEvent):
         roles = await self._fetch_roles_for_reaction_change(payload)
-        guild = await self._bot.fetch_guild(payload.guild_id)
-        member = await guild.fetch_member(payload.user_id)
-        await member.remove_roles(*roles)
+        if not roles:
+            return
+        guild = roles[0].guild
+        member = (
+            guild.get_member(payload.user_id)
+            or await guild.fetch_member(payload.user_id)
+        )
+        self._role_changes.remove_roles(member, roles)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: Role):
+        self.invalidate_role_index(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: Role, after: Role):
+        self.invalidate_role_index(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: Role):
+        self.invalidate_role_index(role.guild.id)
 
 
 async def setup(
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import Final
+from typing import get_args
+from typing import Literal
+from typing import NamedTuple
+from typing import Sequence
+
+# substring: the pattern occurs anywhere in the message
+# word: the pattern occurs without a word character directly around it
+# regex: the pattern is a regular expression found in the message
+MatchMode = Literal['substring', 'word', 'regex']
+MATCH_MODES: Final[tuple[MatchMode, ...]] = get_args(MatchMode)
+DEFAULT_MATCH_MODE: Final[MatchMode] = 'substring'
+
+
+class Association(NamedTuple):
+    """
+    Values associated with a keyword pattern, and how that pattern is
+    matched against messages.
+    """
+    values: Sequence[str]
+    mode: MatchMode = DEFAULT_MATCH_MODE
+
+
+class ImportedAssociation(NamedTuple):
+    """
+    Values imported for a keyword pattern, and how that pattern is
+    matched if the imported file says so. Without a mode, an existing
+    pattern keeps its own.
+    """
+    values: Sequence[str]
+    mode: MatchMode | None = None
+
+
+class AssociationConflictError(Exception):
+    """
+    Raised when an association keeps being changed by concurrent edits
+    while it is being updated, so the update should be retried later.
+    """
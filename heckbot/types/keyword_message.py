@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+
+import discord
+from discord.ext.commands import Bot
+from discord.ext.commands import Context
+
+
+class KeywordMessage(NamedTuple):
+    """
+    A non-command guild message, parsed once by the bot and shared with
+    every keyword listener.
+    """
+    message: discord.Message
+    ctx: Context[Bot]
+    guild: discord.Guild
+    guild_id: str
+    # Normalized, lowercased message content to match patterns against
+    text: str
+    # Message content as written, which regex patterns are searched in
+    content: str
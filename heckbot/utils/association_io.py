@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Final
+from typing import get_args
+from typing import Iterable
+from typing import Literal
+from typing import TextIO
+
+from heckbot.types.association import Association
+from heckbot.types.association import ImportedAssociation
+from heckbot.utils.matcher import validate_pattern
+
+ExportFormat = Literal['json', 'csv']
+EXPORT_FORMATS: Final[tuple[ExportFormat, ...]] = get_args(ExportFormat)
+CSV_HEADER: Final[list[str]] = ['pattern', 'value', 'mode']
+
+
+def parse_associations(
+        filename: str,
+        data: bytes,
+) -> dict[str, ImportedAssociation]:
+    """
+    Parses associations from an uploaded JSON or CSV file. JSON files
+    hold either a list of {"pattern", "values", "mode"} objects or an
+    object mapping patterns to lists of values. CSV files hold one
+    "pattern,value[,mode]" row per value, with an optional header.
+    :param filename: Name of the file, used to tell the format
+    :param data: Contents of the file
+    :return: a mapping of patterns to associations, whose mode is None
+    where the file does not give one
+    :raises ValueError: if the file cannot be parsed
+    """
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError as ex:
+        raise ValueError('File is not UTF-8 text') from ex
+    if filename.lower().endswith('.csv'):
+        rows = _parse_csv(text)
+    else:
+        rows = _parse_json(text)
+
+    values: dict[str, list[str]] = {}
+    modes: dict[str, str] = {}
+    for pattern, value, mode in rows:
+        if not isinstance(pattern, str) or not isinstance(value, str):
+            raise ValueError('Patterns and values must be strings')
+        if not pattern:
+            raise ValueError('Patterns may not be empty')
+        pattern_values = values.setdefault(pattern, [])
+        if value not in pattern_values:
+            pattern_values.append(value)
+        if mode:
+            modes[pattern] = mode
+    return {
+        pattern: ImportedAssociation(
+            pattern_values,
+            validate_pattern(pattern, modes[pattern])
+            if pattern in modes else None,
+        )
+        for pattern, pattern_values in values.items()
+    }
+
+
+def _parse_json(
+        text: str,
+) -> list[tuple[str, str, str | None]]:
+    try:
+        document = json.loads(text)
+    except json.JSONDecodeError as ex:
+        raise ValueError(f'Invalid JSON: {ex}') from ex
+    if isinstance(document, dict):
+        return [
+            (pattern, value, None)
+            for pattern, pattern_values in document.items()
+            for value in _as_list(pattern_values)
+        ]
+    if isinstance(document, list):
+        try:
+            return [
+                (entry['pattern'], value, entry.get('mode'))
+                for entry in document
+                for value in _as_list(entry['values'])
+            ]
+        except (KeyError, TypeError, AttributeError) as ex:
+            raise ValueError(
+                'Each entry needs a "pattern" and a list of "values"',
+            ) from ex
+    raise ValueError('Expected a JSON list or object')
+
+
+def _parse_csv(
+        text: str,
+) -> list[tuple[str, str, str | None]]:
+    rows = []
+    for line_number, row in enumerate(csv.reader(io.StringIO(text)), 1):
+        if not row or (line_number == 1 and row == CSV_HEADER[:len(row)]):
+            continue
+        if len(row) < 2:
+            raise ValueError(
+                f'Line {line_number} needs at least a pattern and a value',
+            )
+        rows.append((row[0], row[1], row[2] if len(row) > 2 else None))
+    return rows
+
+
+def _as_list(
+        values: object,
+) -> list[str]:
+    if isinstance(values, str):
+        return [values]
+    if isinstance(values, list):
+        return values
+    raise ValueError('Values must be a string or a list of strings')
+
+
+def write_associations(
+        associations: Iterable[tuple[str, Association]],
+        fp: TextIO,
+        fmt: ExportFormat,
+) -> int:
+    """
+    Writes associations to a file as they are produced, in the format
+    read by parse_associations
+    :param associations: Pairs of patterns and associations to write
+    :param fp: File to write to
+    :param fmt: Format to write, json or csv
+    :return: the number of patterns written
+    """
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(fp)
+        writer.writerow(CSV_HEADER)
+        for pattern, association in associations:
+            for value in association.values:
+                writer.writerow([pattern, value, association.mode])
+            count += 1
+        return count
+
+    fp.write('[')
+    for pattern, association in associations:
+        if count:
+            fp.write(',')
+        fp.write('\n  ')
+        json.dump(
+            {
+                'pattern': pattern,
+                'values': list(association.values),
+                'mode': association.mode,
+            },
+            fp,
+            ensure_ascii=False,
+        )
+        count += 1
+    fp.write('\n]\n')
+    return count
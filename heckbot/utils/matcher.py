@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import unicodedata
+from collections import deque
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Final
+from typing import Generic
+from typing import Mapping
+from typing import Sequence
+from typing import TypeVar
+
+import re2
+
+from heckbot.types.association import Association
+from heckbot.types.association import DEFAULT_MATCH_MODE
+from heckbot.types.association import MATCH_MODES
+from heckbot.types.association import MatchMode
+
+MAX_REGEX_LENGTH: Final[int] = 256
+# Regex patterns are only searched in this much of a message
+MAX_REGEX_TEXT_LENGTH: Final[int] = 2000
+
+T = TypeVar('T')
+
+
+def normalize_text(
+        text: str,
+) -> str:
+    """
+    Normalizes text before it is matched against patterns
+    :param text: Text to normalize
+    :return: the text in NFC form, lowercased
+    """
+    return unicodedata.normalize('NFC', text).lower()
+
+
+def validate_pattern(
+        pattern: str,
+        mode: str,
+) -> MatchMode:
+    """
+    Checks that a pattern can be stored with the given match mode
+    :param pattern: Pattern to check
+    :param mode: Name of the match mode
+    :return: the match mode
+    :raises ValueError: if the mode is unknown or the pattern is not
+    usable with it
+    """
+    for match_mode in MATCH_MODES:
+        if mode == match_mode:
+            break
+    else:
+        raise ValueError(
+            f'Unknown match mode \"{mode}\", expected one of: '
+            f'{", ".join(MATCH_MODES)}',
+        )
+    if match_mode == 'regex':
+        compile_regex(pattern)
+    return match_mode
+
+
+def compile_regex(
+        pattern: str,
+) -> Any:
+    """
+    Compiles a case-insensitive regex pattern with RE2, which matches in
+    time linear in the length of the text for every pattern it accepts.
+    Constructs which need backtracking, such as backreferences and
+    lookarounds, are not supported.
+    :param pattern: Regular expression to compile
+    :return: the compiled regular expression
+    :raises ValueError: if the pattern is invalid or unsupported
+    """
+    if len(pattern) > MAX_REGEX_LENGTH:
+        raise ValueError(
+            f'Regex patterns may be at most {MAX_REGEX_LENGTH} '
+            f'characters long',
+        )
+    try:
+        return re2.compile(pattern, _regex_options())
+    except re2.error as ex:
+        raise ValueError(f'Invalid regex: {_error_message(ex)}') from ex
+
+
+def _regex_options() -> Any:
+    options = re2.Options()
+    options.case_sensitive = False
+    # Invalid patterns are reported through the raised error instead
+    options.log_errors = False
+    return options
+
+
+def _error_message(
+        ex: Exception,
+) -> str:
+    message = ex.args[0] if ex.args else ex
+    if isinstance(message, bytes):
+        return message.decode(errors='replace')
+    return str(message)
+
+
+def _is_word_char(
+        char: str,
+) -> bool:
+    return char.isalnum() or char == '_'
+
+
+class PatternMatcher(Generic[T]):
+    """
+    Multi-pattern matcher compiled from a mapping of patterns to
+    associated values. Substring and whole-word patterns share one
+    Aho-Corasick automaton, which finds all of them in a single pass
+    over a text regardless of the number of patterns. Regex patterns
+    are compiled with RE2 into one set, which finds all of them in a
+    single linear-time pass over the original text.
+    """
+
+    def __init__(
+            self,
+            associations: Mapping[str, Sequence[T]],
+            modes: Mapping[str, MatchMode] | None = None,
+    ) -> None:
+        """
+        Constructor method
+        :param associations: Mapping of patterns to their values
+        :param modes: Mapping of patterns to how they are matched,
+        patterns without a mode match substrings
+        """
+        modes = modes or {}
+        self._patterns: list[str] = list(associations)
+        self._values: list[Sequence[T]] = list(associations.values())
+        # state -> character -> next state
+        self._goto: list[dict[str, int]] = [{}]
+        # state -> fallback state on a mismatch
+        self._fail: list[int] = [0]
+        # state -> indices of the substring patterns ending at this state
+        self._output: list[tuple[int, ...]] = [()]
+        # state -> indices of the whole-word patterns ending at this state
+        self._word_output: list[tuple[int, ...]] = [()]
+        # set index -> index of the regex pattern
+        self._regexes: list[int] = []
+        self._regex_set = re2.Set.SearchSet(_regex_options())
+
+        for index, pattern in enumerate(self._patterns):
+            mode = modes.get(pattern, DEFAULT_MATCH_MODE)
+            if mode == 'regex':
+                try:
+                    compile_regex(pattern)
+                except ValueError as ex:
+                    print(f'Skipping regex pattern {pattern!r}: {ex}')
+                else:
+                    self._regex_set.Add(pattern)
+                    self._regexes.append(index)
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                    self._word_output.append(())
+                state = next_state
+            if mode == 'word':
+                self._word_output[state] += (index,)
+            else:
+                self._output[state] += (index,)
+
+        # Breadth-first traversal to link each state to the longest
+        #  proper suffix of it which is also a state in the trie
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fallback = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fallback
+                self._output[next_state] += self._output[fallback]
+                self._word_output[next_state] += self._word_output[fallback]
+
+        if self._regexes:
+            self._regex_set.Compile()
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def find(
+            self,
+            text: str,
+            content: str | None = None,
+    ) -> list[str]:
+        """
+        Finds all patterns which occur in the given text
+        :param text: Normalized text to scan
+        :param content: Text as written, which regex patterns are
+        searched in, defaults to the normalized text
+        :return: the matching patterns, in the order they were given
+        """
+        return [self._patterns[i] for i in self._scan(text, content)]
+
+    def match(
+            self,
+            text: str,
+            content: str | None = None,
+    ) -> dict[str, Sequence[T]]:
+        """
+        Finds all patterns which occur in the given text along with
+        their associated values
+        :param text: Normalized text to scan
+        :param content: Text as written, which regex patterns are
+        searched in, defaults to the normalized text
+        :return: a mapping of matching patterns to their values, in the
+        order they were given
+        """
+        return {
+            self._patterns[i]: self._values[i]
+            for i in self._scan(text, content)
+        }
+
+    def _scan(
+            self,
+            text: str,
+            content: str | None,
+    ) -> list[int]:
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        word_output = self._word_output
+        patterns = self._patterns
+        found: set[int] = set(output[0])
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+            for index in word_output[state]:
+                start = end - len(patterns[index])
+                if (
+                        index not in found and
+                        (start == 0 or not _is_word_char(text[start - 1])) and
+                        (end == len(text) or not _is_word_char(text[end]))
+                ):
+                    found.add(index)
+        if self._regexes:
+            if content is None:
+                content = text
+            matches = self._regex_set.Match(content[:MAX_REGEX_TEXT_LENGTH])
+            found.update(self._regexes[i] for i in matches or ())
+        return sorted(found)
+
+
+class MatcherRegistry:
+    """
+    Per-guild registry of compiled PatternMatchers. Matchers are built
+    off the event loop and swapped in atomically, so messages are always
+    matched against a complete snapshot of a guild's patterns.
+    """
+
+    def __init__(
+            self,
+            loader: Callable[[str], Awaitable[Mapping[str, Association]]],
+            max_age: float | None = None,
+    ) -> None:
+        """
+        Constructor method
+        :param loader: Coroutine function which returns all
+        associations for a given guild ID
+        :param max_age: Seconds after which a matcher is rebuilt in the
+        background to pick up changes made elsewhere, if specified
+        """
+        self._loader = loader
+        self._max_age = max_age
+        self._matchers: dict[str, PatternMatcher[str]] = {}
+        # guild ID -> when its matcher was last built or tried to be
+        self._built_at: dict[str, float] = {}
+        self._builds: dict[str, asyncio.Task[PatternMatcher[str]]] = {}
+        self._generations: dict[str, int] = {}
+
+    async def get(
+            self,
+            guild_id: str,
+    ) -> PatternMatcher[str]:
+        """
+        Gets the current matcher for a guild, building it first if the
+        guild has not been seen yet
+        :param guild_id: Guild ID to get the matcher for
+        :return: the guild's current matcher
+        """
+        matcher = self._matchers.get(guild_id)
+        build = self._builds.get(guild_id)
+        if matcher is not None:
+            if (
+                    build is None and self._max_age is not None and
+                    time.monotonic() - self._built_at[guild_id] > self._max_age
+            ):
+                self._schedule(guild_id)
+            return matcher
+        if build is None:
+            build = self._schedule(guild_id)
+        return await asyncio.shield(build)
+
+    def invalidate(
+            self,
+            guild_id: str,
+    ) -> None:
+        """
+        Rebuilds a guild's matcher in the background. The previous
+        matcher keeps serving lookups until the new one is ready.
+        :param guild_id: Guild ID whose patterns have changed
+        """
+        self._schedule(guild_id)
+
+    def _schedule(
+            self,
+            guild_id: str,
+    ) -> asyncio.Task[PatternMatcher[str]]:
+        generation = self._generations.get(guild_id, 0) + 1
+        self._generations[guild_id] = generation
+        build = asyncio.create_task(self._build(guild_id, generation))
+        build.add_done_callback(self._report_failure)
+        self._builds[guild_id] = build
+        return build
+
+    @staticmethod
+    def _report_failure(
+            build: asyncio.Task[PatternMatcher[str]],
+    ) -> None:
+        if not build.cancelled() and build.exception() is not None:
+            print(f'Failed to build pattern matcher: {build.exception()}')
+
+    async def _build(
+            self,
+            guild_id: str,
+            generation: int,
+    ) -> PatternMatcher[str]:
+        try:
+            associations = await self._loader(guild_id)
+            matcher = await asyncio.to_thread(
+                PatternMatcher,
+                {p: a.values for p, a in associations.items()},
+                {p: a.mode for p, a in associations.items()},
+            )
+        finally:
+            if self._builds.get(guild_id) is asyncio.current_task():
+                del self._builds[guild_id]
+            # Failed rebuilds are also only retried once max_age passes,
+            #  so an outage does not cause a rebuild for every message
+            self._built_at[guild_id] = time.monotonic()
+        # A newer build supersedes this one, so do not swap it in
+        if self._generations[guild_id] == generation:
+            self._matchers[guild_id] = matcher
+        return matcher
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Final
+from typing import Iterable
+
+import discord
+
+# Discord allows at most 20 unique reactions on a message
+MAX_REACTIONS_PER_MESSAGE: Final[int] = 20
+# Discord allows roughly one reaction per quarter second per channel
+REACTION_INTERVAL: Final[float] = 0.25  # seconds
+
+
+class _PendingReactions:
+    def __init__(
+            self,
+            message: discord.Message,
+    ) -> None:
+        self.message = message
+        self.seen: set[str] = set()
+        self.emojis: deque[str] = deque()
+
+
+class ReactionEmitter:
+    """
+    Adds reactions to messages through one paced queue per channel.
+    Reactions are deduplicated and capped per message, and each channel
+    queue is drained by a single tracked worker task.
+    """
+
+    def __init__(
+            self,
+            max_reactions: int = MAX_REACTIONS_PER_MESSAGE,
+            interval: float = REACTION_INTERVAL,
+    ) -> None:
+        """
+        Constructor method
+        :param max_reactions: Maximum number of reactions to add to a
+        single message
+        :param interval: Seconds to wait between reactions in a channel
+        """
+        self._max_reactions = max_reactions
+        self._interval = interval
+        # channel ID -> messages waiting for reactions, in arrival order
+        self._queues: dict[int, deque[_PendingReactions]] = {}
+        # message ID -> reactions for that message
+        self._pending: dict[int, _PendingReactions] = {}
+        # channel ID -> worker draining that channel's queue
+        self._workers: dict[int, asyncio.Task[None]] = {}
+        self.sent = 0
+        self.failures = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(p.emojis) for p in self._pending.values())
+
+    def emit(
+            self,
+            message: discord.Message,
+            emojis: Iterable[str],
+    ) -> None:
+        """
+        Queues reactions to add to a message. Reactions which are
+        already queued or added for the message are ignored.
+        :param message: Message to react to
+        :param emojis: Reactions to add, in order
+        """
+        pending = self._pending.get(message.id)
+        if pending is None:
+            pending = _PendingReactions(message)
+            self._pending[message.id] = pending
+            channel_id = message.channel.id
+            self._queues.setdefault(channel_id, deque()).append(pending)
+        for emoji in emojis:
+            if len(pending.seen) >= self._max_reactions:
+                break
+            if emoji not in pending.seen:
+                pending.seen.add(emoji)
+                pending.emojis.append(emoji)
+        self._ensure_worker(message.channel.id)
+
+    async def close(self) -> None:
+        """
+        Cancels all workers and drops any reactions still queued
+        """
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def _ensure_worker(
+            self,
+            channel_id: int,
+    ) -> None:
+        if channel_id in self._workers:
+            return
+        worker = asyncio.create_task(self._drain(channel_id))
+        worker.add_done_callback(self._report_failure)
+        self._workers[channel_id] = worker
+
+    async def _drain(
+            self,
+            channel_id: int,
+    ) -> None:
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                pending = queue[0]
+                while pending.emojis:
+                    emoji = pending.emojis.popleft()
+                    try:
+                        await pending.message.add_reaction(emoji)
+                        self.sent += 1
+                    except (discord.NotFound, discord.Forbidden) as ex:
+                        # The message is gone or cannot be reacted to, so
+                        #  the rest of its reactions would fail as well
+                        self._report_reaction_failure(pending, emoji, ex)
+                        pending.emojis.clear()
+                    except discord.HTTPException as ex:
+                        self._report_reaction_failure(pending, emoji, ex)
+                    await asyncio.sleep(self._interval)
+                queue.popleft()
+                del self._pending[pending.message.id]
+        finally:
+            for pending in queue:
+                del self._pending[pending.message.id]
+            del self._queues[channel_id]
+            del self._workers[channel_id]
+
+    def _report_reaction_failure(
+            self,
+            pending: _PendingReactions,
+            emoji: str,
+            ex: discord.HTTPException,
+    ) -> None:
+        self.failures += 1
+        print(
+            f'Could not react with {emoji} to message '
+            f'{pending.message.id}: {ex}',
+        )
+
+    @staticmethod
+    def _report_failure(
+            worker: asyncio.Task[None],
+    ) -> None:
+        if not worker.cancelled() and worker.exception() is not None:
+            print(f'Reaction worker failed: {worker.exception()}')
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Final
+from typing import Iterable
+
+import discord
+
+# How long role changes for a member are collected before being applied
+ROLE_CHANGE_WINDOW: Final[float] = 1.0  # seconds
+
+
+class _PendingRoleChanges:
+    def __init__(
+            self,
+            member: discord.Member,
+    ) -> None:
+        self.member = member
+        # role ID -> role and whether it is added (True) or removed
+        self.changes: dict[int, tuple[discord.Role, bool]] = {}
+        self.intents = 0
+
+
+class RoleCoalescer:
+    """
+    Applies role changes to members in batches. Adds and removes for a
+    member are collected for a short window after the first one, and
+    are then applied with a single member edit. When a role is both
+    added and removed in the window, the latest intent wins.
+    """
+
+    def __init__(
+            self,
+            window: float = ROLE_CHANGE_WINDOW,
+    ) -> None:
+        """
+        Constructor method
+        :param window: Seconds to collect a member's role changes for
+        """
+        self._window = window
+        # (guild ID, member ID) -> changes waiting to be applied
+        self._pending: dict[tuple[int, int], _PendingRoleChanges] = {}
+        # (guild ID, member ID) -> worker applying that member's changes
+        self._workers: dict[tuple[int, int], asyncio.Task[None]] = {}
+        self.batches = 0
+        self.intents_applied = 0
+        self.largest_batch = 0
+        self.skipped = 0
+        self.failures = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(p.intents for p in self._pending.values())
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.intents_applied / self.batches if self.batches else 0
+
+    def add_roles(
+            self,
+            member: discord.Member,
+            roles: Iterable[discord.Role],
+    ) -> None:
+        """
+        Queues roles to add to a member
+        :param member: Member to add the roles to
+        :param roles: Roles to add
+        """
+        self._queue(member, roles, True)
+
+    def remove_roles(
+            self,
+            member: discord.Member,
+            roles: Iterable[discord.Role],
+    ) -> None:
+        """
+        Queues roles to remove from a member
+        :param member: Member to remove the roles from
+        :param roles: Roles to remove
+        """
+        self._queue(member, roles, False)
+
+    async def close(self) -> None:
+        """
+        Applies all queued role changes right away and stops the workers
+        """
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        pending = list(self._pending.values())
+        self._pending.clear()
+        await asyncio.gather(*(self._apply(p) for p in pending))
+
+    def _queue(
+            self,
+            member: discord.Member,
+            roles: Iterable[discord.Role],
+            add: bool,
+    ) -> None:
+        key = (member.guild.id, member.id)
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = _PendingRoleChanges(member)
+            self._pending[key] = pending
+        for role in roles:
+            pending.changes[role.id] = (role, add)
+            pending.intents += 1
+        if key not in self._workers:
+            worker = asyncio.create_task(self._flush_later(key))
+            worker.add_done_callback(self._report_failure)
+            self._workers[key] = worker
+
+    async def _flush_later(
+            self,
+            key: tuple[int, int],
+    ) -> None:
+        try:
+            await asyncio.sleep(self._window)
+        finally:
+            del self._workers[key]
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            await self._apply(pending)
+
+    async def _apply(
+            self,
+            pending: _PendingRoleChanges,
+    ) -> None:
+        # The cached member has the roles as of now, which may have
+        #  changed since the first intent was queued
+        member = pending.member.guild.get_member(pending.member.id)
+        if member is None:
+            member = pending.member
+        roles = {
+            role.id: role for role in member.roles if not role.is_default()
+        }
+        current = set(roles)
+        for role_id, (role, add) in pending.changes.items():
+            if add:
+                roles[role_id] = role
+            else:
+                roles.pop(role_id, None)
+        self.batches += 1
+        self.intents_applied += pending.intents
+        self.largest_batch = max(self.largest_batch, pending.intents)
+        if set(roles) == current:
+            self.skipped += 1
+            return
+        try:
+            await member.edit(roles=list(roles.values()))
+        except discord.HTTPException as ex:
+            self.failures += 1
+            print(f'Could not update the roles of member {member.id}: {ex}')
+
+    @staticmethod
+    def _report_failure(
+            worker: asyncio.Task[None],
+    ) -> None:
+        if not worker.cancelled() and worker.exception() is not None:
+            print(f'Role change worker failed: {worker.exception()}')
@@ -0,0 +1,480 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import math
+import sqlite3
+import time
+from datetime import datetime
+from typing import Awaitable
+from typing import Callable
+from typing import Final
+from typing import NamedTuple
+
+from heckbot.adapter.database import AsyncDatabase
+
+# Number of workers running due tasks, and so how many run at once
+TASK_WORKERS: Final[int] = 4
+# A task failing this many times is moved to the dead letters
+MAX_TASK_ATTEMPTS: Final[int] = 5
+# Failed tasks are retried after this delay, doubled on every attempt
+RETRY_BASE_DELAY: Final[float] = 30  # seconds
+RETRY_MAX_DELAY: Final[float] = 60 * 60  # seconds
+# How long completed tasks are kept before compaction deletes them
+COMPLETED_TASK_RETENTION: Final[int] = 7 * 24 * 60 * 60  # seconds
+COMPACTION_INTERVAL: Final[float] = 60 * 60  # seconds
+COMPACTION_BATCH_SIZE: Final[int] = 500
+# Format of the text deadlines stored before they were epoch seconds
+LEGACY_TIME_FORMAT: Final[str] = '%m/%d/%y %H:%M:%S'
+
+TASKS_TABLE: Final = '''
+    CREATE TABLE IF NOT EXISTS tasks
+    (id INTEGER PRIMARY KEY,
+    completed BOOLEAN NOT NULL DEFAULT false,
+    task TEXT NOT NULL,
+    message_id INT,
+    channel_id INT,
+    deadline INT NOT NULL,
+    completed_at INT,
+    attempts INT NOT NULL DEFAULT 0,
+    dead_letter BOOLEAN NOT NULL DEFAULT false,
+    last_error TEXT);
+'''
+# Columns added after the table was first created
+ADDED_TASK_COLUMNS: Final[dict[str, str]] = {
+    'attempts': 'INT NOT NULL DEFAULT 0',
+    'dead_letter': 'BOOLEAN NOT NULL DEFAULT false',
+    'last_error': 'TEXT',
+}
+# Only pending tasks are looked up by deadline
+PENDING_TASKS_INDEX: Final = '''
+    CREATE INDEX IF NOT EXISTS pending_tasks
+    ON tasks (deadline) WHERE NOT completed;
+'''
+
+
+class ScheduledTask(NamedTuple):
+    id: int
+    task: str
+    message_id: int
+    channel_id: int
+    deadline: int  # seconds since the epoch
+    attempts: int = 0
+
+
+class RecoveryReport(NamedTuple):
+    pending: int
+    overdue: int
+
+
+TaskHandler = Callable[[ScheduledTask], Awaitable[None]]
+
+
+class TaskScheduler:
+    """
+    Runs persisted tasks at their deadlines. Pending tasks are kept in
+    an in-memory min-heap ordered by deadline, and a single worker
+    sleeps until the earliest one is due or until a task is added,
+    rescheduled or cancelled. Due tasks are queued to a small pool of
+    workers, which run them with the handler registered for their type.
+    A failed task is retried with exponential backoff, and is moved to
+    the dead letters once it has failed too often. The database is only
+    touched when tasks change or complete.
+    """
+
+    def __init__(
+            self,
+            db: AsyncDatabase,
+            workers: int = TASK_WORKERS,
+            max_attempts: int = MAX_TASK_ATTEMPTS,
+            retry_delay: float = RETRY_BASE_DELAY,
+    ) -> None:
+        """
+        Constructor method
+        :param db: Database holding the tasks table
+        :param workers: Number of tasks to run at once
+        :param max_attempts: Attempts after which a failing task is
+        moved to the dead letters
+        :param retry_delay: Seconds to wait before the first retry
+        """
+        self._db = db
+        self._workers = workers
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        # task type -> coroutine function performing tasks of that type
+        self._handlers: dict[str, TaskHandler] = {}
+        # (deadline, task ID) of pending tasks, including stale entries
+        #  left behind by cancels and reschedules
+        self._heap: list[tuple[int, int]] = []
+        # task ID -> pending task, which is current if its deadline
+        #  matches the heap entry
+        self._tasks: dict[int, ScheduledTask] = {}
+        # IDs of tasks cancelled after they were queued to the workers
+        self._cancelled: set[int] = set()
+        self._wakeup = asyncio.Event()
+        # Due tasks waiting for a worker, or None to stop a worker
+        self._due: asyncio.Queue[ScheduledTask | None] = asyncio.Queue()
+        self._worker: asyncio.Task[None] | None = None
+        self._compactor: asyncio.Task[None] | None = None
+        self._pool: list[asyncio.Task[None]] = []
+        self.completed = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.compacted = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._due.qsize()
+
+    def register_handler(
+            self,
+            task: str,
+            handler: TaskHandler,
+    ) -> None:
+        """
+        Registers the coroutine function which performs a type of task
+        :param task: Type of the task, such as 'close_poll'
+        :param handler: Coroutine function called with each due task
+        """
+        self._handlers[task] = handler
+
+    def unregister_handler(
+            self,
+            task: str,
+    ) -> None:
+        """
+        Unregisters the handler of a type of task. Tasks of that type
+        which become due fail until a handler is registered again.
+        :param task: Type of the task
+        """
+        self._handlers.pop(task, None)
+
+    async def start(self) -> RecoveryReport:
+        """
+        Creates or migrates the tasks table, then recovers the tasks
+        left incomplete by the last run and starts running them at their
+        deadlines. Tasks which became overdue in the meantime are queued
+        right away, oldest first, and run through the worker pool a few
+        at a time.
+        :return: the number of recovered tasks and how many are overdue
+        """
+        await self._db.write(_prepare_tasks_table)
+        now = time.time()
+        overdue = []
+        pending = 0
+        for row in await self._db.fetch_all(
+            'SELECT id, task, message_id, channel_id, deadline, attempts '
+            'FROM tasks WHERE NOT completed;',
+        ):
+            task = ScheduledTask(*row)
+            pending += 1
+            if task.deadline <= now:
+                overdue.append(task)
+            else:
+                self._push(task)
+        overdue.sort(key=lambda t: t.deadline)
+        for task in overdue:
+            self._due.put_nowait(task)
+        while len(self._pool) < self._workers:
+            worker = asyncio.create_task(self._work())
+            worker.add_done_callback(self._report_failure)
+            self._pool.append(worker)
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+            self._worker.add_done_callback(self._report_failure)
+        if self._compactor is None:
+            self._compactor = asyncio.create_task(self._compact_forever())
+            self._compactor.add_done_callback(self._report_failure)
+        return RecoveryReport(pending, len(overdue))
+
+    async def schedule(
+            self,
+            task: str,
+            deadline: datetime,
+            message_id: int,
+            channel_id: int,
+    ) -> int:
+        """
+        Persists a task and schedules it
+        :param task: Type of the task, such as 'close_poll'
+        :param deadline: When to run the task
+        :param message_id: ID of the message the task is about
+        :param channel_id: ID of the channel of that message
+        :return: the ID of the task
+        """
+        epoch = math.ceil(deadline.timestamp())
+        result = await self._db.execute(
+            'INSERT INTO tasks (task, message_id, channel_id, deadline) '
+            'VALUES (?, ?, ?, ?);',
+            (task, message_id, channel_id, epoch),
+        )
+        assert result.lastrowid is not None
+        self._push(
+            ScheduledTask(
+                result.lastrowid,
+                task,
+                message_id,
+                channel_id,
+                epoch,
+            ),
+        )
+        return result.lastrowid
+
+    async def cancel(
+            self,
+            task_id: int,
+    ) -> bool:
+        """
+        Cancels a pending task
+        :param task_id: ID of the task
+        :return: whether the task was pending
+        """
+        queued = self._tasks.pop(task_id, None) is None
+        result = await self._db.execute(
+            'UPDATE tasks SET completed = true, completed_at = ? '
+            'WHERE id = ? AND NOT completed;',
+            (int(time.time()), task_id),
+        )
+        if queued and result.rowcount > 0:
+            self._cancelled.add(task_id)
+        return result.rowcount > 0
+
+    async def reschedule(
+            self,
+            task_id: int,
+            deadline: datetime,
+    ) -> bool:
+        """
+        Moves the deadline of a pending task
+        :param task_id: ID of the task
+        :param deadline: When to run the task instead
+        :return: whether the task was pending
+        """
+        epoch = math.ceil(deadline.timestamp())
+        result = await self._db.execute(
+            'UPDATE tasks SET deadline = ? WHERE id = ? AND NOT completed;',
+            (epoch, task_id),
+        )
+        task = self._tasks.get(task_id)
+        if task is not None:
+            self._push(task._replace(deadline=epoch))
+        return result.rowcount > 0
+
+    async def close(self) -> None:
+        """
+        Stops scheduling and waits for the tasks which are running. Due
+        tasks which have not started yet stay pending for the next run.
+        """
+        workers = [self._worker, self._compactor]
+        self._worker = self._compactor = None
+        for worker in workers:
+            if worker is not None:
+                worker.cancel()
+        await asyncio.gather(
+            *(worker for worker in workers if worker is not None),
+            return_exceptions=True,
+        )
+        while not self._due.empty():
+            self._due.get_nowait()
+        pool, self._pool = self._pool, []
+        for _ in pool:
+            self._due.put_nowait(None)
+        await asyncio.gather(*pool, return_exceptions=True)
+
+    def _push(
+            self,
+            task: ScheduledTask,
+    ) -> None:
+        self._tasks[task.id] = task
+        heapq.heappush(self._heap, (task.deadline, task.id))
+        self._wakeup.set()
+
+    async def compact(
+            self,
+            retention: int = COMPLETED_TASK_RETENTION,
+    ) -> int:
+        """
+        Deletes tasks completed longer ago than the retention, in
+        batches so other writes are not held up
+        :param retention: Seconds to keep completed tasks for
+        :return: the number of tasks deleted
+        """
+        cutoff = int(time.time()) - retention
+        deleted = 0
+        while True:
+            result = await self._db.execute(
+                'DELETE FROM tasks WHERE id IN '
+                '(SELECT id FROM tasks WHERE completed AND NOT dead_letter '
+                'AND completed_at < ? LIMIT ?);',
+                (cutoff, COMPACTION_BATCH_SIZE),
+            )
+            deleted += result.rowcount
+            if result.rowcount < COMPACTION_BATCH_SIZE:
+                break
+        self.compacted += deleted
+        return deleted
+
+    async def _compact_forever(self) -> None:
+        while True:
+            await self.compact()
+            await asyncio.sleep(COMPACTION_INTERVAL)
+
+    def _is_current(
+            self,
+            deadline: int,
+            task_id: int,
+    ) -> bool:
+        task = self._tasks.get(task_id)
+        return task is not None and task.deadline == deadline
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            while self._heap:
+                deadline, task_id = self._heap[0]
+                current = self._is_current(deadline, task_id)
+                if current and deadline > now:
+                    break
+                heapq.heappop(self._heap)
+                if current:
+                    self._due.put_nowait(self._tasks.pop(task_id))
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except TimeoutError:
+                pass
+
+    async def _work(self) -> None:
+        while True:
+            task = await self._due.get()
+            if task is None:
+                return
+            if task.id in self._cancelled:
+                self._cancelled.discard(task.id)
+                continue
+            await self._execute(task)
+
+    async def _execute(
+            self,
+            task: ScheduledTask,
+    ) -> None:
+        handler = self._handlers.get(task.task)
+        try:
+            if handler is None:
+                raise LookupError(f'no handler for {task.task} tasks')
+            await handler(task)
+        except Exception as ex:
+            await self._retry(task, ex)
+            return
+        await self._db.execute(
+            'UPDATE tasks SET completed = true, completed_at = ? '
+            'WHERE id = ?;',
+            (int(time.time()), task.id),
+        )
+        self.completed += 1
+
+    async def _retry(
+            self,
+            task: ScheduledTask,
+            error: Exception,
+    ) -> None:
+        self.failures += 1
+        attempts = task.attempts + 1
+        if attempts >= self._max_attempts:
+            await self._db.execute(
+                'UPDATE tasks SET completed = true, dead_letter = true, '
+                'attempts = ?, last_error = ?, completed_at = ? '
+                'WHERE id = ?;',
+                (attempts, str(error), int(time.time()), task.id),
+            )
+            self.dead_lettered += 1
+            print(
+                f'Task {task.id} ({task.task}) failed {attempts} times '
+                f'and was moved to the dead letters: {error}',
+            )
+            return
+        delay = min(self._retry_delay * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+        deadline = math.ceil(time.time() + delay)
+        result = await self._db.execute(
+            'UPDATE tasks SET attempts = ?, last_error = ?, deadline = ? '
+            'WHERE id = ? AND NOT completed;',
+            (attempts, str(error), deadline, task.id),
+        )
+        # A task cancelled while it ran is not retried
+        if result.rowcount > 0:
+            self._push(task._replace(deadline=deadline, attempts=attempts))
+        print(
+            f'Task {task.id} ({task.task}) failed, retrying in '
+            f'{delay:.0f} seconds: {error}',
+        )
+
+    @staticmethod
+    def _report_failure(
+            worker: asyncio.Task[None],
+    ) -> None:
+        if not worker.cancelled() and worker.exception() is not None:
+            print(f'Task scheduler failed: {worker.exception()}')
+
+
+def _prepare_tasks_table(
+        conn: sqlite3.Connection,
+) -> None:
+    columns = {
+        row['name'] for row in conn.execute('PRAGMA table_info(tasks);')
+    }
+    if 'end_time' in columns:
+        # Text deadlines sort by month rather than by time, so the table
+        #  is rebuilt with epoch deadlines, keeping the task IDs
+        conn.execute('ALTER TABLE tasks RENAME TO legacy_tasks;')
+        conn.execute(TASKS_TABLE)
+        rows = conn.execute('SELECT rowid, * FROM legacy_tasks;').fetchall()
+        migrated_at = int(time.time())
+        conn.executemany(
+            'INSERT INTO tasks (id, completed, task, message_id, '
+            'channel_id, deadline, completed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?);',
+            [_migrate_row(row, migrated_at) for row in rows],
+        )
+        conn.execute('DROP TABLE legacy_tasks;')
+    conn.execute(TASKS_TABLE)
+    columns = {
+        row['name'] for row in conn.execute('PRAGMA table_info(tasks);')
+    }
+    for column, definition in ADDED_TASK_COLUMNS.items():
+        if column not in columns:
+            conn.execute(
+                f'ALTER TABLE tasks ADD COLUMN {column} {definition};',
+            )
+    conn.execute(PENDING_TASKS_INDEX)
+
+
+def _migrate_row(
+        row: sqlite3.Row,
+        migrated_at: int,
+) -> tuple[int, bool, str, int, int, int, int | None]:
+    try:
+        deadline = int(
+            datetime.strptime(
+                row['end_time'], LEGACY_TIME_FORMAT,
+            ).timestamp(),
+        )
+        completed = bool(row['completed'])
+    except (TypeError, ValueError):
+        # A task without a readable deadline can never run
+        deadline, completed = 0, True
+    return (
+        row['rowid'],
+        completed,
+        row['task'] or '',
+        row['message_id'],
+        row['channel_id'],
+        deadline,
+        # Completed tasks are kept for the full retention from now, so
+        #  the first compaction does not delete what was just migrated
+        migrated_at if completed else None,
+    )
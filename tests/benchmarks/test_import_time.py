@@ -0,0 +1,75 @@
+"""
+Import-time budget for the bot entry point. `import bot` is measured
+with `python -X importtime` in fresh interpreters, and fails when it
+grows past the budget or pulls in dependencies which are meant to be
+loaded lazily by the cogs using them.
+
+These are skipped by default, run them with:
+    HECKBOT_BENCHMARK=1 pytest tests/benchmarks -s
+"""
+from __future__ import annotations
+
+import os
+import statistics
+import subprocess  # nosec B404
+import sys
+from pathlib import Path
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv('HECKBOT_BENCHMARK'),
+    reason='set HECKBOT_BENCHMARK=1 to run benchmarks',
+)
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+IMPORT_RUNS = 5
+# Cumulative import time of the bot module, most of which is discord.py
+IMPORT_TIME_BUDGET = 0.75  # seconds
+# Dependencies which only some cogs need, loaded when those cogs are
+LAZY_MODULES = ('dotenv', 'yaml', 'table2ascii', 'pynamodb', 'botocore')
+
+
+def import_times() -> dict[str, int]:
+    """
+    Imports the bot module in a fresh interpreter
+    :return: the cumulative import time of each module, in microseconds
+    """
+    result = subprocess.run(  # nosec B603
+        [sys.executable, '-X', 'importtime', '-c', 'import bot'],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_bot_imports_within_budget():
+    runs = [import_times() for _ in range(IMPORT_RUNS)]
+    seconds = statistics.median(run['bot'] for run in runs) / 1_000_000
+    slowest = sorted(
+        (
+            (name, time) for name, time in runs[-1].items()
+            if '.' not in name and name != 'bot'
+        ),
+        key=lambda item: -item[1],
+    )[:10]
+    print(f'\nimport bot: {seconds:.3f}s (budget {IMPORT_TIME_BUDGET}s)')
+    for name, time in slowest:
+        print(f'  {name}: {time / 1000:.1f}ms')
+    assert seconds <= IMPORT_TIME_BUDGET
+
+
+def test_bot_does_not_import_lazy_dependencies():
+    imported = import_times().keys()
+    assert not [
+        module for module in LAZY_MODULES
+        if module in imported
+    ]
@@ -0,0 +1,177 @@
+"""
+Throughput benchmarks for the keyword-matching hot path. Messages are
+sent through dpytest to the React and Message keyword listeners, which
+are backed by in-memory association tables.
+
+These are skipped by default, run them with:
+    HECKBOT_BENCHMARK=1 pytest tests/benchmarks -s
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import statistics
+import string
+import time
+import tracemalloc
+from collections import Counter
+from typing import Iterable
+from typing import Mapping
+from typing import Sequence
+from unittest import mock
+
+import discord.ext.test as dpytest
+import pytest
+
+from bot import HeckBot
+from heckbot.adapter.association_cache import AssociationCache
+from heckbot.cogs.message import Message
+from heckbot.cogs.react import React
+from heckbot.types.association import Association
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv('HECKBOT_BENCHMARK'),
+    reason='set HECKBOT_BENCHMARK=1 to run benchmarks',
+)
+
+PATTERN_COUNTS = (10, 1_000, 10_000)
+MESSAGES_PER_RUN = 200
+VOCABULARY_SIZE = 20_000
+
+
+class InMemoryAssociationTable:
+    """
+    Stand-in for the association table adapters which keeps every
+    guild's associations in a dict.
+    """
+
+    def __init__(
+            self,
+            associations: Mapping[str, Mapping[str, Association]],
+    ) -> None:
+        self._associations = associations
+        self.cache: AssociationCache[Mapping[str, Association]] = (
+            AssociationCache()
+        )
+
+    async def aget_all_associations(
+            self,
+            guild_id: str,
+    ) -> Mapping[str, Association]:
+        return self._associations.get(guild_id, {})
+
+
+class RecordingEmitter:
+    """
+    Stand-in for the ReactionEmitter which only counts reactions, so
+    that Discord API calls are not part of the measurement.
+    """
+
+    def __init__(self) -> None:
+        self.reactions: Counter[str] = Counter()
+
+    def emit(
+            self,
+            message: object,
+            emojis: Iterable[str],
+    ) -> None:
+        self.reactions.update(emojis)
+
+    async def close(self) -> None:
+        pass
+
+
+def synthetic_vocabulary(
+        rng: random.Random,
+) -> list[str]:
+    return [
+        ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10)))
+        for _ in range(VOCABULARY_SIZE)
+    ]
+
+
+def synthetic_messages(
+        rng: random.Random,
+        vocabulary: Sequence[str],
+) -> list[str]:
+    messages = []
+    for _ in range(MESSAGES_PER_RUN):
+        # Chat messages are mostly short with a long tail, capped at
+        #  Discord's 2000 character limit
+        length = min(int(rng.lognormvariate(4, 1)) + 1, 2000)
+        words: list[str] = []
+        while sum(len(w) + 1 for w in words) < length:
+            words.append(rng.choice(vocabulary))
+        messages.append(' '.join(words)[:length])
+    return messages
+
+
+def report(
+        name: str,
+        latencies: Sequence[float],
+        allocated: Sequence[int],
+) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f'\n{name}: '
+        f'{len(latencies) / sum(latencies):,.0f} msg/s, '
+        f'p50 {quantiles[49] * 1000:.3f} ms, '
+        f'p99 {quantiles[98] * 1000:.3f} ms, '
+        f'{statistics.mean(allocated) / 1024:,.1f} KiB peak alloc/msg',
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('num_patterns', PATTERN_COUNTS)
+async def test_keyword_listener_throughput(num_patterns):
+    rng = random.Random(num_patterns)
+    vocabulary = synthetic_vocabulary(rng)
+    patterns = rng.sample(vocabulary, num_patterns)
+
+    bot = HeckBot()
+    # noinspection PyProtectedMember
+    await bot._async_setup_hook()
+    dpytest.configure(bot)
+    guild_id = str(dpytest.get_config().guilds[0].id)
+    reaction_table = InMemoryAssociationTable({
+        guild_id: {p: Association(['👍']) for p in patterns},
+    })
+    message_table = InMemoryAssociationTable({
+        guild_id: {p: Association(['hi']) for p in patterns[:10]},
+    })
+    emitter = RecordingEmitter()
+    with (
+        mock.patch.object(React, '_reaction_table', reaction_table),
+        mock.patch.object(Message, '_message_table', message_table),
+    ):
+        react = React(bot)
+        react._emitter = emitter  # type: ignore[assignment]
+        await bot.add_cog(react)
+        await bot.add_cog(Message(bot))
+
+    messages = synthetic_messages(rng, vocabulary)
+    # Warm up so the one-off matcher builds are not measured
+    await dpytest.message(messages[0])
+    await asyncio.sleep(0)
+
+    latencies = []
+    for content in messages:
+        start = time.perf_counter()
+        await dpytest.message(content)
+        latencies.append(time.perf_counter() - start)
+
+    allocated = []
+    tracemalloc.start()
+    try:
+        for content in messages:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            await dpytest.message(content)
+            allocated.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    report(f'{num_patterns} patterns', latencies, allocated)
+    assert sum(emitter.reactions.values()) > 0
+    await dpytest.empty_queue()
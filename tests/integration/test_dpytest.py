@@ -67,3 +67,17 @@ async def test_single_dice(mock_randint, command, expected_text, bot):
     mock_randint.return_value = 1
     await dpytest.message(f'!{command}')
     assert dpytest.verify().message().content(expected_text)
+
+
+@pytest.mark.asyncio
+async def test_keyword_listeners_receive_only_non_commands(bot):
+    received = []
+
+    async def listener(keyword_message):
+        received.append(keyword_message)
+
+    bot.add_keyword_listener(listener)
+    await dpytest.message('!d1')
+    await dpytest.message('Hello THERE')
+    assert [m.text for m in received] == ['hello there']
+    assert received[0].guild_id == str(received[0].message.guild.id)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from unittest import mock
+
+from heckbot.adapter.association_cache import AssociationCache
+
+
+def test_hits_misses_and_negative_results():
+    cache: AssociationCache[dict[str, list[str]]] = AssociationCache()
+    assert cache.get('1') is None
+    cache.put('1', {}, cache.epoch)
+    assert cache.get('1') == {}
+    assert cache.stats == {'hits': 1, 'misses': 1, 'size': 1}
+
+
+@mock.patch('time.monotonic')
+def test_entries_expire_after_ttl(mock_monotonic):
+    cache: AssociationCache[dict[str, list[str]]] = AssociationCache(ttl=10)
+    mock_monotonic.return_value = 100
+    cache.put('1', {'cat': ['🐱']}, cache.epoch)
+    mock_monotonic.return_value = 109
+    assert cache.get('1') == {'cat': ['🐱']}
+    mock_monotonic.return_value = 111
+    assert cache.get('1') is None
+
+
+def test_least_recently_used_guild_is_evicted():
+    cache: AssociationCache[dict[str, list[str]]] = AssociationCache(
+        max_guilds=2,
+    )
+    cache.put('1', {}, cache.epoch)
+    cache.put('2', {}, cache.epoch)
+    cache.get('1')
+    cache.put('3', {}, cache.epoch)
+    assert cache.get('2') is None
+    assert cache.get('1') == {}
+
+
+def test_lookup_racing_an_invalidation_is_not_cached():
+    cache: AssociationCache[dict[str, list[str]]] = AssociationCache()
+    epoch = cache.epoch
+    cache.invalidate('1')
+    cache.put('1', {'stale': ['❌']}, epoch)
+    assert cache.get('1') is None
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from heckbot.types.association import Association
+from heckbot.types.association import ImportedAssociation
+from heckbot.utils.association_io import parse_associations
+from heckbot.utils.association_io import write_associations
+
+ASSOCIATIONS = {
+    'cat': Association(['🐱', '😺'], 'word'),
+    'hello, world': Association(['👋']),
+}
+
+
+@pytest.mark.parametrize('fmt', ['json', 'csv'])
+def test_export_round_trips_through_import(fmt):
+    buffer = io.StringIO()
+    count = write_associations(ASSOCIATIONS.items(), buffer, fmt)
+    assert count == 2
+    parsed = parse_associations(f'export.{fmt}', buffer.getvalue().encode())
+    assert parsed == ASSOCIATIONS
+
+
+def test_json_object_of_lists_is_accepted():
+    data = b'{"cat": ["\\ud83d\\udc31"], "dog": "\\ud83d\\udc36"}'
+    assert parse_associations('reactions.json', data) == {
+        'cat': ImportedAssociation(['🐱']),
+        'dog': ImportedAssociation(['🐶']),
+    }
+
+
+@pytest.mark.parametrize(
+    'filename,data',
+    [
+        ('bad.json', b'{not json'),
+        ('bad.json', b'[{"pattern": "cat"}]'),
+        ('bad.csv', b'cat\n'),
+        ('bad.csv', b'cat,x,telepathy\n'),
+        ('bad.csv', b'(a)\\1,x,regex\n'),
+        ('bad.csv', b',x\n'),
+    ],
+)
+def test_invalid_files_are_rejected(filename, data):
+    with pytest.raises(ValueError):
+        parse_associations(filename, data)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+from pynamodb.exceptions import PutError
+
+from heckbot.adapter.batch_writer import batch_save
+
+
+def unprocessed(*patterns):
+    return [
+        {'PutRequest': {'Item': {'pattern': {'S': pattern}}}}
+        for pattern in patterns
+    ]
+
+
+@mock.patch('time.sleep')
+def test_unprocessed_items_are_retried_with_backoff(mock_sleep):
+    items = [mock.MagicMock(pattern=f'p{i}') for i in range(30)]
+    committed: list[list[str]] = []
+    batches = []
+
+    def batch_write(auto_commit):
+        batch = mock.MagicMock(failed_operations=[])
+        saved: list[str] = []
+        batch.save.side_effect = lambda item: saved.append(item.pattern)
+
+        def commit():
+            committed.append(saved)
+            if len(committed) == 1:
+                batch.failed_operations = unprocessed('p0', 'p1')
+                raise PutError('max_retry_attempts exceeded')
+        batch.commit.side_effect = commit
+        batches.append(batch)
+        return batch
+
+    model = mock.MagicMock(batch_write=batch_write)
+    batch_save(model, items)
+
+    assert len(committed[0]) == 25
+    assert committed[1] == ['p0', 'p1'] + [f'p{i}' for i in range(25, 30)]
+    assert len(committed) == 2
+    mock_sleep.assert_called_once_with(0.5)
+
+
+@mock.patch('time.sleep')
+def test_request_failures_are_raised(mock_sleep):
+    items = [mock.MagicMock(pattern=f'p{i}') for i in range(3)]
+    batch = mock.MagicMock(failed_operations=[])
+    batch.commit.side_effect = PutError('ProvisionedThroughputExceeded')
+    model = mock.MagicMock()
+    model.batch_write.return_value = batch
+
+    with pytest.raises(PutError):
+        batch_save(model, items)
+    batch.commit.assert_called_once_with()
+    mock_sleep.assert_not_called()
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+
+import bot as bot_module
+from bot import HeckBot
+
+
+@pytest.mark.asyncio
+async def test_cogs_load_concurrently_with_timings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bot_module, 'initialize_tables', mock.AsyncMock())
+    bot = HeckBot()
+    # noinspection PyProtectedMember
+    await bot._async_setup_hook()
+    with mock.patch.object(bot, 'after_ready'):
+        await bot.setup_hook()
+
+    assert set(bot.cog_timings) == set(HeckBot._cogs)
+    assert {'Poll', 'Roles', 'Picker'} <= set(bot.cogs)
+    report = bot.startup_report()
+    assert 'cog imports' in report and 'roles: import' in report
+    await bot.close()
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import os
+from unittest import mock
+
+import pytest
+
+from heckbot.adapter import config_adapter
+from heckbot.adapter.config_adapter import ConfigAdapter
+
+
+@pytest.fixture
+def adapter(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config_adapter, 'CONFIG_RELOAD_INTERVAL', 0)
+    adapter = ConfigAdapter()
+    adapter.load_configs()
+    return adapter
+
+
+def test_defaults_are_filled_without_writing(adapter):
+    assert adapter.get_color(1, 'embedColor') == 0x040273
+    assert adapter.get_message(1, 'botOnlineMessage') == 'hello, i am online'
+    assert adapter.is_module_enabled(1, 'roles')
+    assert not os.path.exists(adapter.config_folder)
+
+
+def test_config_is_parsed_once(adapter):
+    adapter.set_color(1, 'embedColor', 0xFFFFFF)
+    with mock.patch.object(adapter.store, 'load') as load:
+        for _ in range(3):
+            assert adapter.get_color(1, 'embedColor') == 0xFFFFFF
+    load.assert_not_called()
+
+
+def test_edited_file_reloads_only_changed_guilds(adapter):
+    adapter.set_message(1, 'welcomeMessage', 'hi')
+    adapter.set_module_enabled(2, 'roles')
+    unchanged = adapter.configs['2']
+
+    with open(adapter.config_file, 'w') as f:
+        f.write("'1': {colors: {embedColor: 255}}\n")
+    os.utime(adapter.config_file, ns=(1, 1))
+
+    assert adapter.get_color(1, 'embedColor') == 255
+    assert adapter.get_message(1, 'welcomeMessage') == 'hi'
+    assert adapter.configs['2'] is unchanged
+    assert not adapter.is_module_enabled(2, 'roles')
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from heckbot.adapter.config_store import ConfigStore
+
+
+@pytest.fixture
+def snapshot_file(tmp_path):
+    return str(tmp_path / 'config' / 'config.yaml')
+
+
+def test_changes_are_journaled_and_replayed(snapshot_file):
+    store = ConfigStore(snapshot_file)
+    store.load()
+    store.set('1', 'colors', 'embedColor', 0x123456)
+    store.set('2', 'modules', 'roles', {'enabled': False})
+
+    assert not os.path.exists(snapshot_file)
+    assert ConfigStore(snapshot_file).load() == {
+        '1': {'colors': {'embedColor': 0x123456}},
+        '2': {'modules': {'roles': {'enabled': False}}},
+    }
+
+
+@pytest.mark.asyncio
+async def test_changes_are_coalesced_until_flushed(snapshot_file):
+    store = ConfigStore(snapshot_file, write_delay=60)
+    store.load()
+    for color in range(10):
+        store.set('1', 'colors', 'embedColor', color)
+    assert not os.path.exists(store.journal_file)
+
+    store.flush()
+    assert store.appends == 1
+    with open(store.journal_file) as f:
+        assert len(f.readlines()) == 1
+
+
+def test_compaction_rewrites_the_snapshot(snapshot_file):
+    store = ConfigStore(snapshot_file, compact_size=3)
+    store.load()
+    for guild_id in '123':
+        store.set(guild_id, 'messages', 'welcomeMessage', f'hi {guild_id}')
+
+    assert store.compactions == 1
+    assert os.path.getsize(store.journal_file) == 0
+    assert not os.path.exists(f'{snapshot_file}.tmp')
+    records = ConfigStore(snapshot_file).load()
+    assert records['3'] == {'messages': {'welcomeMessage': 'hi 3'}}
+
+
+def test_torn_journal_lines_are_skipped(snapshot_file):
+    store = ConfigStore(snapshot_file)
+    store.load()
+    store.set('1', 'colors', 'embedColor', 1)
+    with open(store.journal_file, 'a') as f:
+        f.write('["1", "colors", "embed')
+
+    assert ConfigStore(snapshot_file).load() == {
+        '1': {'colors': {'embedColor': 1}},
+    }
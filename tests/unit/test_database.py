@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+
+import pytest
+import pytest_asyncio
+
+from heckbot.adapter.database import AsyncDatabase
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path):
+    db = AsyncDatabase(str(tmp_path / 'test.db'))
+    await db.execute_script('''
+        CREATE TABLE items (name TEXT PRIMARY KEY, size INT);
+        CREATE INDEX items_size ON items (size);
+    ''')
+    yield db
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_share_commits(db):
+    commits = db.commits
+    await asyncio.gather(*(
+        db.execute('INSERT INTO items VALUES (?, ?)', (f'item{i}', i))
+        for i in range(100)
+    ))
+    assert db.commits - commits < 100
+    row = await db.fetch_one('SELECT COUNT(*) AS n FROM items')
+    assert row is not None and row['n'] == 100
+
+
+@pytest.mark.asyncio
+async def test_failed_write_is_rolled_back_alone(db):
+    results = await asyncio.gather(
+        db.execute('INSERT INTO items VALUES (?, ?)', ('a', 1)),
+        db.execute('INSERT INTO items VALUES (?, ?)', ('a', 2)),
+        db.execute('INSERT INTO items VALUES (?, ?)', ('b', 3)),
+        return_exceptions=True,
+    )
+    assert isinstance(results[1], sqlite3.IntegrityError)
+    rows = await db.fetch_all('SELECT name, size FROM items ORDER BY name')
+    assert [tuple(r) for r in rows] == [('a', 1), ('b', 3)]
+
+
+@pytest.mark.asyncio
+async def test_reads_cannot_write(db):
+    with pytest.raises(sqlite3.OperationalError):
+        await db.read(
+            lambda conn: conn.execute("INSERT INTO items VALUES ('c', 1)"),
+        )
+
+
+@pytest.mark.asyncio
+async def test_writer_survives_unexpected_failures(db, monkeypatch):
+    def fail(connection, batch):
+        raise sqlite3.InterfaceError('writer broke')
+    with monkeypatch.context() as patch:
+        patch.setattr(db, '_run_batch', fail)
+        with pytest.raises(sqlite3.InterfaceError):
+            await db.execute('INSERT INTO items VALUES (?, ?)', ('a', 1))
+    await db.execute('INSERT INTO items VALUES (?, ?)', ('b', 2))
+    rows = await db.fetch_all('SELECT name FROM items')
+    assert [row['name'] for row in rows] == ['b']
+
+
+@pytest.mark.asyncio
+async def test_close_drains_queued_writes_and_rejects_new_ones(db):
+    writes = [
+        asyncio.ensure_future(
+            db.execute('INSERT INTO items VALUES (?, ?)', (f'item{i}', i)),
+        )
+        for i in range(10)
+    ]
+    await asyncio.sleep(0)
+    closing = asyncio.ensure_future(db.close())
+    await asyncio.sleep(0)
+    with pytest.raises(sqlite3.ProgrammingError):
+        await db.execute('INSERT INTO items VALUES (?, ?)', ('late', 0))
+    await closing
+    await asyncio.gather(*writes)
+    row = await db.fetch_one('SELECT COUNT(*) AS n FROM items')
+    assert row is not None and row['n'] == 10
+
+
+@pytest.mark.asyncio
+async def test_scripts_split_on_statement_boundaries(db):
+    await db.execute_script(
+        "INSERT INTO items VALUES ('a;\n', 1); INSERT INTO items "
+        "VALUES ('b', 2);\n-- done; really\n",
+    )
+    rows = await db.fetch_all('SELECT name FROM items ORDER BY name')
+    assert [row['name'] for row in rows] == ['a;\n', 'b']
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+from botocore.exceptions import ClientError
+from pynamodb.exceptions import UpdateError
+
+from heckbot.adapter.dynamo_association_backend import (
+    CONDITIONAL_CHECK_FAILED,
+)
+from heckbot.adapter.dynamo_association_backend import (
+    DynamoAssociationBackend,
+)
+from heckbot.adapter.dynamo_association_backend import REMOVE_ATTEMPTS
+from heckbot.types.association import AssociationConflictError
+from heckbot.types.association import ImportedAssociation
+
+
+def conditional_check_failed():
+    return UpdateError(
+        'Failed to update item',
+        ClientError(
+            {'Error': {'Code': CONDITIONAL_CHECK_FAILED}},
+            'UpdateItem',
+        ),
+    )
+
+
+def test_remove_value_raises_when_edits_keep_conflicting():
+    model = mock.MagicMock()
+    model.get.return_value = mock.MagicMock(reactions=['🐶', '🐱'])
+    model.return_value.update.side_effect = conditional_check_failed()
+    backend = DynamoAssociationBackend(model, 'reactions')
+
+    with pytest.raises(AssociationConflictError):
+        backend.remove_value('1', 'cat', '🐱', ['🐱'])
+    assert model.return_value.update.call_count == REMOVE_ATTEMPTS
+
+
+def test_remove_value_reports_values_which_are_not_associated():
+    model = mock.MagicMock()
+    model.get.return_value = mock.MagicMock(reactions=['🐶'])
+    backend = DynamoAssociationBackend(model, 'reactions')
+
+    assert not backend.remove_value('1', 'cat', '🐱', None)
+    model.return_value.update.assert_not_called()
+
+
+@mock.patch('heckbot.adapter.dynamo_association_backend.batch_save')
+def test_import_keeps_stored_mode_when_none_is_given(mock_batch_save):
+    model = mock.MagicMock()
+    model.query.return_value = [
+        mock.MagicMock(pattern='c.t', reactions=['🐱'], match_mode='regex'),
+    ]
+    backend = DynamoAssociationBackend(model, 'reactions')
+
+    assert backend.import_associations('1', {
+        'c.t': ImportedAssociation(['😺']),
+        'dog': ImportedAssociation(['🐶']),
+    }) == 2
+    model.assert_any_call('1', 'c.t', match_mode='regex', reactions=[
+        '🐱', '😺',
+    ])
+    model.assert_any_call('1', 'dog', match_mode='substring', reactions=[
+        '🐶',
+    ])
+    mock_batch_save.assert_called_once()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from heckbot.types.association import Association
+from heckbot.utils.matcher import compile_regex
+from heckbot.utils.matcher import MatcherRegistry
+from heckbot.utils.matcher import PatternMatcher
+
+
+@pytest.mark.parametrize(
+    'patterns,text,expected',
+    [
+        (['cat', 'dog'], 'my cat and dog', ['cat', 'dog']),
+        (['he', 'she', 'his', 'hers'], 'ushers', ['he', 'she', 'hers']),
+        (['abcd', 'bc'], 'abce', ['bc']),
+        (['a', 'aa', 'aaa'], 'aa', ['a', 'aa']),
+        (['cat'], 'nothing here', []),
+        (['', 'x'], 'abc', ['']),
+    ],
+    ids=['simple', 'overlapping', 'fallback', 'nested', 'none', 'empty'],
+)
+def test_find_matches_substring_semantics(patterns, text, expected):
+    matcher = PatternMatcher({p: [p] for p in patterns})
+    assert matcher.find(text) == expected
+    assert matcher.find(text) == [p for p in patterns if p in text]
+
+
+def test_match_returns_values_in_pattern_order():
+    matcher = PatternMatcher({'zebra': ['🦓'], 'apple': ['🍎', '🍏']})
+    assert matcher.match('apple zebra') == {
+        'zebra': ['🦓'], 'apple': ['🍎', '🍏'],
+    }
+
+
+@pytest.mark.parametrize(
+    'text,expected',
+    [
+        ('my cat', ['cat', 'c.t']),
+        ('concatenate', ['c.t']),
+        ('cat_toy', ['c.t']),
+        ('a cat!', ['cat', 'c.t']),
+        ('scat cat', ['cat', 'c.t']),
+    ],
+)
+def test_word_and_regex_modes(text, expected):
+    matcher = PatternMatcher(
+        {'cat': ['🐱'], 'c.t': ['❓']},
+        {'cat': 'word', 'c.t': 'regex'},
+    )
+    assert matcher.find(text) == expected
+
+
+@pytest.mark.parametrize(
+    'pattern',
+    [r'(a)\1', '(?=a)', 'a' * 300, '(unclosed'],
+)
+def test_compile_regex_rejects_unsupported_patterns(pattern):
+    with pytest.raises(ValueError):
+        compile_regex(pattern)
+
+
+@pytest.mark.parametrize(
+    'pattern',
+    ['(a+)+$', '(a|aa)*b', '(x*y?)*z', '.*.*.*.*x'],
+)
+def test_backtracking_regex_matches_in_linear_time(pattern):
+    matcher = PatternMatcher(
+        {pattern: ['💣'], 'b': ['🐝']},
+        {pattern: 'regex'},
+    )
+    started = time.perf_counter()
+    assert matcher.find('a' * 1999 + '!') == []
+    assert time.perf_counter() - started < 0.5
+
+
+def test_regex_is_case_insensitive_on_the_original_text():
+    matcher = PatternMatcher(
+        {'HELLO': ['👋'], '[A-Z]{3}': ['🔠'], 'hello': ['🙂']},
+        {'HELLO': 'regex', '[A-Z]{3}': 'regex'},
+    )
+    assert matcher.find('hello', 'Hello') == ['HELLO', '[A-Z]{3}', 'hello']
+    # 'İ' lowercases to two characters, so only the original text matches
+    matcher = PatternMatcher({'^İ$': ['🇹🇷']}, {'^İ$': 'regex'})
+    assert matcher.find('İ'.lower(), 'İ') == ['^İ$']
+
+
+def test_invalid_regex_is_skipped_by_matcher():
+    matcher = PatternMatcher(
+        {r'(a)\1': ['💣'], 'b': ['🐝']},
+        {r'(a)\1': 'regex'},
+    )
+    assert matcher.find('aa b') == ['b']
+
+
+@pytest.mark.asyncio
+async def test_registry_swaps_in_rebuilt_matcher():
+    associations = {'cat': Association(['🐱'])}
+
+    async def loader(guild_id):
+        return dict(associations)
+
+    registry = MatcherRegistry(loader)
+    old = await registry.get('1')
+    assert old.find('cat dog') == ['cat']
+
+    associations['dog'] = Association(['🐶'])
+    registry.invalidate('1')
+    # The previous matcher keeps serving until the rebuild completes
+    assert await registry.get('1') is old
+    while await registry.get('1') is old:
+        await asyncio.sleep(0)
+    assert (await registry.get('1')).find('cat dog') == ['cat', 'dog']
+
+
+@pytest.mark.asyncio
+async def test_failed_rebuilds_wait_for_max_age():
+    calls = []
+
+    async def loader(guild_id):
+        calls.append(guild_id)
+        if len(calls) > 1:
+            raise ConnectionError('backend unavailable')
+        return {'cat': Association(['🐱'])}
+
+    registry = MatcherRegistry(loader, max_age=0.05)
+    matcher = await registry.get('1')
+    await asyncio.sleep(0.1)
+    for _ in range(20):
+        assert await registry.get('1') is matcher
+        await asyncio.sleep(0)
+    assert len(calls) == 2
+    await asyncio.sleep(0.1)
+    assert await registry.get('1') is matcher
+    await asyncio.sleep(0)
+    assert len(calls) == 3
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import discord
+import pytest
+
+from heckbot.cogs.message import Message
+from heckbot.utils.matcher import PatternMatcher
+
+
+@pytest.mark.asyncio
+async def test_keyword_responses_are_sent_and_failures_reported(capsys):
+    cog = Message(mock.MagicMock())
+    matcher = PatternMatcher({'hi': ['hello', 'hey'], 'bye': ['later']})
+    cog._matchers.get = mock.AsyncMock(return_value=matcher)
+    keyword_message = mock.MagicMock(
+        guild_id='1', text='hi and bye', content='Hi and bye',
+    )
+    keyword_message.ctx.send = mock.AsyncMock(side_effect=[
+        None, discord.HTTPException(mock.MagicMock(status=500), 'error'), None,
+    ])
+
+    await cog.on_keyword_message(keyword_message)
+
+    assert [
+        call.args for call in keyword_message.ctx.send.await_args_list
+    ] == [('hello',), ('hey',), ('later',)]
+    assert 'Could not send a keyword response in guild 1' in (
+        capsys.readouterr().out
+    )
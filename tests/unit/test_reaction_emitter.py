@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import asyncio
+from unittest import mock
+
+import discord
+import pytest
+
+from heckbot.utils.reaction_emitter import ReactionEmitter
+
+
+def mock_message(message_id: int, channel_id: int = 1):
+    message = mock.MagicMock(id=message_id)
+    message.channel.id = channel_id
+    message.add_reaction = mock.AsyncMock()
+    return message
+
+
+async def drain(emitter: ReactionEmitter):
+    while emitter.queue_depth or emitter._workers:
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_reactions_are_deduplicated_and_capped():
+    emitter = ReactionEmitter(max_reactions=3, interval=0)
+    message = mock_message(1)
+    emitter.emit(message, ['🐱', '🐶', '🐱'])
+    emitter.emit(message, ['🐶', '🐭', '🐹'])
+    await drain(emitter)
+    assert [c.args[0] for c in message.add_reaction.await_args_list] == [
+        '🐱', '🐶', '🐭',
+    ]
+    assert emitter.sent == 3
+
+
+@pytest.mark.asyncio
+async def test_missing_message_drops_remaining_reactions():
+    emitter = ReactionEmitter(interval=0)
+    deleted = mock_message(1)
+    deleted.add_reaction.side_effect = discord.NotFound(
+        mock.MagicMock(status=404), 'Unknown Message',
+    )
+    other = mock_message(2)
+    emitter.emit(deleted, ['🐱', '🐶'])
+    emitter.emit(other, ['🐭'])
+    await drain(emitter)
+    assert deleted.add_reaction.await_count == 1
+    other.add_reaction.assert_awaited_once_with('🐭')
+    assert emitter.failures == 1
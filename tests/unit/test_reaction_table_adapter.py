@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from unittest import mock
+
+from botocore.exceptions import ClientError
+from pynamodb.exceptions import UpdateError
+
+from heckbot.adapter.reaction_table_adapter import ReactionAssociation
+from heckbot.adapter.reaction_table_adapter import ReactionTableAdapter
+from heckbot.types.association import Association
+
+
+def conditional_check_failed():
+    return UpdateError(
+        cause=ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException'}},
+            'UpdateItem',
+        ),
+    )
+
+
+@mock.patch.object(ReactionAssociation, 'update', autospec=True)
+def test_add_reaction_is_a_single_conditional_update(mock_update):
+    assert ReactionTableAdapter.add_reaction('1', 'cat', '🐱')
+    mock_update.assert_called_once()
+    item = mock_update.call_args.args[0]
+    assert (item.guild_id, item.pattern) == ('1', 'cat')
+    assert mock_update.call_args.kwargs['condition'] is not None
+
+    mock_update.side_effect = conditional_check_failed()
+    assert not ReactionTableAdapter.add_reaction('1', 'cat', '🐱')
+
+
+@mock.patch.object(ReactionAssociation, 'get')
+@mock.patch.object(ReactionAssociation, 'update', autospec=True)
+def test_remove_reaction_retries_when_the_list_moved(mock_update, mock_get):
+    cache = ReactionTableAdapter.cache
+    cache.put('2', {'cat': Association(['🐶', '🐱'])}, cache.epoch)
+    mock_update.side_effect = [conditional_check_failed(), None]
+    mock_get.return_value = mock.MagicMock(reactions=['🐱'])
+
+    assert ReactionTableAdapter.remove_reaction('2', 'cat', '🐱')
+    assert mock_update.call_count == 2
+    mock_get.assert_called_once_with('2', 'cat', consistent_read=True)
+    assert cache.get('2') is None
+
+
+@mock.patch.object(ReactionAssociation, 'get')
+@mock.patch.object(ReactionAssociation, 'update', autospec=True)
+def test_remove_missing_reaction_does_not_write(mock_update, mock_get):
+    mock_get.return_value = mock.MagicMock(reactions=['🐶'])
+    assert not ReactionTableAdapter.remove_reaction('3', 'cat', '🐱')
+    mock_update.assert_not_called()
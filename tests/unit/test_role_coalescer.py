@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+from unittest import mock
+
+import pytest
+
+from heckbot.utils.role_coalescer import RoleCoalescer
+
+
+def mock_role(role_id: int):
+    role = mock.MagicMock(id=role_id)
+    role.is_default.return_value = role_id == 0
+    return role
+
+
+def mock_member(*roles):
+    member = mock.MagicMock(id=10, roles=list(roles))
+    member.guild.id = 1
+    member.guild.get_member.return_value = member
+    member.edit = mock.AsyncMock()
+    return member
+
+
+@pytest.mark.asyncio
+async def test_changes_are_applied_as_one_edit_in_order():
+    everyone, cats, dogs, birds = (mock_role(i) for i in range(4))
+    member = mock_member(everyone, birds)
+    coalescer = RoleCoalescer(window=0.01)
+
+    coalescer.add_roles(member, [cats])
+    coalescer.add_roles(member, [dogs])
+    coalescer.remove_roles(member, [cats, birds])
+    coalescer.add_roles(member, [cats])
+    assert coalescer.queue_depth == 5
+    await asyncio.sleep(0.05)
+
+    member.edit.assert_awaited_once_with(roles=[cats, dogs])
+    assert coalescer.batches == 1
+    assert coalescer.largest_batch == 5
+    assert coalescer.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_changes_without_effect_skip_the_edit():
+    everyone, cats = mock_role(0), mock_role(1)
+    member = mock_member(everyone, cats)
+    coalescer = RoleCoalescer(window=60)
+
+    coalescer.add_roles(member, [cats])
+    await coalescer.close()
+
+    member.edit.assert_not_awaited()
+    assert coalescer.skipped == 1
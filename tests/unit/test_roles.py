@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import discord
+import pytest
+import pytest_asyncio
+
+from heckbot.cogs.roles import Roles
+
+
+def reaction_payload(message_id: int, emoji: str = '🐱'):
+    return mock.MagicMock(
+        guild_id=1, channel_id=2, message_id=message_id, emoji=emoji,
+    )
+
+
+@pytest_asyncio.fixture
+async def roles(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    bot = mock.MagicMock()
+    bot.fetch_guild = mock.AsyncMock()
+    cog = Roles(bot)
+    await cog.cog_load()
+    await cog._db.execute_many(
+        'INSERT INTO roles (guild_id, role_name, role_description, '
+        'role_category, role_react) VALUES (?, ?, ?, ?, ?);',
+        [('1', 'cats', 'Cat people', 'Pets', '🐱')],
+    )
+    await cog._db.execute(
+        'INSERT INTO role_messages VALUES (?, ?, ?, ?, ?);',
+        ('1', '2', '3', 'Pets', 1),
+    )
+    # Reload so the menu index is built from the stored rows
+    await cog.cog_unload()
+    cog = Roles(bot)
+    await cog.cog_load()
+    yield cog
+    await cog.cog_unload()
+
+
+@pytest.mark.asyncio
+async def test_menu_index_is_loaded_and_kept_in_sync(roles):
+    assert roles.is_menu_message(1, 3)
+    assert not roles.is_menu_message(1, 4)
+    roles._add_menu_messages([('1', '2', '4', 'Pets', 1)])
+    assert roles.is_menu_message(1, 4)
+
+
+@pytest.mark.asyncio
+async def test_reactions_on_other_messages_skip_the_database(roles):
+    with mock.patch.object(roles._db, 'fetch_all') as fetch_all:
+        assert await roles._fetch_roles_for_reaction_change(
+            reaction_payload(99),
+        ) == []
+    fetch_all.assert_not_called()
+    roles._bot.fetch_guild.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_roles_resolve_from_the_cached_guild_index(roles):
+    cats = mock.MagicMock()
+    cats.name = 'cats'
+    roles._bot.get_guild.return_value.roles = [cats]
+
+    for _ in range(2):
+        assert await roles._fetch_roles_for_reaction_change(
+            reaction_payload(3),
+        ) == [cats]
+    assert await roles._fetch_roles_for_reaction_change(
+        reaction_payload(3, '🐶'),
+    ) == []
+    roles._bot.get_guild.assert_called_once_with(1)
+    roles._bot.fetch_guild.assert_not_called()
+
+    cats.guild.id = 1
+    await roles.on_guild_role_delete(cats)
+    roles._bot.get_guild.return_value.roles = []
+    assert await roles._fetch_roles_for_reaction_change(
+        reaction_payload(3),
+    ) == []
+
+
+@pytest.mark.asyncio
+async def test_menus_are_edited_without_fetching(roles):
+    channel = roles._bot.get_partial_messageable.return_value
+    message = channel.get_partial_message.return_value
+    message.edit = mock.AsyncMock()
+    message.add_reaction = mock.AsyncMock()
+    message.clear_reaction = mock.AsyncMock()
+    ctx = mock.MagicMock()
+    ctx.guild.id = 1
+    ctx.guild.roles = []
+    ctx.guild.create_role = mock.AsyncMock()
+
+    await roles.create_role.callback(
+        roles, ctx, 'dogs', 'Dog people', 'Pets', '🐶',
+    )
+    channel.get_partial_message.assert_called_with(3)
+    message.edit.assert_awaited_once_with(
+        content='**Pets**\n--------------------------\n'
+        '🐱 for Cat people\n🐶 for Dog people',
+    )
+    message.add_reaction.assert_awaited_once_with('🐶')
+
+    message.edit.reset_mock()
+    await roles.delete_role.callback(roles, ctx, 'cats')
+    message.edit.assert_awaited_once_with(
+        content='**Pets**\n--------------------------\n🐶 for Dog people',
+    )
+    message.clear_reaction.assert_awaited_once_with('🐱')
+    ctx.guild.fetch_channel.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_every_menu_in_a_channel_is_edited(roles):
+    rows = [('1', '2', '5', 'Pets', 1)]
+    await roles._db.execute_many(
+        'INSERT INTO role_messages VALUES (?, ?, ?, ?, ?);', rows,
+    )
+    roles._add_menu_messages(rows)
+    channel = roles._bot.get_partial_messageable.return_value
+    message = channel.get_partial_message.return_value
+    message.edit = mock.AsyncMock()
+    message.add_reaction = mock.AsyncMock()
+    ctx = mock.MagicMock()
+    ctx.guild.id = 1
+    ctx.guild.roles = []
+    ctx.guild.create_role = mock.AsyncMock()
+
+    await roles.create_role.callback(
+        roles, ctx, 'dogs', 'Dog people', 'Pets', '🐶',
+    )
+    assert sorted(
+        call.args for call in channel.get_partial_message.call_args_list
+    ) == [(3,), (5,)]
+    assert message.edit.await_count == 2
+    channel.send.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_reconciliation_repairs_roles_and_prunes_menus(roles):
+    guild = roles._bot.get_guild.return_value
+    guild.id = 1
+    reacted = mock.MagicMock(id=10, roles=[])
+    stale = mock.MagicMock(id=11, bot=False)
+    cats = mock.MagicMock(members=[stale])
+    cats.name = 'cats'
+    guild.roles = [cats]
+    guild.get_member.side_effect = {10: reacted}.get
+
+    async def users():
+        yield mock.MagicMock(id=10, bot=False)
+        yield mock.MagicMock(bot=True)
+    message = mock.MagicMock()
+    message.reactions = [mock.MagicMock(emoji='🐱', users=users)]
+    channel = mock.MagicMock(spec=discord.TextChannel)
+    channel.fetch_message = mock.AsyncMock(side_effect=[
+        message, discord.NotFound(mock.MagicMock(status=404), 'gone'),
+    ])
+    guild.get_channel_or_thread.return_value = channel
+    rows = [('1', '2', '4', 'Pets', 2)]
+    await roles._db.execute_many(
+        'INSERT INTO role_messages VALUES (?, ?, ?, ?, ?);', rows,
+    )
+    roles._add_menu_messages(rows)
+
+    with (
+        mock.patch.object(roles._role_changes, 'add_roles') as add_roles,
+        mock.patch.object(roles._role_changes, 'remove_roles') as remove,
+    ):
+        totals = await roles.reconcile_menus(remove_roles=True)
+
+    add_roles.assert_called_once_with(reacted, [cats])
+    remove.assert_called_once_with(stale, [cats])
+    assert (totals.menus, totals.added, totals.removed, totals.pruned) == (
+        1, 1, 1, 1,
+    )
+    assert roles.is_menu_message(1, 3)
+    assert not roles.is_menu_message(1, 4)
+    assert await roles._db.fetch_one(
+        'SELECT * FROM role_messages WHERE message_id=4;',
+    ) is None
+
+
+@pytest.mark.asyncio
+async def test_reconciliation_keeps_roles_it_cannot_verify(roles):
+    guild = roles._bot.get_guild.return_value
+    guild.id = 1
+    holder = mock.MagicMock(id=11, bot=False)
+    cats = mock.MagicMock(id=20, members=[holder])
+    cats.name = 'cats'
+    guild.roles = [cats]
+    guild.get_member.return_value = None
+
+    async def users():
+        yield mock.MagicMock(id=10, bot=False)
+    message = mock.MagicMock()
+    message.reactions = [mock.MagicMock(emoji='🐱', users=users)]
+    channel = mock.MagicMock(spec=discord.TextChannel)
+    guild.get_channel_or_thread.return_value = channel
+    rows = [('1', '5', '4', 'Pets', 1)]
+    await roles._db.execute_many(
+        'INSERT INTO role_messages VALUES (?, ?, ?, ?, ?);', rows,
+    )
+    roles._add_menu_messages(rows)
+
+    with mock.patch.object(roles._role_changes, 'remove_roles') as remove:
+        # Without removal, roles held without a reaction are only counted
+        channel.fetch_message = mock.AsyncMock(return_value=message)
+        totals = await roles.reconcile_menus()
+        assert (totals.removed, totals.unreacted) == (0, 1)
+
+        # The member may have reacted on the menu which failed to load
+        channel.fetch_message = mock.AsyncMock(side_effect=[
+            message,
+            discord.HTTPException(mock.MagicMock(status=500), 'error'),
+        ])
+        totals = await roles.reconcile_menus(remove_roles=True)
+        assert (totals.menus, totals.failures, totals.removed) == (1, 1, 0)
+
+        async def failing_users():
+            raise discord.HTTPException(mock.MagicMock(status=500), 'error')
+            yield
+        message.reactions = [mock.MagicMock(emoji='🐱', users=failing_users)]
+        channel.fetch_message = mock.AsyncMock(return_value=message)
+        totals = await roles.reconcile_menus(remove_roles=True)
+        assert (totals.menus, totals.failures, totals.removed) == (2, 2, 0)
+    remove.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_create_role_leaves_no_orphans(roles):
+    ctx = mock.MagicMock()
+    ctx.guild.id = 1
+    ctx.guild.roles = []
+    ctx.guild.create_role = mock.AsyncMock()
+    ctx.send = mock.AsyncMock()
+
+    await roles.create_role.callback(
+        roles, ctx, 'cats', 'Cat people', 'Pets', '🐱',
+    )
+    ctx.guild.create_role.assert_not_awaited()
+    ctx.send.assert_awaited_once_with('The role "cats" already exists!')
+
+    ctx.guild.create_role.side_effect = discord.HTTPException(
+        mock.MagicMock(status=500), 'error',
+    )
+    with pytest.raises(discord.HTTPException):
+        await roles.create_role.callback(
+            roles, ctx, 'dogs', 'Dog people', 'Pets', '🐶',
+        )
+    assert await roles._db.fetch_one(
+        "SELECT * FROM roles WHERE role_name='dogs';",
+    ) is None
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import pytest
+
+from heckbot.adapter import sqlite_association_backend
+from heckbot.adapter.sqlite_association_backend import SqliteAssociationBackend
+from heckbot.types.association import Association
+from heckbot.types.association import ImportedAssociation
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SqliteAssociationBackend(
+        str(tmp_path / 'associations.db'), 'HeckBotReactions',
+    )
+    backend.ensure_table()
+    yield backend
+    backend.close()
+
+
+def test_edits_report_whether_they_changed_anything(backend):
+    assert backend.add_value('1', 'cat', '🐱', None)
+    assert backend.add_value('1', 'cat', '😺', None)
+    assert not backend.add_value('1', 'cat', '🐱', None)
+    assert backend.add_value('1', 'cat', '🐱', 'word')
+    assert backend.get_values('1', 'cat') == ['🐱', '😺']
+    assert backend.query_all('1') == {
+        'cat': Association(['🐱', '😺'], 'word'),
+    }
+
+    assert backend.remove_value('1', 'cat', '🐱', None)
+    assert not backend.remove_value('1', 'cat', '🐱', None)
+    assert backend.remove_all('1', 'cat')
+    assert not backend.remove_all('1', 'cat')
+    assert backend.query_all('1') == {}
+
+
+def test_import_merges_and_export_pages(backend, monkeypatch):
+    monkeypatch.setattr(sqlite_association_backend, 'EXPORT_PAGE_SIZE', 2)
+    backend.add_value('1', 'cat', '🐱', None)
+    backend.add_value('2', 'dog', '🐶', None)
+    assert backend.import_associations('1', {
+        'cat': ImportedAssociation(['😺', '🐱'], 'regex'),
+        'bird': ImportedAssociation(['🐦']),
+        'fish': ImportedAssociation(['🐟'], 'word'),
+    }) == 3
+    assert list(backend.iter_associations('1')) == [
+        ('bird', Association(['🐦'])),
+        ('cat', Association(['🐱', '😺'], 'regex')),
+        ('fish', Association(['🐟'], 'word')),
+    ]
+    # Without a mode, imports keep the one already stored
+    backend.import_associations('1', {
+        'cat': ImportedAssociation(['🐈']),
+    })
+    assert backend.query_all('1')['cat'] == Association(
+        ['🐱', '😺', '🐈'], 'regex',
+    )
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from heckbot.adapter import table_executor
+
+
+def test_max_workers_are_read_on_first_use(monkeypatch):
+    monkeypatch.setattr(table_executor, '_executor', None)
+    monkeypatch.setenv('TABLE_MAX_WORKERS', '7')
+
+    executor = table_executor.get_table_executor()
+    try:
+        assert executor._max_workers == 7
+        assert table_executor.get_table_executor() is executor
+    finally:
+        executor.shutdown()
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import threading
+from unittest import mock
+
+import pytest
+
+from heckbot.adapter import table_registry
+
+
+@pytest.fixture(autouse=True)
+def empty_registry(monkeypatch):
+    monkeypatch.setattr(table_registry, '_tables', {})
+    monkeypatch.setattr(table_registry, '_ready', set())
+
+
+@pytest.mark.asyncio
+async def test_tables_are_checked_concurrently_and_once():
+    # Each check waits for the other, so this only passes if they overlap
+    barrier = threading.Barrier(2, timeout=5)
+    first = mock.Mock(side_effect=barrier.wait)
+    second = mock.Mock(side_effect=barrier.wait)
+    table_registry.register_table('first', first)
+    table_registry.register_table('second', second)
+
+    await table_registry.initialize_tables()
+    await table_registry.initialize_tables()
+
+    first.assert_called_once()
+    second.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_tables_are_checked_again():
+    check = mock.Mock(side_effect=[ConnectionError, None])
+    table_registry.register_table('flaky', check)
+
+    with pytest.raises(ConnectionError):
+        await table_registry.initialize_tables()
+    await table_registry.initialize_tables()
+
+    assert check.call_count == 2
+
+
+def test_importing_the_cogs_does_no_table_io():
+    from heckbot.adapter.message_table_adapter import MessageAssociation
+    from heckbot.adapter.reaction_table_adapter import ReactionAssociation
+
+    with (
+        mock.patch.object(ReactionAssociation, 'exists') as reaction_exists,
+        mock.patch.object(MessageAssociation, 'exists') as message_exists,
+    ):
+        import heckbot.cogs.message  # noqa: F401
+        import heckbot.cogs.react  # noqa: F401
+
+    reaction_exists.assert_not_called()
+    message_exists.assert_not_called()
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+import pytest_asyncio
+
+from heckbot.adapter.database import AsyncDatabase
+from heckbot.utils import task_scheduler
+from heckbot.utils.task_scheduler import PENDING_TASKS_INDEX
+from heckbot.utils.task_scheduler import TASKS_TABLE
+from heckbot.utils.task_scheduler import TaskScheduler
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path):
+    db = AsyncDatabase(str(tmp_path / 'tasks.db'))
+    await db.execute_script(TASKS_TABLE + PENDING_TASKS_INDEX)
+    yield db
+    await db.close()
+
+
+@pytest_asyncio.fixture
+async def scheduler(db):
+    ran = []
+
+    async def runner(task):
+        ran.append(task.message_id)
+    scheduler = make_scheduler(db, runner)
+    scheduler.ran = ran
+    await scheduler.start()
+    yield scheduler
+    await scheduler.close()
+
+
+def make_scheduler(db, handler, **kwargs):
+    scheduler = TaskScheduler(db, **kwargs)
+    scheduler.register_handler('close_poll', handler)
+    return scheduler
+
+
+def in_seconds(seconds: float) -> datetime:
+    return datetime.now() + timedelta(seconds=seconds)
+
+
+@pytest.mark.asyncio
+async def test_earlier_tasks_wake_the_scheduler(scheduler):
+    await scheduler.schedule('close_poll', in_seconds(3600), 1, 10)
+    await scheduler.schedule('close_poll', in_seconds(-1), 2, 10)
+    await asyncio.sleep(0.3)
+
+    assert scheduler.ran == [2]
+    assert scheduler.pending == 1
+    assert scheduler.completed == 1
+
+
+@pytest.mark.asyncio
+async def test_tasks_can_be_cancelled_and_rescheduled(scheduler, db):
+    cancelled = await scheduler.schedule('close_poll', in_seconds(1), 1, 10)
+    moved = await scheduler.schedule('close_poll', in_seconds(3600), 2, 10)
+
+    assert await scheduler.cancel(cancelled)
+    assert await scheduler.reschedule(moved, in_seconds(-1))
+    await asyncio.sleep(1.5)
+
+    assert scheduler.ran == [2]
+    assert not await scheduler.cancel(cancelled)
+    row = await db.fetch_one('SELECT COUNT(*) AS n FROM tasks WHERE completed')
+    assert row is not None and row['n'] == 2
+
+
+@pytest.mark.asyncio
+async def test_pending_tasks_are_loaded_on_start(db):
+    ran = []
+
+    async def runner(task):
+        ran.append(task.message_id)
+    first = make_scheduler(db, runner)
+    await first.schedule('close_poll', in_seconds(1), 1, 10)
+
+    second = make_scheduler(db, runner)
+    await second.start()
+    assert second.pending == 1
+    await second.close()
+
+
+@pytest.mark.asyncio
+async def test_overdue_tasks_run_with_bounded_concurrency(db):
+    running = 0
+    most_running = 0
+
+    async def runner(task):
+        nonlocal running, most_running
+        running += 1
+        most_running = max(most_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+    offline = make_scheduler(db, runner)
+    for message_id in range(10):
+        await offline.schedule('close_poll', in_seconds(-60), message_id, 10)
+
+    scheduler = make_scheduler(db, runner, workers=3)
+    report = await scheduler.start()
+    assert report == (10, 10)
+    await asyncio.sleep(0.2)
+    await scheduler.close()
+
+    assert scheduler.completed == 10
+    assert most_running == 3
+
+
+@pytest.mark.asyncio
+async def test_text_deadlines_are_migrated(tmp_path, monkeypatch):
+    db = AsyncDatabase(str(tmp_path / 'legacy.db'))
+    await db.execute_script('''
+        CREATE TABLE tasks
+        (completed BOOLEAN, task TEXT, message_id INT, channel_id INT,
+        end_time TEXT);
+    ''')
+    later = in_seconds(3600)
+    await db.execute_many(
+        'INSERT INTO tasks VALUES (?, ?, ?, ?, ?);',
+        [
+            (True, 'close_poll', 1, 10, '01/02/20 03:04:05'),
+            (False, 'close_poll', 2, 10, later.strftime('%m/%d/%y %H:%M:%S')),
+            (False, 'close_poll', 3, 10, 'garbled'),
+        ],
+    )
+    scheduler = TaskScheduler(db)
+    monkeypatch.setattr(scheduler, '_compact_forever', mock.AsyncMock())
+    started = int(time.time())
+
+    assert await scheduler.start() == (1, 0)
+    rows = await db.fetch_all(
+        'SELECT id, completed, deadline, completed_at >= ? FROM tasks '
+        'ORDER BY id;',
+        (started,),
+    )
+    assert [tuple(row) for row in rows] == [
+        (1, True, int(datetime(2020, 1, 2, 3, 4, 5).timestamp()), True),
+        (2, False, int(later.replace(microsecond=0).timestamp()), None),
+        (3, True, 0, True),
+    ]
+    # Migrated completed tasks are kept for the full retention
+    assert await scheduler.compact() == 0
+    await scheduler.close()
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_old_completed_tasks_are_compacted(scheduler, db, monkeypatch):
+    monkeypatch.setattr(task_scheduler, 'COMPACTION_BATCH_SIZE', 2)
+    for message_id in range(5):
+        task_id = await scheduler.schedule(
+            'close_poll', in_seconds(3600), message_id, 10,
+        )
+        await scheduler.cancel(task_id)
+    await scheduler.schedule('close_poll', in_seconds(3600), 5, 10)
+
+    assert await scheduler.compact(retention=60) == 0
+    assert await scheduler.compact(retention=-60) == 5
+    row = await db.fetch_one('SELECT COUNT(*) AS n FROM tasks;')
+    assert row is not None and row['n'] == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_tasks_back_off_then_dead_letter(db):
+    handler = mock.AsyncMock(side_effect=ConnectionError('channel gone'))
+    scheduler = make_scheduler(db, handler, max_attempts=3, retry_delay=0.1)
+    await scheduler.start()
+    bad = await scheduler.schedule('close_poll', in_seconds(-1), 1, 10)
+    await scheduler.schedule('unknown', in_seconds(3600), 2, 10)
+    await asyncio.sleep(0.1)
+
+    row = await db.fetch_one('SELECT * FROM tasks WHERE id = ?;', (bad,))
+    assert row is not None and row['attempts'] == 1
+    assert not row['completed'] and row['last_error'] == 'channel gone'
+
+    await asyncio.sleep(3)
+    await scheduler.close()
+    row = await db.fetch_one('SELECT * FROM tasks WHERE id = ?;', (bad,))
+    assert row is not None and row['dead_letter'] and row['attempts'] == 3
+    assert handler.await_count == 3
+    assert scheduler.dead_lettered == 1